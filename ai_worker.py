@@ -0,0 +1,158 @@
+import queue
+import threading
+from typing import Optional
+
+import numpy as np
+
+import bitboard
+import expgrid
+from game import AI
+
+
+def grid_key(grid: np.ndarray) -> bytes:
+    """Returns a hashable key of a grid: the bytes of its exponents, which fit any tile."""
+    return expgrid.to_exponents(grid).tobytes()
+
+
+class AIWorker:
+    """
+    Runs the AI search on a background thread so the render loop never blocks.
+
+    The UI asks for a move with poll() every frame and gets it once the search for
+    exactly that grid has finished. After answering, the worker ponders: it searches
+    the positions that can follow its move, most likely tile spawns first, so the
+    next request is often answered from the ponder cache without waiting.
+    """
+
+    def __init__(self, ai: AI, time_budget_ms: float, ponder: bool = True, max_ponder_positions: int = 64) -> None:
+        """
+        Initializes the worker and starts its thread.
+
+        Args:
+            ai (AI): The AI used for searching. It must not be used by other threads meanwhile.
+            time_budget_ms (float): Time budget per search, passed to find_best_move_timed.
+            ponder (bool): Search the likely follow-up positions while waiting for the next request.
+            max_ponder_positions (int): Maximum number of follow-up positions pondered after each move.
+        """
+        self.ai = ai
+        self.time_budget_ms = time_budget_ms
+        self.ponder = ponder
+        self.max_ponder_positions = max_ponder_positions
+        self.generation = 0  # Increased by cancel(), results of older generations are dropped
+        self.pending: Optional[tuple[int, bytes]] = None  # (generation, grid_key) of the request being searched
+        self.pondered: dict[bytes, Optional[str]] = {}  # Best moves of pondered grids by grid_key
+        self.ponder_hits = 0
+        self._ponder_queue: list[np.ndarray] = []
+        self._requests: queue.Queue = queue.Queue()
+        self._results: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._searching_ponder = False
+        self._ponder_key: Optional[bytes] = None
+        self._thread = threading.Thread(target=self._run, name="ai-worker", daemon=True)
+        self._thread.start()
+
+    def poll(self, grid: np.ndarray) -> Optional[str]:
+        """
+        Returns the best move for the grid if its search has finished, and requests it otherwise.
+
+        Never blocks. Results for other grids or from before the last cancel() are dropped.
+
+        Args:
+            grid (np.ndarray): The current game grid.
+
+        Returns:
+            Optional[str]: The best move for this grid, or None if it is not ready yet.
+        """
+        key = grid_key(grid)
+        while True:
+            try:
+                generation, result_key, best_move = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if generation == self.generation and result_key == key and best_move is not None:
+                self.pending = None
+                return best_move
+
+        if self.pending != (self.generation, key):
+            self.pending = (self.generation, key)
+            self._requests.put((self.generation, key, grid))
+            with self._lock:
+                if self._searching_ponder and self._ponder_key != key:
+                    self.ai.cancel()  # The UI is waiting for another position, stop pondering
+        return None
+
+    def cancel(self) -> None:
+        """Drops all queued, running and pondered searches, e.g. on reset or when the AI is toggled."""
+        with self._lock:
+            self.generation += 1
+            self.pending = None
+            self._ponder_queue = []
+            self.pondered.clear()
+            self.ai.cancel()
+
+    def stop(self) -> None:
+        """Stops the worker thread and waits for it to exit."""
+        self.cancel()
+        self._requests.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        """Worker loop: answers requests first and ponders while there are none."""
+        while True:
+            if self._ponder_queue:
+                try:
+                    request = self._requests.get_nowait()
+                except queue.Empty:
+                    self._ponder_next()
+                    continue
+            else:
+                request = self._requests.get()
+            if request is None:
+                return
+            generation, key, grid = request
+            if generation != self.generation:
+                continue
+
+            if key in self.pondered:
+                best_move = self.pondered.pop(key)
+                self.ponder_hits += 1
+            else:
+                best_move = self.ai.find_best_move_timed(grid, self.time_budget_ms)
+            self._results.put((generation, key, best_move))
+
+            with self._lock:
+                if generation == self.generation and self.ponder and best_move is not None:
+                    self._ponder_queue = self._follow_up_positions(grid, best_move)
+                    self.pondered.clear()
+
+    def _follow_up_positions(self, grid: np.ndarray, best_move: str) -> list[np.ndarray]:
+        """Lists the grids that can follow a move, most likely spawns first."""
+        new_board = self.ai.simulate_move(self.ai.search_grid(grid), best_move)
+        if new_board is None:
+            return []
+        tile_probabilities = sorted(self.ai.game.get_tile_spawn_probabilities(grid=None), key=lambda tile: -tile[1])
+        empty_cells = self.ai.empty_cells(new_board)
+        positions = [self.ai.place_tile(new_board, cell, tile_value)
+                     for tile_value, _ in tile_probabilities for cell in empty_cells][:self.max_ponder_positions]
+        # Packed boards in bitboard mode, exponent grids otherwise, see AI.search_grid
+        return [bitboard.decode(position) if isinstance(position, int) else expgrid.to_values(position)
+                for position in positions]
+
+    def _ponder_next(self) -> None:
+        """Searches the next follow-up position and stores its best move."""
+        with self._lock:
+            if not self._ponder_queue:
+                return
+            generation = self.generation
+            grid = self._ponder_queue.pop(0)
+            key = grid_key(grid)
+            self._searching_ponder = True
+            self._ponder_key = key
+        try:
+            best_move = self.ai.find_best_move_timed(grid, self.time_budget_ms)
+        finally:
+            with self._lock:
+                self._searching_ponder = False
+                # A cancelled ponder search may have stopped early, so its move is not kept
+                if generation == self.generation and not self.ai.cancelled:
+                    self.pondered[key] = best_move
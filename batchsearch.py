@@ -0,0 +1,206 @@
+import numpy as np
+from typing import Optional
+
+import bitboard
+import vecgame
+from game import Game
+from heuristic import RowTableEvaluator
+from movebook import MoveBook
+from ntuple import NTupleNetwork
+
+
+class BatchExpectimax:
+    """
+    Expectimax over many 4x4 boards at once, expanded level by level.
+
+    Instead of walking one tree depth-first like AI.expectimax, every level of the
+    trees of all boards is built as one array: the moves of all player nodes are
+    applied with vecgame.move_boards, the spawns of all chance nodes are written with
+    one fancy-indexing pass, and all leaves are scored with a single evaluator call.
+    Values, the probability cutoff and the tie-breaking of the root follow
+    AI.expectimax and AI.find_best_move (without chance-node sampling), so the moves
+    are the same up to floating-point summation order.
+    """
+
+    def __init__(self, evaluator: RowTableEvaluator | NTupleNetwork, prob_threshold: float = 1e-4,
+                 move_book: Optional[MoveBook] = None) -> None:
+        """
+        Args:
+            evaluator (RowTableEvaluator | NTupleNetwork): Scores the leaves with evaluate_boards.
+            prob_threshold (float): Spawn sequences less likely than this are scored with the
+                evaluator instead of being searched deeper.
+            move_book (Optional[MoveBook]): Book consulted before searching, as by AI.book_move.
+        """
+        self.evaluator = evaluator
+        self.prob_threshold = prob_threshold
+        self.move_book = move_book
+        self.book_hits = 0  # Boards answered from the move book since the search was created
+        # Spawned tiles as (exponent, probability)
+        self.spawn_tiles = [(bitboard.tile_exponent(tile_value), probability)
+                            for tile_value, probability in Game().get_tile_spawn_probabilities(grid=None)]
+        self.leaf_evaluations = 0  # Leaves scored since the search was created
+
+    def evaluate(self, boards: np.ndarray) -> np.ndarray:
+        """Scores a stack of exponent boards with one evaluator call."""
+        if len(boards) == 0:
+            return np.zeros(0)
+        self.leaf_evaluations += len(boards)
+        return np.asarray(self.evaluator.evaluate_boards(vecgame.pack_boards(boards)), dtype=np.float64)
+
+    def book_move(self, board: int) -> Optional[str]:
+        """Returns the legal move the move book has for a packed board, like AI.book_move, or None."""
+        if self.move_book is None:
+            return None
+        move = self.move_book.lookup(board)
+        if move is None or bitboard.execute_move(board, move) == board:
+            return None
+        self.book_hits += 1
+        return move
+
+    def best_moves(self, boards: np.ndarray, depth: int) -> list[Optional[str]]:
+        """
+        Finds the best move of many boards, like AI.find_best_move with search='expectimax'.
+
+        Boards found in the move book are answered from it, the others are searched together.
+
+        Args:
+            boards (np.ndarray): N packed boards as uint64.
+            depth (int): The search depth, at least 1.
+
+        Returns:
+            list[Optional[str]]: The best move of every board, None where no move is possible.
+        """
+        boards = np.asarray(boards, dtype=np.uint64)
+        moves = [self.book_move(board) for board in boards.tolist()]
+        searched = [index for index, move in enumerate(moves) if move is None]
+        if searched:
+            for index, move in zip(searched, self.search_moves(boards[searched], depth)):
+                moves[index] = move
+        return moves
+
+    def search_moves(self, boards: np.ndarray, depth: int) -> list[Optional[str]]:
+        """Searches the best move of many packed boards without consulting the move book, see best_moves."""
+        grids = vecgame.unpack_boards(boards)
+        children, parents, actions = self._moves(grids)
+        values = self.chance_values(children, depth - 1, np.ones(len(children)))
+
+        # First strictly better move in action order wins, as in AI.find_best_move
+        scores = np.full((len(grids), len(vecgame.ACTIONS)), -np.inf)
+        scores[parents, actions] = values
+        best = scores.argmax(axis=1)
+        has_move = np.isfinite(scores).any(axis=1)
+        return [vecgame.ACTIONS[int(action)] if legal else None for action, legal in zip(best, has_move)]
+
+    def _moves(self, grids: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Applies every legal move to every grid, returning the afterstates with their parent and action."""
+        children, parents, actions = [], [], []
+        for action in vecgame.ACTIONS:
+            moved, _ = vecgame.move_boards(grids, np.full(len(grids), action))
+            legal = np.flatnonzero((moved != grids).any(axis=(1, 2)))
+            children.append(moved[legal])
+            parents.append(legal)
+            actions.append(np.full(len(legal), action))
+        # Ordered by parent, then action, like the children of one AI.possible_moves call
+        parents = np.concatenate(parents)
+        order = np.argsort(parents, kind="stable")
+        return np.concatenate(children)[order], parents[order], np.concatenate(actions)[order]
+
+    def chance_values(self, grids: np.ndarray, depth: int, probabilities: np.ndarray) -> np.ndarray:
+        """
+        Values of chance nodes, the counterpart of AI.expectimax(grid, depth, False, probability).
+
+        Args:
+            grids (np.ndarray): An (N, 4, 4) array of exponent grids after a player move.
+            depth (int): The remaining search depth, the same for all grids.
+            probabilities (np.ndarray): Cumulative probability of the spawns leading to every grid.
+
+        Returns:
+            np.ndarray: The N expected scores.
+        """
+        values = np.zeros(len(grids))
+        empty = (grids == 0).reshape(len(grids), -1)
+        counts = empty.sum(axis=1)
+        leaves = (probabilities < self.prob_threshold) | (counts == 0) if depth > 0 else np.ones(len(grids), dtype=bool)
+        values[leaves] = self.evaluate(grids[leaves])
+        expand = np.flatnonzero(~leaves)
+        if len(expand) == 0:
+            return values
+
+        parents, cells = np.nonzero(empty[expand])
+        rows, columns = np.divmod(cells, bitboard.BOARD_SIZE)
+        cell_probabilities = probabilities[expand][parents] / counts[expand][parents]
+        spawned = grids[expand][parents]
+        totals = np.zeros(len(expand))
+        for exponent, tile_probability in self.spawn_tiles:
+            children = spawned.copy()
+            children[np.arange(len(children)), rows, columns] = exponent
+            child_values = self.max_values(children, depth - 1, cell_probabilities * tile_probability)
+            totals += np.bincount(parents, weights=tile_probability * child_values, minlength=len(expand))
+        values[expand] = totals / counts[expand]
+        return values
+
+    def max_values(self, grids: np.ndarray, depth: int, probabilities: np.ndarray) -> np.ndarray:
+        """
+        Values of player nodes, the counterpart of AI.expectimax(grid, depth, True, probability).
+
+        Args:
+            grids (np.ndarray): An (N, 4, 4) array of exponent grids after a spawn.
+            depth (int): The remaining search depth, the same for all grids.
+            probabilities (np.ndarray): Cumulative probability of the spawns leading to every grid.
+
+        Returns:
+            np.ndarray: The N scores of the best moves, 0 where no move is possible.
+        """
+        values = np.zeros(len(grids))
+        leaves = probabilities < self.prob_threshold if depth > 0 else np.ones(len(grids), dtype=bool)
+        values[leaves] = self.evaluate(grids[leaves])
+        expand = np.flatnonzero(~leaves)
+        if len(expand) == 0:
+            return values
+
+        children, parents, _ = self._moves(grids[expand])
+        child_probabilities = probabilities[expand][parents]
+        if depth == 1:
+            child_values = self.evaluate(children)
+        else:
+            child_values = self.chance_values(children, depth - 1, child_probabilities)
+        best = np.zeros(len(expand))  # No legal move left, the lowest score evaluate can give
+        np.maximum.at(best, parents, child_values)
+        values[expand] = best
+        return values
+
+
+# Search of a worker process, set up once by init_worker
+_worker_search: Optional[BatchExpectimax] = None
+
+
+def init_worker(ntuple_path: Optional[str] = None, prob_threshold: float = 1e-4,
+                book_path: Optional[str] = None) -> None:
+    """
+    Builds the search used by a worker process.
+
+    Args:
+        ntuple_path (Optional[str]): N-tuple network weights, the exact RowTableEvaluator if None.
+        prob_threshold (float): Probability cutoff of the search.
+        book_path (Optional[str]): Move book consulted before searching, none if None.
+    """
+    global _worker_search
+    evaluator = NTupleNetwork.load(ntuple_path) if ntuple_path else RowTableEvaluator()
+    _worker_search = BatchExpectimax(evaluator, prob_threshold, MoveBook(book_path) if book_path else None)
+
+
+def best_moves_task(boards: np.ndarray, depth: int) -> tuple[list[Optional[str]], int, int]:
+    """
+    Searches a batch of boards in a worker process set up with init_worker.
+
+    Args:
+        boards (np.ndarray): Packed boards as uint64.
+        depth (int): The search depth.
+
+    Returns:
+        tuple[list[Optional[str]], int, int]: The best moves, the number of leaves evaluated and
+        the number of boards answered from the move book.
+    """
+    leaves_before, hits_before = _worker_search.leaf_evaluations, _worker_search.book_hits
+    moves = _worker_search.best_moves(boards, depth)
+    return moves, _worker_search.leaf_evaluations - leaves_before, _worker_search.book_hits - hits_before
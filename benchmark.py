@@ -0,0 +1,270 @@
+"""
+Benchmark suite for the engine and search hot paths.
+
+Runs every case on a fixed corpus of early, mid and late game boards, reports
+ops/sec and latency percentiles, and can save the results as a JSON baseline or
+compare them against one.
+
+Example:
+    python benchmark.py --save baseline.json
+    python benchmark.py --compare baseline.json --threshold 0.10
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+import numpy as np
+
+import bitboard
+import expgrid
+from game import Game, AI
+from heuristic import RowTableEvaluator
+
+# Boards taken from seeded games of the depth-2 AI
+CORPUS = {
+    "early": [
+        [[0, 0, 0, 0], [0, 0, 0, 4], [8, 0, 0, 0], [16, 4, 0, 4]],
+        [[2, 0, 0, 0], [2, 0, 0, 0], [4, 2, 0, 0], [8, 4, 4, 0]],
+        [[2, 0, 0, 0], [2, 0, 0, 2], [4, 0, 0, 0], [16, 0, 0, 0]],
+    ],
+    "mid": [
+        [[0, 0, 2, 0], [0, 0, 64, 2], [2, 0, 4, 8], [128, 32, 128, 32]],
+        [[2, 0, 2, 0], [8, 16, 2, 2], [16, 2, 16, 32], [256, 32, 2, 4]],
+        [[4, 0, 0, 0], [8, 2, 2, 2], [2, 16, 16, 32], [256, 16, 32, 2]],
+    ],
+    "late": [
+        [[4, 2, 0, 0], [2, 8, 2, 0], [2, 16, 32, 4], [512, 256, 128, 16]],
+        [[0, 0, 0, 2], [0, 4, 0, 8], [8, 32, 16, 128], [512, 256, 128, 2]],
+        [[4, 2, 0, 2], [2, 8, 4, 0], [16, 32, 128, 16], [1024, 64, 4, 2]],
+    ],
+}
+
+DIRECTIONS = ["left", "up", "right", "down"]
+# Board sizes other than 4x4 with their own cases, on the general exponent-grid path
+SIZES = [3, 5, 6, 8]
+
+
+def corpus_grids(stage: Optional[str] = None) -> list[np.ndarray]:
+    """Returns the corpus boards of one stage, or of all stages, as grids."""
+    stages = [stage] if stage else list(CORPUS)
+    return [np.array(board, dtype=int) for name in stages for board in CORPUS[name]]
+
+
+def sized_grids(size: int, count: int = 3, moves: int = 20) -> list[np.ndarray]:
+    """
+    Returns boards of a given size from one seeded game of random moves, as exponent grids.
+
+    Args:
+        size (int): The board size.
+        count (int): Number of boards.
+        moves (int): Random moves between two boards.
+    """
+    rng = np.random.default_rng(size)
+    np.random.seed(size)
+    game = Game(auto_reset=False, size=size)
+    grids = []
+    while len(grids) < count:
+        for _ in range(moves):
+            game.move(DIRECTIONS[rng.integers(len(DIRECTIONS))])
+        if game.game_over():
+            game.resetgame()
+        grids.append(game.exponents.copy())
+    return grids
+
+
+def time_calls(setups: list[Callable[[], Callable[[], object]]], repeat: int) -> list[float]:
+    """
+    Times individual calls.
+
+    Args:
+        setups (list[Callable]): Functions that prepare one call and return it, so that
+            setup work such as copying a grid is not timed.
+        repeat (int): Number of passes over the setups.
+
+    Returns:
+        list[float]: The latency of every call in seconds.
+    """
+    latencies = []
+    for _ in range(repeat):
+        for setup in setups:
+            call = setup()
+            start = time.perf_counter()
+            call()
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def summarize_latencies(latencies: list[float]) -> dict[str, float]:
+    """Reports ops/sec and latency percentiles in microseconds."""
+    samples = np.array(latencies)
+    return {
+        "runs": len(samples),
+        "ops_per_sec": len(samples) / samples.sum(),
+        "mean_us": samples.mean() * 1e6,
+        "p50_us": np.percentile(samples, 50) * 1e6,
+        "p90_us": np.percentile(samples, 90) * 1e6,
+        "p99_us": np.percentile(samples, 99) * 1e6,
+    }
+
+
+def build_cases(max_depth: int = 5) -> dict[str, tuple[list[Callable], int]]:
+    """
+    Builds the benchmark cases.
+
+    Args:
+        max_depth (int): Deepest find_best_move depth to include (from 2).
+
+    Returns:
+        dict[str, tuple[list[Callable], int]]: Case name mapped to its call setups and repeat count.
+    """
+    game = Game(use_bitboard=False)
+    bitboard_game = Game(use_bitboard=True)
+    ai = AI(game)
+    bitboard_ai = AI(bitboard_game)
+    make_unmake_ai = AI(game, make_unmake=True)
+    grids = corpus_grids()
+    exponent_grids = [expgrid.to_exponents(grid) for grid in grids]
+    boards = [bitboard.encode(grid) for grid in grids]
+
+    stacked = np.stack((grids * 8)[:64])
+    packed = np.array((boards * 8)[:64], dtype=np.uint64)
+    exact = RowTableEvaluator()
+    additive = RowTableEvaluator(mode="additive")
+
+    def with_grid(target: Game, grid: np.ndarray, method: str) -> Callable:
+        target.grid = grid.copy()
+        return getattr(target, method)
+
+    cases = {
+        "slide_left/expgrid": ([lambda grid=grid: lambda: expgrid.slide_left(grid) for grid in exponent_grids], 200),
+        "execute_move/bitboard": ([lambda board=board, d=d: lambda: bitboard.execute_move(board, d)
+                                   for board in boards for d in DIRECTIONS], 500),
+        # 4x4 exponent grids are moved through the row tables like packed boards, only the conversions differ
+        "simulate_move/exponents": ([lambda grid=grid, d=d: lambda: ai.simulate_move(grid, d)
+                                     for grid in exponent_grids for d in DIRECTIONS], 50),
+        "simulate_move/bitboard": ([lambda board=board, d=d: lambda: bitboard_ai.simulate_move(board, d)
+                                    for board in boards for d in DIRECTIONS], 500),
+        "evaluate": ([lambda grid=grid: lambda: ai.evaluate(grid) for grid in grids], 200),
+        "evaluate_batch/64": ([lambda: lambda: ai.evaluate_batch(stacked)], 200),
+        "evaluate/table_exact": ([lambda board=board: lambda: exact.evaluate_board(board) for board in boards], 500),
+        "evaluate/table_additive": ([lambda board=board: lambda: additive.evaluate_board(board) for board in boards], 500),
+        "evaluate_boards/table_exact/64": ([lambda: lambda: exact.evaluate_boards(packed)], 200),
+        "game_over": ([lambda grid=grid: with_grid(game, grid, "game_over") for grid in grids], 200),
+        "add_tile": ([lambda grid=grid: with_grid(game, grid, "add_tile") for grid in grids], 200),
+    }
+    for name, target in (("numpy", ai), ("make_unmake", make_unmake_ai)):
+        cases[f"find_best_move/{name}/depth3/mid"] = (
+            [lambda grid=grid, target=target: lambda: target.find_best_move(grid, 3) for grid in corpus_grids("mid")], 5)
+    for size in SIZES:
+        sized_ai = AI(Game(size=size))
+        cases[f"simulate_move/size{size}"] = (
+            [lambda grid=grid, d=d, target=sized_ai: lambda: target.simulate_move(grid, d)
+             for grid in sized_grids(size) for d in DIRECTIONS], 50)
+        cases[f"find_best_move/size{size}/depth2"] = (
+            [lambda grid=grid, target=sized_ai: lambda: target.find_best_move(expgrid.to_values(grid), 2)
+             for grid in sized_grids(size)], 5)
+    for depth in range(2, max_depth + 1):
+        for stage in CORPUS:
+            cases[f"find_best_move/depth{depth}/{stage}"] = (
+                [lambda grid=grid, depth=depth: lambda: bitboard_ai.find_best_move(grid, depth)
+                 for grid in corpus_grids(stage)],
+                max(1, 20 // 4 ** (depth - 2)),
+            )
+    return cases
+
+
+def run_benchmarks(max_depth: int = 5, only: Optional[str] = None, scale: float = 1.0) -> dict[str, dict[str, float]]:
+    """
+    Runs the benchmark cases.
+
+    Args:
+        max_depth (int): Deepest find_best_move depth to include.
+        only (Optional[str]): Only run cases whose name contains this text.
+        scale (float): Multiplier for the number of repetitions of every case.
+
+    Returns:
+        dict[str, dict[str, float]]: The summary of every case.
+    """
+    np.random.seed(0)
+    results = {}
+    for name, (setups, repeat) in build_cases(max_depth).items():
+        if only and only not in name:
+            continue
+        time_calls(setups, 1)  # Warm up
+        results[name] = summarize_latencies(time_calls(setups, max(1, int(repeat * scale))))
+        print(format_result(name, results[name]), flush=True)
+    return results
+
+
+def format_result(name: str, result: dict[str, float]) -> str:
+    """Formats one case as a table row."""
+    return (f"{name:<36} {result['ops_per_sec']:>12.1f} ops/s  p50 {result['p50_us']:>11.1f} us  "
+            f"p90 {result['p90_us']:>11.1f} us  p99 {result['p99_us']:>11.1f} us")
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Compares median latencies with a baseline.
+
+    Args:
+        results (dict): Results of the current run.
+        baseline (dict): Results of the baseline run.
+        threshold (float): Relative slowdown of the median latency that counts as a regression.
+
+    Returns:
+        list[str]: Names of the cases that regressed.
+    """
+    regressions = []
+    print(f"\n{'case':<36} {'baseline p50':>14} {'current p50':>14} {'change':>9}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        change = result["p50_us"] / baseline[name]["p50_us"] - 1
+        flag = "REGRESSION" if change > threshold else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<36} {baseline[name]['p50_us']:>11.1f} us {result['p50_us']:>11.1f} us {change:>+8.1%} {flag}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the 2048 engine and search.")
+    parser.add_argument("--max-depth", type=int, default=5, help="deepest find_best_move depth (2-5)")
+    parser.add_argument("--only", default=None, help="only run cases whose name contains this text")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply the repetitions of every case")
+    parser.add_argument("--save", default=None, help="save the results as a JSON baseline")
+    parser.add_argument("--compare", default=None, help="compare against a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative p50 slowdown reported as a regression (default 0.10)")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.max_depth, args.only, args.scale)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "meta": {
+                    "date": datetime.now(timezone.utc).isoformat(),
+                    "python": platform.python_version(),
+                    "numpy": np.__version__,
+                    "machine": platform.machine(),
+                    "processor": platform.processor(),
+                },
+                "results": results,
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
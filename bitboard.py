@@ -0,0 +1,346 @@
+import numpy as np
+
+# Packed board layout: 16 cells of 4 bits in one 64-bit integer.
+# Each cell holds the log2 exponent of its tile (0 = empty, 1 = 2, 2 = 4, ...).
+# Cell (r, c) lives at bit offset 4 * (4 * r + c), so row r is the 16-bit
+# value (board >> 16 * r) & ROW_MASK and column 0 is the lowest nibble of a row.
+BOARD_SIZE = 4
+CELL_MASK = 0xF
+ROW_MASK = 0xFFFF
+# Largest representable tile is 2**15 = 32768. Merging two 32768 tiles would need a
+# fifth bit, so the row tables clamp that merge at 32768; Game and AI switch to the
+# exponent grids of expgrid.py once a 32768 tile is on the board.
+MAX_EXPONENT = 15
+
+
+def _slide_row_left(row: int) -> int:
+    """
+    Slide and merge a packed 16-bit row towards column 0.
+
+    Follows the same rules as Game.slide_and_merge: zeros are removed, equal
+    neighbours merge once from the left, and the row is padded with zeros.
+    Two 32768 tiles merge into 32768, see MAX_EXPONENT.
+
+    Args:
+        row (int): A packed row of four 4-bit exponents.
+
+    Returns:
+        int: The packed row after sliding and merging.
+    """
+    non_zero = [(row >> (4 * i)) & CELL_MASK for i in range(BOARD_SIZE)]
+    non_zero = [cell for cell in non_zero if cell != 0]
+
+    new_row = []
+    i = 0
+    while i < len(non_zero):
+        if i < len(non_zero) - 1 and non_zero[i] == non_zero[i + 1]:
+            new_row.append(min(non_zero[i] + 1, MAX_EXPONENT))
+            i += 2
+        else:
+            new_row.append(non_zero[i])
+            i += 1
+
+    result = 0
+    for i, cell in enumerate(new_row):
+        result |= cell << (4 * i)
+    return result
+
+
+def _reverse_row(row: int) -> int:
+    """Reverse the order of the four cells in a packed row."""
+    return (
+        ((row & 0x000F) << 12)
+        | ((row & 0x00F0) << 4)
+        | ((row & 0x0F00) >> 4)
+        | ((row & 0xF000) >> 12)
+    )
+
+
+# Precomputed results for all 65,536 possible rows
+ROW_LEFT_TABLE = [_slide_row_left(row) for row in range(ROW_MASK + 1)]
+ROW_RIGHT_TABLE = [_reverse_row(ROW_LEFT_TABLE[_reverse_row(row)]) for row in range(ROW_MASK + 1)]
+ROW_REVERSE_TABLE = [_reverse_row(row) for row in range(ROW_MASK + 1)]
+
+
+def encode(grid: np.ndarray) -> int:
+    """
+    Pack a 4x4 grid of tile values into a 64-bit board.
+
+    Args:
+        grid (np.ndarray): A 4x4 grid of tile values (0, 2, 4, 8, ...).
+
+    Returns:
+        int: The packed board.
+
+    Raises:
+        ValueError: If a tile is larger than 2**MAX_EXPONENT.
+    """
+    board = 0
+    shift = 0
+    for value in grid.flat:
+        value = int(value)
+        if value:
+            exponent = value.bit_length() - 1
+            if exponent > MAX_EXPONENT:
+                raise ValueError(f"Tile {value} does not fit a packed board, the largest is {1 << MAX_EXPONENT}")
+            board |= exponent << shift
+        shift += 4
+    return board
+
+
+def decode(board: int) -> np.ndarray:
+    """
+    Unpack a 64-bit board into a 4x4 grid of tile values.
+
+    Args:
+        board (int): The packed board.
+
+    Returns:
+        np.ndarray: A 4x4 integer grid of tile values.
+    """
+    cells = [(board >> (4 * i)) & CELL_MASK for i in range(BOARD_SIZE * BOARD_SIZE)]
+    return np.array([1 << e if e else 0 for e in cells], dtype=int).reshape(BOARD_SIZE, BOARD_SIZE)
+
+
+def decode_batch(boards: list[int]) -> np.ndarray:
+    """
+    Unpack many 64-bit boards at once.
+
+    Args:
+        boards (list[int]): The packed boards.
+
+    Returns:
+        np.ndarray: An (N, 4, 4) integer array of tile values.
+    """
+    packed = np.array(boards, dtype=np.uint64).reshape(-1, 1)
+    shifts = np.arange(0, 64, 4, dtype=np.uint64)
+    exponents = ((packed >> shifts) & np.uint64(CELL_MASK)).astype(int)
+    values = np.where(exponents > 0, np.left_shift(1, exponents), 0)
+    return values.reshape(-1, BOARD_SIZE, BOARD_SIZE)
+
+
+def from_exponents(exponents: np.ndarray) -> int:
+    """
+    Pack a 4x4 grid of exponents, as stored by Game, into a 64-bit board.
+
+    Args:
+        exponents (np.ndarray): A 4x4 grid of log2 tile values, 0 for empty cells.
+
+    Returns:
+        int: The packed board.
+
+    Raises:
+        ValueError: If an exponent is larger than MAX_EXPONENT.
+    """
+    cells = exponents.reshape(-1)
+    if cells.max() > MAX_EXPONENT:
+        raise ValueError(f"Exponent {cells.max()} does not fit a packed board, the largest is {MAX_EXPONENT}")
+    # Two cells per byte, the first one in the low nibble
+    return int.from_bytes((cells[0::2] | (cells[1::2] << 4)).tobytes(), "little")
+
+
+def to_exponents(board: int) -> np.ndarray:
+    """
+    Unpack a 64-bit board into a 4x4 grid of exponents.
+
+    Args:
+        board (int): The packed board.
+
+    Returns:
+        np.ndarray: A 4x4 uint8 grid of log2 tile values, 0 for empty cells.
+    """
+    shifts = np.arange(0, 64, 4, dtype=np.uint64)
+    return ((np.uint64(board) >> shifts) & np.uint64(CELL_MASK)).astype(np.uint8).reshape(BOARD_SIZE, BOARD_SIZE)
+
+
+def tile_exponent(value: int) -> int:
+    """Return the 4-bit exponent used to store a tile value."""
+    return value.bit_length() - 1 if value else 0
+
+
+def transpose(board: int) -> int:
+    """
+    Transpose the board so that rows become columns.
+
+    Args:
+        board (int): The packed board.
+
+    Returns:
+        int: The transposed packed board.
+    """
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def _apply_row_table(board: int, table: list[int]) -> int:
+    """Apply a row lookup table to each of the four rows of a board."""
+    return (
+        table[board & ROW_MASK]
+        | (table[(board >> 16) & ROW_MASK] << 16)
+        | (table[(board >> 32) & ROW_MASK] << 32)
+        | (table[(board >> 48) & ROW_MASK] << 48)
+    )
+
+
+def move_left(board: int) -> int:
+    """Slide and merge every row towards column 0."""
+    return _apply_row_table(board, ROW_LEFT_TABLE)
+
+
+def move_right(board: int) -> int:
+    """Slide and merge every row towards the last column."""
+    return _apply_row_table(board, ROW_RIGHT_TABLE)
+
+
+def move_up(board: int) -> int:
+    """Slide and merge every column towards row 0."""
+    return transpose(_apply_row_table(transpose(board), ROW_LEFT_TABLE))
+
+
+def move_down(board: int) -> int:
+    """Slide and merge every column towards the last row."""
+    return transpose(_apply_row_table(transpose(board), ROW_RIGHT_TABLE))
+
+
+MOVES = {"left": move_left, "up": move_up, "right": move_right, "down": move_down}
+
+
+def execute_move(board: int, direction: str) -> int:
+    """
+    Apply a move to a packed board.
+
+    Args:
+        board (int): The packed board.
+        direction (str): The direction of the move ('left', 'up', 'right', 'down').
+
+    Returns:
+        int: The resulting board, unchanged if the direction is unknown or the move is blocked.
+    """
+    move = MOVES.get(direction)
+    return move(board) if move is not None else board
+
+
+def empty_cells(board: int) -> list[int]:
+    """
+    List the bit offsets of all empty cells in row-major order.
+
+    Args:
+        board (int): The packed board.
+
+    Returns:
+        list[int]: Bit offsets (4 * (4 * r + c)) of the empty cells.
+    """
+    return [shift for shift in range(0, 64, 4) if not (board >> shift) & CELL_MASK]
+
+
+def count_empty(board: int) -> int:
+    """Count the empty cells on a packed board."""
+    return len(empty_cells(board))
+
+
+def can_move(board: int) -> bool:
+    """
+    Check whether any move changes the board.
+
+    Args:
+        board (int): The packed board.
+
+    Returns:
+        bool: True if at least one move is possible, otherwise False.
+    """
+    if move_left(board) != board or move_right(board) != board:
+        return True
+    transposed = transpose(board)
+    return move_left(transposed) != transposed or move_right(transposed) != transposed
+
+
+def flip_horizontal(board: int) -> int:
+    """Mirror the board left to right by reversing every row."""
+    return _apply_row_table(board, ROW_REVERSE_TABLE)
+
+
+def flip_vertical(board: int) -> int:
+    """Mirror the board top to bottom by reversing the order of the rows."""
+    return (
+        ((board & 0xFFFF) << 48)
+        | ((board & 0xFFFF0000) << 16)
+        | ((board >> 16) & 0xFFFF0000)
+        | (board >> 48)
+    )
+
+
+# The 8 symmetries of the square, encoded as bit flags applied in this order:
+# 1 = transpose, 2 = flip horizontally, 4 = flip vertically.
+SYMMETRY_COUNT = 8
+_DIRECTION_TRANSPOSE = {"left": "up", "up": "left", "right": "down", "down": "right"}
+_DIRECTION_FLIP_HORIZONTAL = {"left": "right", "right": "left", "up": "up", "down": "down"}
+_DIRECTION_FLIP_VERTICAL = {"left": "left", "right": "right", "up": "down", "down": "up"}
+
+
+def apply_symmetry(board: int, symmetry: int) -> int:
+    """
+    Transform a board with one of the 8 symmetries of the square.
+
+    Args:
+        board (int): The packed board.
+        symmetry (int): The symmetry, 0 to 7 (see SYMMETRY_COUNT).
+
+    Returns:
+        int: The transformed board.
+    """
+    if symmetry & 1:
+        board = transpose(board)
+    if symmetry & 2:
+        board = flip_horizontal(board)
+    if symmetry & 4:
+        board = flip_vertical(board)
+    return board
+
+
+def symmetry_direction(direction: str, symmetry: int) -> str:
+    """
+    Map a move direction into the frame of a transformed board, so that
+    apply_symmetry(execute_move(b, d), s) == execute_move(apply_symmetry(b, s), symmetry_direction(d, s)).
+    """
+    if symmetry & 1:
+        direction = _DIRECTION_TRANSPOSE[direction]
+    if symmetry & 2:
+        direction = _DIRECTION_FLIP_HORIZONTAL[direction]
+    if symmetry & 4:
+        direction = _DIRECTION_FLIP_VERTICAL[direction]
+    return direction
+
+
+def inverse_symmetry_direction(direction: str, symmetry: int) -> str:
+    """Map a move direction from the frame of a transformed board back to the original board."""
+    if symmetry & 4:
+        direction = _DIRECTION_FLIP_VERTICAL[direction]
+    if symmetry & 2:
+        direction = _DIRECTION_FLIP_HORIZONTAL[direction]
+    if symmetry & 1:
+        direction = _DIRECTION_TRANSPOSE[direction]
+    return direction
+
+
+def canonical(board: int) -> tuple[int, int]:
+    """
+    Reduce a board over the 8 symmetries of the square.
+
+    Args:
+        board (int): The packed board.
+
+    Returns:
+        tuple[int, int]: The smallest transformed board and the lowest symmetry that produces it.
+    """
+    best_board, best_symmetry = board, 0
+    for symmetry in range(1, SYMMETRY_COUNT):
+        transformed = apply_symmetry(board, symmetry)
+        if transformed < best_board:
+            best_board, best_symmetry = transformed, symmetry
+    return best_board, best_symmetry
@@ -1,6 +1,16 @@
 # Constants
 # Number of blocks on rows and cols
 GRID_SIZE = 4
+# AI search time budget per move in milliseconds
+AI_TIME_BUDGET_MS = 100
+# Frame rate cap of the pygame window
+FPS = 60
+# Move book loaded by main.py when the file exists, see movebook.py
+MOVE_BOOK_PATH = "movebook.bin"
+# N-tuple network weights loaded by main.py when the file exists, see ntuple.py
+NTUPLE_WEIGHTS_PATH = "ntuple.npz"
+# Tuned heuristic weights loaded by main.py when the file exists and there is no n-tuple network, see tuning.py
+HEURISTIC_WEIGHTS_PATH = "heuristic_weights.json"
 # Uniform formating of each cell
 CELL_SIZE = 100
 GAP_SIZE = 10
@@ -0,0 +1,299 @@
+"""
+Adaptive search depth: picks the depth of every move from the board within a node budget.
+
+The number of nodes a search visits grows with the depth, and for a given depth mostly
+with the number of empty cells (the branching of the chance nodes) and the number of
+distinct tile values (how many merges the moves can make). DepthPolicy predicts the
+node count of every depth from these two features with a log-linear model per depth,
+and searches as deep as the node budget allows. When the evaluation of the recent
+positions is falling the budget is multiplied by danger_factor, so the AI looks further
+ahead in the positions where mistakes end games.
+
+The calibration run plays seeded games, measures AI.nodes_searched of find_best_move at
+every depth on their positions and fits the model on this machine and search setup.
+Deeper depths of expensive positions are skipped to bound its run time, which would
+leave only cheap positions at those depths. The skipped depths are kept as censored
+samples, and every depth with censored samples is fitted on a subsample of positions
+that were measured at all depths.
+
+Example:
+    python depthpolicy.py calibrate --games 4 --max-depth 6 --output depthpolicy.json
+    python simulate.py --games 20 --policy depthpolicy.json --node-budget 5000
+"""
+import argparse
+import json
+import time
+from collections import deque
+from typing import Optional
+
+import numpy as np
+
+from game import Game, AI
+
+# Coefficients of log(nodes) = c0 + c1 * log(1 + empty cells) + c2 * distinct tile values for
+# depths 1 to 6, fitted by a 3-game calibration run for the default minimax AI. No position of
+# that run reached max_nodes before depth 6, so every depth was fitted on all positions.
+DEFAULT_MODEL = {
+    1: [1.167, 0.011, 0.006],
+    2: [2.56, 0.775, -0.036],
+    3: [3.844, 0.875, -0.04],
+    4: [5.274, 1.531, -0.103],
+    5: [6.237, 1.635, -0.101],
+    6: [7.933, 2.188, -0.184],
+}
+
+
+def board_features(grid: np.ndarray) -> tuple[int, int]:
+    """
+    Returns the features of the node-count model.
+
+    Args:
+        grid (np.ndarray): The game grid, tile values or exponents.
+
+    Returns:
+        tuple[int, int]: The number of empty cells and the number of distinct tile values.
+    """
+    occupied = grid[grid > 0]
+    return int(grid.size - occupied.size), len(np.unique(occupied))
+
+
+def _feature_vector(empty: int, distinct: int) -> np.ndarray:
+    return np.array([1.0, np.log1p(empty), distinct])
+
+
+class DepthPolicy:
+    """
+    Chooses the search depth of every move within a node budget.
+
+    The policy keeps the evaluations of the last positions it was asked about, so one
+    instance should be used for one game at a time; call reset between games.
+    """
+
+    def __init__(self, node_budget: float = 5000, model: Optional[dict[int, list[float]]] = None,
+                 min_depth: int = 1, max_depth: int = 6, danger_factor: float = 4.0, trend_window: int = 4,
+                 danger_drop: float = 0.05) -> None:
+        """
+        Args:
+            node_budget (float): Largest predicted node count of a move search.
+            model (Optional[dict[int, list[float]]]): Coefficients per depth, see DEFAULT_MODEL.
+            min_depth (int): Depth used when even it exceeds the budget.
+            max_depth (int): Deepest depth, limited to the depths of the model.
+            danger_factor (float): Budget multiplier while the evaluation is falling.
+            trend_window (int): Number of recent evaluations the trend is measured over.
+            danger_drop (float): Relative fall of the evaluation over the window that counts as danger.
+        """
+        self.model = {int(depth): np.array(coefficients) for depth, coefficients in (model or DEFAULT_MODEL).items()}
+        self.node_budget = node_budget
+        self.min_depth = min_depth
+        self.max_depth = min(max_depth, max(self.model))
+        self.danger_factor = danger_factor
+        self.danger_drop = danger_drop
+        self.evaluations: deque[float] = deque(maxlen=trend_window)
+        self.depths: list[int] = []  # Depth chosen for each move
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "DepthPolicy":
+        """
+        Creates a policy from a calibration file written by calibrate.
+
+        Args:
+            path (str): The calibration file.
+            **kwargs: Further DepthPolicy arguments, they override the file's node_budget.
+
+        Returns:
+            DepthPolicy: The policy.
+        """
+        with open(path) as f:
+            calibration = json.load(f)
+        kwargs.setdefault("node_budget", calibration["node_budget"])
+        return cls(model=calibration["model"], **kwargs)
+
+    def reset(self) -> None:
+        """Forgets the evaluations of the previous game."""
+        self.evaluations.clear()
+
+    def predicted_nodes(self, depth: int, empty: int, distinct: int) -> float:
+        """Predicted node count of a find_best_move search at a depth."""
+        return float(np.exp(self.model[depth] @ _feature_vector(empty, distinct)))
+
+    def in_danger(self) -> bool:
+        """True if the evaluation fell by more than danger_drop over the recent positions."""
+        if len(self.evaluations) < self.evaluations.maxlen:
+            return False
+        first, last = self.evaluations[0], self.evaluations[-1]
+        return last < first - self.danger_drop * max(abs(first), 1.0)
+
+    def choose_depth(self, grid: np.ndarray, evaluation: float) -> int:
+        """
+        Picks the search depth of a position.
+
+        Args:
+            grid (np.ndarray): The game grid.
+            evaluation (float): The heuristic evaluation of the grid, for the trend.
+
+        Returns:
+            int: The deepest depth whose predicted node count fits the budget, at least min_depth.
+        """
+        self.evaluations.append(evaluation)
+        empty, distinct = board_features(grid)
+        budget = self.node_budget * (self.danger_factor if self.in_danger() else 1.0)
+        depth = self.min_depth
+        for candidate in range(self.min_depth + 1, self.max_depth + 1):
+            if self.predicted_nodes(candidate, empty, distinct) > budget:
+                break
+            depth = candidate
+        self.depths.append(depth)
+        return depth
+
+
+def measure_positions(games: int, seed: int = 0, max_depth: int = 6, max_nodes: int = 50000, every: int = 10,
+                      play_depth: int = 2, search: str = "minimax", full_every: int = 3) -> list[tuple]:
+    """
+    Measures the node counts of find_best_move on the positions of seeded games.
+
+    Args:
+        games (int): Number of games, game i uses seed + i.
+        seed (int): Seed of the first game.
+        max_depth (int): Deepest depth to measure.
+        max_nodes (int): Deeper depths of a position are skipped once a search visited more nodes.
+        every (int): Measure every n-th position of a game.
+        play_depth (int): Search depth of the AI playing the games.
+        search (str): Search algorithm of the measured AI.
+        full_every (int): Every n-th measured position is searched at all depths, ignoring max_nodes.
+
+    Returns:
+        list[tuple]: (depth, empty cells, distinct values, nodes, seconds, full) samples, where full
+        marks the positions measured at all depths. Skipped depths are censored samples whose
+        nodes and seconds are None.
+    """
+    samples = []
+    positions = 0
+    for game_seed in range(seed, seed + games):
+        game = Game(use_bitboard=True, auto_reset=False)
+        game.resetgame(game_seed)
+        player = AI(game)
+        measured = AI(Game(use_bitboard=True), search=search)
+        while not game.game_over():
+            if game.moves % every == 0:
+                empty, distinct = board_features(game.grid)
+                full = positions % full_every == 0
+                positions += 1
+                skipped = False
+                for depth in range(1, max_depth + 1):
+                    if skipped:
+                        samples.append((depth, empty, distinct, None, None, full))
+                        continue
+                    nodes_before = measured.nodes_searched
+                    start = time.perf_counter()
+                    measured.find_best_move(game.grid, depth)
+                    nodes = measured.nodes_searched - nodes_before
+                    samples.append((depth, empty, distinct, nodes, time.perf_counter() - start, full))
+                    skipped = nodes > max_nodes and not full
+            game.move(player.find_best_move(game.grid, play_depth))
+        print(f"game {game_seed}: {game.moves} moves, {len(samples)} samples", flush=True)
+    return samples
+
+
+def fit_samples(samples: list[tuple], depth: int) -> list[tuple]:
+    """
+    Selects the measured samples of a depth that the model is fitted on.
+
+    Positions that reached a depth only because they were cheap at the shallower depths are
+    not representative of it, so a depth with censored samples uses the full positions only.
+
+    Args:
+        samples (list[tuple]): Samples from measure_positions.
+        depth (int): The depth.
+
+    Returns:
+        list[tuple]: The uncensored samples of the depth to fit.
+    """
+    rows = [sample for sample in samples if sample[0] == depth]
+    if any(sample[3] is None for sample in rows):
+        rows = [sample for sample in rows if sample[5]]
+    return [sample for sample in rows if sample[3] is not None]
+
+
+def fit_model(samples: list[tuple]) -> dict[int, list[float]]:
+    """
+    Fits the log-linear node-count model of every depth by least squares.
+
+    Args:
+        samples (list[tuple]): Samples from measure_positions.
+
+    Returns:
+        dict[int, list[float]]: The coefficients of every depth with at least 3 samples to fit, see fit_samples.
+    """
+    model = {}
+    for depth in sorted({sample[0] for sample in samples}):
+        rows = fit_samples(samples, depth)
+        if len(rows) < 3:
+            continue
+        features = np.array([_feature_vector(sample[1], sample[2]) for sample in rows])
+        targets = np.log([max(sample[3], 1) for sample in rows])
+        coefficients, *_ = np.linalg.lstsq(features, targets, rcond=None)
+        model[depth] = [round(float(c), 3) for c in coefficients]
+    return model
+
+
+def calibrate(output: str, games: int = 4, seed: int = 0, max_depth: int = 6, max_nodes: int = 50000,
+              every: int = 10, node_budget: float = 5000, search: str = "minimax", full_every: int = 3) -> dict:
+    """
+    Measures node counts, fits the model and writes a calibration file for DepthPolicy.load.
+
+    Args:
+        output (str): Path of the calibration file.
+        games (int): Number of games to measure positions of.
+        seed (int): Seed of the first game.
+        max_depth (int): Deepest depth to measure.
+        max_nodes (int): Deeper depths of a position are skipped once a search visited more nodes.
+        every (int): Measure every n-th position of a game.
+        node_budget (float): Default node budget stored in the file.
+        search (str): Search algorithm of the measured AI.
+        full_every (int): Every n-th measured position is searched at all depths, ignoring max_nodes.
+
+    Returns:
+        dict: The calibration, as written to the file.
+    """
+    samples = measure_positions(games, seed, max_depth, max_nodes, every, search=search, full_every=full_every)
+    model = fit_model(samples)
+    per_depth = {}
+    for depth in model:
+        rows = fit_samples(samples, depth)
+        nodes = sum(sample[3] for sample in rows)
+        seconds = sum(sample[4] for sample in rows)
+        per_depth[depth] = {"samples": len(rows), "mean_nodes": nodes / len(rows),
+                            "mean_ms": 1000 * seconds / len(rows), "us_per_node": 1e6 * seconds / max(nodes, 1)}
+    calibration = {"search": search, "node_budget": node_budget, "model": model, "depths": per_depth}
+    with open(output, "w") as f:
+        json.dump(calibration, f, indent=2)
+    return calibration
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Calibrate the adaptive search depth policy.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    calibrate_parser = commands.add_parser("calibrate", help="fit the node-count model to measured searches")
+    calibrate_parser.add_argument("--output", default="depthpolicy.json", help="calibration file to write")
+    calibrate_parser.add_argument("--games", type=int, default=4, help="number of games to measure positions of")
+    calibrate_parser.add_argument("--seed", type=int, default=0, help="seed of the first game, game i uses seed + i")
+    calibrate_parser.add_argument("--max-depth", type=int, default=6, help="deepest depth to measure")
+    calibrate_parser.add_argument("--max-nodes", type=int, default=50000,
+                                  help="skip deeper depths of a position once a search visited more nodes")
+    calibrate_parser.add_argument("--every", type=int, default=10, help="measure every n-th position")
+    calibrate_parser.add_argument("--full-every", type=int, default=3,
+                                  help="search every n-th measured position at all depths, ignoring --max-nodes")
+    calibrate_parser.add_argument("--node-budget", type=float, default=5000, help="default budget stored in the file")
+    calibrate_parser.add_argument("--search", choices=["minimax", "expectimax"], default="minimax")
+    args = parser.parse_args()
+
+    calibration = calibrate(args.output, args.games, args.seed, args.max_depth, args.max_nodes, args.every,
+                            args.node_budget, args.search, args.full_every)
+    for depth, stats in calibration["depths"].items():
+        print(f"depth {depth}: {stats['samples']} samples, {stats['mean_nodes']:.0f} nodes, "
+              f"{stats['mean_ms']:.1f} ms, model {calibration['model'][depth]}")
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
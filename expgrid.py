@@ -0,0 +1,134 @@
+import numpy as np
+
+# Board-size-generic grids of uint8 log2 exponents (0 = empty, 1 = 2, 2 = 4, ...).
+# Used by Game and AI for every board size; 4x4 boards can use the faster packed
+# representation of bitboard.py instead. All functions also work on stacks of
+# grids, i.e. arrays of shape (..., size, size).
+MIN_SIZE = 3
+MAX_SIZE = 8
+
+# Number of np.rot90 turns that bring a move to "left", as in Game.move
+ROTATIONS = {"left": 0, "up": 1, "right": 2, "down": 3}
+
+
+def check_size(size: int) -> None:
+    """Raises ValueError for a board size outside MIN_SIZE to MAX_SIZE."""
+    if not MIN_SIZE <= size <= MAX_SIZE:
+        raise ValueError(f"Board size must be between {MIN_SIZE} and {MAX_SIZE}, got {size}")
+
+
+def to_exponents(grid: np.ndarray) -> np.ndarray:
+    """
+    Converts tile values (0, 2, 4, ...) to uint8 exponents.
+
+    Args:
+        grid (np.ndarray): Tile values.
+
+    Returns:
+        np.ndarray: The exponents, same shape.
+    """
+    grid = np.asarray(grid)
+    exponents = np.zeros(grid.shape, dtype=np.uint8)
+    occupied = grid > 0
+    exponents[occupied] = np.log2(grid[occupied]).astype(np.uint8)
+    return exponents
+
+
+def to_values(exponents: np.ndarray) -> np.ndarray:
+    """
+    Converts uint8 exponents to int64 tile values.
+
+    Args:
+        exponents (np.ndarray): Exponents, 0 for empty cells.
+
+    Returns:
+        np.ndarray: The tile values, same shape.
+    """
+    return np.where(exponents > 0, np.left_shift(1, exponents.astype(np.int64)), 0)
+
+
+def slide_left(rows: np.ndarray) -> np.ndarray:
+    """
+    Slides and merges rows towards column 0, with the rules of Game.slide_and_merge.
+
+    Works on all rows at once: tiles are packed to the left, then every column is
+    merged with the pending tile of its row in a loop over the (at most 8) columns.
+
+    Args:
+        rows (np.ndarray): Exponents of shape (..., width).
+
+    Returns:
+        np.ndarray: The moved rows, same shape and dtype.
+    """
+    shape = rows.shape
+    flat = rows.reshape(-1, shape[-1])
+    # Pack the tiles to the left, keeping their order
+    order = np.argsort(flat == 0, axis=1, kind="stable")
+    packed = np.take_along_axis(flat, order, axis=1)
+
+    row_index = np.arange(len(flat))
+    result = np.zeros_like(flat)
+    write = np.zeros(len(flat), dtype=np.intp)
+    pending = np.zeros(len(flat), dtype=flat.dtype)  # Tile waiting for a possible merge, 0 if none
+    for column in range(shape[-1]):
+        value = packed[:, column]
+        merge = (value > 0) & (value == pending)
+        flush = (value > 0) & ~merge & (pending > 0)
+        # A merge writes the doubled tile, a different tile first writes the pending one
+        result[row_index[merge], write[merge]] = pending[merge] + 1
+        result[row_index[flush], write[flush]] = pending[flush]
+        write += merge | flush
+        pending = np.where(merge, 0, np.where(value > 0, value, pending))
+    last = pending > 0
+    result[row_index[last], write[last]] = pending[last]
+    return result.reshape(shape)
+
+
+def move(grid: np.ndarray, direction: str) -> np.ndarray:
+    """
+    Applies a move without spawning a tile.
+
+    Args:
+        grid (np.ndarray): Exponents of shape (..., size, size).
+        direction (str): The direction of the move ('left', 'up', 'right', 'down').
+
+    Returns:
+        np.ndarray: The moved grid, a new array.
+    """
+    turns = ROTATIONS[direction]
+    rotated = np.rot90(grid, turns, axes=(-2, -1))
+    return np.ascontiguousarray(np.rot90(slide_left(rotated), -turns, axes=(-2, -1)))
+
+
+def can_move(grid: np.ndarray) -> bool:
+    """
+    Checks whether any move changes the grid.
+
+    Args:
+        grid (np.ndarray): Exponents of shape (size, size).
+
+    Returns:
+        bool: True if there is an empty cell or two equal neighbours.
+    """
+    return bool((grid == 0).any() or (grid[:, :-1] == grid[:, 1:]).any() or (grid[:-1, :] == grid[1:, :]).any())
+
+
+def snake_weights(size: int) -> np.ndarray:
+    """
+    Positional weights that grow along a snake path, ending in the bottom-left corner.
+
+    The path runs left to right on the top row, right to left on the next, and so on,
+    and the weight of the k-th cell on it is 2 ** (k + 1). For 4x4 this is AI's
+    original perfectsnake. Larger boards use float64, as the weights exceed int64.
+
+    Args:
+        size (int): The board size.
+
+    Returns:
+        np.ndarray: A (size, size) array of weights.
+    """
+    exponents = np.arange(1, size * size + 1).reshape(size, size)
+    exponents[1::2] = exponents[1::2, ::-1]
+    if size <= 4:
+        return np.left_shift(1, exponents).astype(np.int64)
+    return np.power(2.0, exponents)
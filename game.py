@@ -1,20 +1,67 @@
+import os
+import time
 from multiprocessing import Pool
 from multiprocessing.pool import ThreadPool
 import numpy as np
-from typing import Optional, Tuple
+from typing import Hashable, Optional, Tuple
+import bitboard
+import expgrid
+from heuristic import RowTableEvaluator
+from search_stats import SearchStats
+from transposition import TranspositionTable
 from constants import GRID_SIZE, CELL_SIZE, GAP_SIZE, WIDTH, HEIGHT, BACKGROUND_COLOR, TEXT_COLOR, CELL_COLOR
 
 class Game:
-    def __init__(self) -> None:
+    def __init__(self, use_bitboard: bool = False, auto_reset: bool = True,
+                 recorder: Optional["GameRecorder"] = None, size: int = GRID_SIZE) -> None:
         """
         Initialize the game with a score, move counter, and starting grid configuration.
+
+        Args:
+            use_bitboard (bool): Resolve moves on the packed 64-bit board representation
+                from bitboard.py instead of the NumPy rows. Both give identical grids; once
+                a 32768 tile is on the board, moves use the NumPy rows, which can merge it.
+                Only available for 4x4 boards.
+            auto_reset (bool): Reset the game as soon as a move ends it. Disable to keep
+                the final grid, e.g. when collecting statistics.
+            recorder (Optional[GameRecorder]): Streams every move of every game to a record file.
+                Only available for 4x4 boards.
+            size (int): Number of rows and columns, from expgrid.MIN_SIZE to expgrid.MAX_SIZE.
         """
+        expgrid.check_size(size)
+        if size != bitboard.BOARD_SIZE and (use_bitboard or recorder is not None):
+            raise ValueError(f"use_bitboard and recorder need a {bitboard.BOARD_SIZE}x{bitboard.BOARD_SIZE} board")
+        self.size = size
+        self.use_bitboard = use_bitboard
+        self.auto_reset = auto_reset
+        self.recorder = recorder
         self.score = 0
         self.moves = 0
-        self.grid = np.zeros((GRID_SIZE, GRID_SIZE), dtype=int)
-        self.grid[GRID_SIZE-1, GRID_SIZE-1] = 2
+        self.seed: Optional[int] = None  # Seed of np.random at the start of the game, if it was seeded
+        self.last_spawn: Optional[tuple[int, int]] = None  # (cell index, tile value) of the last spawned tile
+        self.exponents = np.zeros((size, size), dtype=np.uint8)  # log2 of every tile, 0 for empty cells
         self.resetgame()
+
+    @property
+    def grid(self) -> np.ndarray:
+        """
+        The tile values (0, 2, 4, ...) of the board.
+
+        The board is stored as exponents and the grid is derived from them, so it is a new,
+        read-only array. Assign a whole grid to change the board, writes into it would be lost.
+        """
+        grid = expgrid.to_values(self.exponents)
+        grid.setflags(write=False)
+        return grid
+
+    @grid.setter
+    def grid(self, grid: np.ndarray) -> None:
+        self.exponents = expgrid.to_exponents(grid)
     
+    def packed(self) -> bool:
+        """True if moves are resolved on packed boards: in bitboard mode, until a 32768 tile appears."""
+        return self.use_bitboard and self.exponents.max() < bitboard.MAX_EXPONENT
+
     def score_function(self, grid: np.ndarray) -> int:
         """
         Calculate the score based on the highest tile and the number of empty cells.
@@ -29,12 +76,19 @@ class Game:
         max_tile = np.max(grid)  # Highest tile
         return max_tile + empty_cells * 10  # Reward empty spaces
 
-    def resetgame(self) -> None:
+    def resetgame(self, seed: Optional[int] = None) -> None:
         """
         Reset the game by clearing the grid, resetting the score and move counter.
+
+        Args:
+            seed (Optional[int]): Seed np.random with this value, so the game can be replayed.
         """
-        self.grid = np.zeros((GRID_SIZE, GRID_SIZE), dtype=int)
-        self.grid[GRID_SIZE-1, GRID_SIZE-1] = 2
+        if seed is not None:
+            np.random.seed(seed)
+        self.seed = seed
+        self.last_spawn = None
+        self.exponents = np.zeros((self.size, self.size), dtype=np.uint8)
+        self.exponents[-1, -1] = 1  # A 2 in the bottom-right corner
         self.moves = 0
         self.score = 0
 
@@ -50,14 +104,25 @@ class Game:
         """
         return [(2, 0.9), (4, 0.1)]
 
-    def add_tile(self) -> None:
+    def add_tile(self, spawn: Optional[tuple[int, int]] = None) -> None:
         """
         Add a new tile (2 or 4) to a random empty cell based on predefined probabilities.
+
+        Args:
+            spawn (Optional[tuple[int, int]]): Place this (cell index, tile value) instead of a
+                random tile, e.g. when replaying a recorded game.
         """
-        empty_cells = [(r, c) for r in range(GRID_SIZE) for c in range(GRID_SIZE) if self.grid[r, c] == 0]
+        self.last_spawn = None
+        if spawn is not None:
+            cell, tile_value = spawn
+            self.exponents[divmod(cell, self.size)] = bitboard.tile_exponent(tile_value)
+            self.last_spawn = spawn
+            return
+
+        empty_cells = np.flatnonzero(self.exponents == 0)  # Row-major, like the cell indices of last_spawn
         
-        if empty_cells:
-            r, c = empty_cells[np.random.randint(len(empty_cells))]
+        if len(empty_cells):
+            cell = int(empty_cells[np.random.randint(len(empty_cells))])
             
             # Get the tile spawn probabilities based on the current score
             tile_probabilities = self.get_tile_spawn_probabilities(self.grid)
@@ -69,7 +134,8 @@ class Game:
             for tile_value, probability in tile_probabilities:
                 cumulative_prob += probability
                 if rand < cumulative_prob:
-                    self.grid[r, c] = tile_value
+                    self.exponents[divmod(cell, self.size)] = bitboard.tile_exponent(tile_value)
+                    self.last_spawn = (cell, tile_value)
                     break
 
     def slide_and_merge(self, row: list[int]) -> np.ndarray:
@@ -106,27 +172,34 @@ class Game:
         # Return the new row filled with zeros to match GRID_SIZE
         return np.pad(new_row, (0, len(row) - len(new_row)), mode='constant').astype(np.int16)
 
-    def move(self, direction: str) -> None:
+    def move(self, direction: str, spawn: Optional[tuple[int, int]] = None) -> None:
         """
         Move tiles in the given direction, merge tiles where possible, and add a new tile.
         
         Args:
             direction (str): The direction of the move ('left', 'right', 'up', 'down').
+            spawn (Optional[tuple[int, int]]): The (cell index, tile value) to add instead of a random tile.
         """
-        old_grid = self.grid.copy()
-        rotations = {"left": 0, "up": 1, "right": 2, "down": 3}
+        old_exponents = self.exponents
         
-        if direction in rotations:
-            self.grid = np.rot90(self.grid, rotations[direction])  # Rotate to "left"
-            self.grid = np.array([self.slide_and_merge(row) for row in self.grid])
-            self.grid = np.rot90(self.grid, -rotations[direction])  # Rotate back
+        if self.packed():
+            self.exponents = bitboard.to_exponents(bitboard.execute_move(bitboard.from_exponents(old_exponents), direction))
+        elif direction in expgrid.ROTATIONS:
+            self.exponents = expgrid.move(old_exponents, direction)
 
-        if not np.array_equal(old_grid, self.grid):
+        if not np.array_equal(old_exponents, self.exponents):
+            # Records hold packed boards, so the recording of a game stops at its first tile above 32768
+            recording = self.recorder is not None and old_exponents.max() <= bitboard.MAX_EXPONENT
+            if recording and self.moves == 0:
+                self.recorder.start_game(bitboard.from_exponents(old_exponents), self.seed)
             self.moves += 1
             self.score = self.score_function(self.grid)
-            self.add_tile()
+            self.add_tile(spawn)
+            if recording:
+                self.recorder.record_move(bitboard.from_exponents(old_exponents), direction, self.last_spawn,
+                                          self.score, self.game_over())
 
-        if self.game_over():
+        if self.auto_reset and self.game_over():
             print("Game Over! Resetting the game.")
             self.resetgame()  # Reset the game if no moves are available
     
@@ -137,19 +210,13 @@ class Game:
         Returns:
             bool: True if no moves are possible, otherwise False.
         """
+        # Empty cells or adjacent tiles that can merge. Checked on the stored exponents in bitboard
+        # mode too, packing them first would cost more than the check.
+        return not expgrid.can_move(self.exponents)
+
+class SearchTimeout(Exception):
+    """Raised inside a search when the per-move time budget has run out."""
 
-        # Check for empty cells
-        if np.any(self.grid == 0):
-            return False
-        
-        # Check for adjacent tiles that can merge
-        for r in range(GRID_SIZE):
-            for c in range(GRID_SIZE):
-                if r < GRID_SIZE - 1 and self.grid[r, c] == self.grid[r + 1, c]:
-                    return False
-                if c < GRID_SIZE - 1 and self.grid[r, c] == self.grid[r, c + 1]:
-                    return False
-        return True
 
 class AI:
     """
@@ -157,20 +224,79 @@ class AI:
     The AI selects the best move to maximize score and survival using evaluation functions.
     """
     
-    def __init__(self, game: "Game2048"):
+    def __init__(self, game: "Game2048", transposition_table: Optional[TranspositionTable] = None,
+                 persist_transpositions: bool = True, search: str = "minimax", prob_threshold: float = 1e-4,
+                 max_chance_children: Optional[int] = None, seed: Optional[int] = None, batch_leaves: bool = True,
+                 instrument: bool = False, trace_path: Optional[str] = None,
+                 evaluator: Optional["RowTableEvaluator | NTupleNetwork"] = None, make_unmake: bool = False,
+                 move_book: Optional["MoveBook"] = None, depth_policy: Optional["DepthPolicy"] = None):
         """
         Initializes the AI with a reference to the game instance and predefined move directions.
 
         Args:
             game (Game2048): The 2048 game instance.
+            transposition_table (Optional[TranspositionTable]): Cache of Minimax results, disabled if None.
+            persist_transpositions (bool): Keep cached results across find_best_move calls instead of
+                clearing the table before every move.
+            search (str): Search algorithm used by find_best_move, 'minimax' or 'expectimax'.
+            prob_threshold (float): Expectimax only. Spawn sequences less likely than this are scored
+                with the heuristic instead of being searched deeper.
+            max_chance_children (Optional[int]): Expectimax only. Maximum number of empty cells
+                expanded per chance node, sampled at random when there are more. None expands all.
+            seed (Optional[int]): Seed for the chance-node sampling generator.
+            batch_leaves (bool): Score all leaves below a last-ply node with one evaluate_batch call
+                instead of calling evaluate once per leaf.
+            instrument (bool): Collect a SearchStats for every move decision, available as last_stats.
+            trace_path (Optional[str]): Append the stats of every move as a JSON line to this file.
+                Implies instrument.
+            evaluator (Optional[RowTableEvaluator | NTupleNetwork]): Scores leaves on packed boards
+                instead of evaluate, e.g. the table-driven heuristic or a trained n-tuple network.
+                None uses evaluate.
+            make_unmake (bool): Minimax only. Search NumPy grids with MakeUnmakeSearch, which applies
+                moves and spawns in preallocated per-depth buffers instead of copying the grid at
+                every node. Packed boards in bitboard mode are searched as before.
+            move_book (Optional[MoveBook]): Precomputed moves consulted by the find_best_move
+                variants before searching.
+            depth_policy (Optional[DepthPolicy]): Picks the depth of find_best_move_adaptive
+                from the position, see depthpolicy.py.
+
+        The board size is taken from the game. NumPy searches run on grids of uint8 exponents,
+        like Game.exponents; the evaluator and the move book need a 4x4 board.
         """
+        if search not in ("minimax", "expectimax"):
+            raise ValueError(f"Unknown search algorithm: {search!r}")
+        if make_unmake and search != "minimax":
+            raise ValueError("make_unmake is only supported by the minimax search")
+        if game.size != bitboard.BOARD_SIZE and (evaluator is not None or move_book is not None):
+            raise ValueError(f"evaluator and move_book need a {bitboard.BOARD_SIZE}x{bitboard.BOARD_SIZE} board")
         self.game = game
-        self.perfectsnake = np.array((
-            [2, 2**2, 2**3, 2**4], 
-            [2**8, 2**7, 2**6, 2**5], 
-            [2**9, 2**10, 2**11, 2**12], 
-            [2**16, 2**15, 2**14, 2**13]
-        ))
+        self.size = game.size
+        self.transposition_table = transposition_table
+        self.persist_transpositions = persist_transpositions
+        self.search = search
+        self.prob_threshold = prob_threshold
+        self.max_chance_children = max_chance_children
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.pool: Optional[Pool] = None  # Worker processes of find_best_move_mult, see start_pool
+        self.pool_processes = 0
+        self.batch_leaves = batch_leaves
+        self.evaluator = evaluator
+        self.make_unmake = make_unmake
+        self.move_book = move_book
+        self.depth_policy = depth_policy
+        self.book_hits = 0  # Moves answered from the move book
+        self.nodes_searched = 0  # Search nodes visited, including leaves, since the AI was created
+        self.instrument = instrument or trace_path is not None
+        self.trace_path = trace_path
+        self.stats: Optional[SearchStats] = None  # Stats of the decision in progress, None when not instrumenting
+        self.last_stats: Optional[SearchStats] = None
+        self._stats_start = (0.0, 0, 0)
+        self.deadline: Optional[float] = None  # perf_counter() time at which a timed search pass is aborted
+        self.cancelled = False  # Set by cancel() to stop find_best_move_timed from another thread, reset by it
+        self.last_search_depth = 0
+        self.search_depths: list[int] = []  # Depth searched by find_best_move_timed or find_best_move_adaptive for each move
+        self.perfectsnake = expgrid.snake_weights(self.size)
         self.directions = {0: "left", 1: "up", 2: "right", 3: "down"}
         self.directions_list = ["left", "up", "right", "down"]
 
@@ -227,7 +353,136 @@ class AI:
 
         return max(perfection + smoothness_score + empty_score + merge_bonus + penalty_max + penalty_second_max + sorted_bonus, 0)  # Slightly boost the heuristic
     
-    def simulate_move(self, grid: np.ndarray, move: str) -> Optional[np.ndarray]:
+    def evaluate_batch(self, grids: np.ndarray) -> np.ndarray:
+        """
+        Vectorized version of evaluate that scores a stack of grids in one pass.
+
+        Gives the same values as calling evaluate on each grid, computed in 64-bit
+        integers so large tiles cannot overflow.
+
+        Args:
+            grids (np.ndarray): An (N, size, size) array of grids.
+
+        Returns:
+            np.ndarray: The N heuristic scores.
+        """
+        grids = np.asarray(grids, dtype=np.int64)
+        flat = grids.reshape(len(grids), -1)
+
+        smoothness_score = -np.abs(np.diff(grids, axis=2)).sum(axis=(1, 2))
+        perfection = (self.perfectsnake * grids).sum(axis=(1, 2))
+        empty_score = np.square((flat == 0).sum(axis=1))
+
+        merge_score = (grids[:, :, :-1] == grids[:, :, 1:]).sum(axis=(1, 2)) + (grids[:, :-1, :] == grids[:, 1:, :]).sum(axis=(1, 2))
+        merge_bonus = merge_score * flat.max(axis=1)
+
+        # Same tiles as evaluate picks: the first and second entries of the sorted distinct values
+        sorted_values = np.sort(flat, axis=1)
+        max_tile = sorted_values[:, 0]
+        larger = sorted_values > max_tile[:, None]
+        second_max_tile = np.where(larger.any(axis=1), sorted_values[np.arange(len(flat)), larger.argmax(axis=1)], 0)
+
+        bottom_row = grids[:, -1, :]
+        penalty_max = np.where((bottom_row == max_tile[:, None]).any(axis=1), 0, -np.square(max_tile))
+        penalty_second_max = np.where((bottom_row == second_max_tile[:, None]).any(axis=1), 0, -np.square(second_max_tile))
+
+        is_sorted = (bottom_row[:, :-1] >= bottom_row[:, 1:]).all(axis=1)
+        sorted_bonus = np.where(is_sorted, bottom_row.sum(axis=1) * 0.2, 0)
+
+        total = perfection + smoothness_score + empty_score + merge_bonus + penalty_max + penalty_second_max + sorted_bonus
+        return np.maximum(total, 0)
+
+    def evaluate_leaves(self, grids: list) -> np.ndarray:
+        """
+        Scores a list of grids or packed boards with a single evaluate_batch or evaluator call.
+
+        Args:
+            grids (list | np.ndarray): Exponent grids (np.ndarray) or packed boards (int), all in the
+                same representation, or an (N, size, size) array of exponent grids.
+
+        Returns:
+            np.ndarray: The heuristic score of each grid.
+        """
+        if len(grids) == 0:
+            return np.zeros(0)
+        self.nodes_searched += len(grids)
+        if self.stats is not None:
+            self.stats.leaf_evaluations += len(grids)
+        if self.evaluator is not None:
+            boards = grids if isinstance(grids[0], int) else [bitboard.from_exponents(grid) for grid in grids]
+            return self.evaluator.evaluate_boards(np.array(boards, dtype=np.uint64))
+        if isinstance(grids[0], int):
+            return self.evaluate_batch(bitboard.decode_batch(grids))
+        return self.evaluate_batch(expgrid.to_values(grids if isinstance(grids, np.ndarray) else np.stack(grids)))
+
+    def evaluate_state(self, grid: np.ndarray | int) -> float:
+        """Evaluates an exponent grid or a packed board with the evaluator, or the heuristic evaluation function."""
+        if self.stats is not None:
+            self.stats.leaf_evaluations += 1
+        if self.evaluator is not None:
+            return self.evaluator.evaluate_board(grid if isinstance(grid, int) else bitboard.from_exponents(grid))
+        return self.evaluate(bitboard.decode(grid) if isinstance(grid, int) else expgrid.to_values(grid))
+
+    def board_key(self, grid: np.ndarray | int) -> Hashable:
+        """
+        Returns the transposition table key of an exponent grid or a packed board.
+
+        4x4 grids use their packed board, so NumPy and bitboard searches share keys.
+        """
+        if isinstance(grid, int):
+            return grid
+        if self.size == bitboard.BOARD_SIZE and grid.max() <= bitboard.MAX_EXPONENT:
+            return bitboard.from_exponents(grid)
+        return grid.tobytes()
+
+    def search_grid(self, grid: np.ndarray) -> np.ndarray | int:
+        """
+        Converts a grid of tile values to the representation searched by the AI.
+
+        Args:
+            grid (np.ndarray): The game grid, as in Game.grid.
+
+        Returns:
+            np.ndarray | int: A packed board in bitboard mode, otherwise a grid of uint8 exponents.
+            Grids with a 32768 tile are searched as exponents, whose moves can merge it.
+        """
+        if self.game.use_bitboard and grid.max() < 1 << bitboard.MAX_EXPONENT:
+            return bitboard.encode(grid)
+        return expgrid.to_exponents(grid)
+
+    def empty_cells(self, grid: np.ndarray | int) -> list:
+        """
+        Lists the empty cells of a grid in row-major order.
+
+        Args:
+            grid (np.ndarray | int): The current game grid, or a packed board in bitboard mode.
+
+        Returns:
+            list: (row, col) tuples for a grid, or bit offsets for a packed board.
+        """
+        if isinstance(grid, int):
+            return bitboard.empty_cells(grid)
+        return [(r, c) for r, c in np.argwhere(grid == 0)]
+
+    def place_tile(self, grid: np.ndarray | int, cell, tile_value: int) -> np.ndarray | int:
+        """
+        Returns a copy of the grid with a tile spawned in an empty cell.
+
+        Args:
+            grid (np.ndarray | int): The current game grid, or a packed board in bitboard mode.
+            cell: The empty cell, as returned by empty_cells.
+            tile_value (int): The value of the spawned tile.
+
+        Returns:
+            np.ndarray | int: The grid with the new tile, in the same representation.
+        """
+        if isinstance(grid, int):
+            return grid | (bitboard.tile_exponent(tile_value) << cell)
+        new_grid = grid.copy()
+        new_grid[cell] = bitboard.tile_exponent(tile_value) if grid.dtype == np.uint8 else tile_value
+        return new_grid
+
+    def simulate_move(self, grid: np.ndarray | int, move: str) -> Optional[np.ndarray | int]:
         """
         Simulates a move without modifying the actual game state.
         
@@ -235,32 +490,58 @@ class AI:
         and returns the resulting grid.
         
         Args:
-            grid (np.ndarray): The current game grid.
+            grid (np.ndarray | int): The current game grid as uint8 exponents, or a packed board in
+                bitboard mode. Grids of tile values are accepted too.
             move (str): The direction of the move ('left', 'up', 'right', 'down').
         
         Returns:
-            np.ndarray or None: The new grid if the move is valid; otherwise, None.
+            np.ndarray, int or None: The new grid (in the same representation) if the move is valid; otherwise, None.
         """
-        temp_grid = grid.copy()
-        rotations = {"left": 0, "up": 1, "right": 2, "down": 3}
-        
-        if move in rotations:
-            temp_grid = np.rot90(temp_grid, rotations[move])
-            temp_grid = np.array([self.game.slide_and_merge(row) for row in temp_grid])
-            temp_grid = np.rot90(temp_grid, -rotations[move])
+        if isinstance(grid, int):
+            new_board = bitboard.execute_move(grid, move)
+            return new_board if new_board != grid else None
+
+        if grid.dtype != np.uint8:
+            new_grid = self.simulate_move(expgrid.to_exponents(grid), move)
+            return expgrid.to_values(new_grid) if new_grid is not None else None
 
+        if self.size == bitboard.BOARD_SIZE and grid.max() < bitboard.MAX_EXPONENT:
+            # 4x4 fast path through the row tables, which cannot merge two 32768 tiles
+            board = bitboard.from_exponents(grid)
+            new_board = bitboard.execute_move(board, move)
+            return bitboard.to_exponents(new_board) if new_board != board else None
+
+        temp_grid = expgrid.move(grid, move)
         if not np.array_equal(temp_grid, grid):
             return temp_grid
         return None
     
-    def minimax(self, grid: np.ndarray, depth: int, maximizing_player: bool = False, alpha: float = -np.inf, beta: float = np.inf) -> float:
+    def possible_moves(self, grid: np.ndarray | int) -> list[tuple[str, np.ndarray | int]]:
+        """
+        Lists the legal moves of a grid together with the grids they lead to.
+
+        Args:
+            grid (np.ndarray | int): The current game grid, or a packed board in bitboard mode.
+
+        Returns:
+            list[tuple[str, np.ndarray | int]]: (direction, new grid) pairs in directions_list order.
+        """
+        moves = []
+        for dir in self.directions_list:
+            new_grid = self.simulate_move(grid, dir)
+            if new_grid is not None:
+                moves.append((dir, new_grid))
+        return moves
+
+    def minimax(self, grid: np.ndarray | int, depth: int, maximizing_player: bool = False, alpha: float = -np.inf, beta: float = np.inf) -> float:
         """
         Minimax algorithm with alpha-beta pruning to determine the best move.
         
         If maximizing, it simulates the player's move; if minimizing, it considers random tile spawns.
+        Results are looked up in and stored to the transposition table when one is configured.
         
         Args:
-            grid (np.ndarray): The current game grid.
+            grid (np.ndarray | int): The current game grid, or a packed board in bitboard mode.
             depth (int): The search depth.
             maximizing_player (bool): True if evaluating player moves, False if evaluating AI-generated tiles.
             alpha (float): Alpha value for pruning.
@@ -269,9 +550,46 @@ class AI:
         Returns:
             float: The evaluated score of the grid state.
         """
+        self.nodes_searched += 1
+        if self.deadline is not None and (self.cancelled or time.perf_counter() > self.deadline):
+            raise SearchTimeout
+        table = self.transposition_table
+        # Only full-window results are independent of alpha and beta, so only those are cached
+        cacheable = table is not None and depth > 0 and alpha == -np.inf and beta == np.inf
+        if cacheable:
+            board_key = self.board_key(grid)
+            cached = table.get(board_key, depth, maximizing_player)
+            if cached is not None:
+                return cached
+
+        evaluation = self._minimax_node(grid, depth, maximizing_player, alpha, beta)
+        if cacheable:
+            table.store(board_key, depth, maximizing_player, evaluation)
+        return evaluation
+
+    def _minimax_node(self, grid: np.ndarray | int, depth: int, maximizing_player: bool, alpha: float, beta: float) -> float:
+        """
+        Evaluates a single Minimax node, recursing through minimax so children are cached.
 
+        Args:
+            grid (np.ndarray | int): The current game grid, or a packed board in bitboard mode.
+            depth (int): The search depth.
+            maximizing_player (bool): True if evaluating player moves, False if evaluating AI-generated tiles.
+            alpha (float): Alpha value for pruning.
+            beta (float): Beta value for pruning.
+
+        Returns:
+            float: The evaluated score of the grid state.
+        """
         if depth == 0:
-            return self.evaluate(grid)
+            return self.evaluate_state(grid)
+        if self.stats is not None:
+            if maximizing_player:
+                self.stats.max_nodes += 1
+            else:
+                self.stats.chance_nodes += 1
+        if depth == 1 and self.batch_leaves:
+            return self._minimax_last_ply(grid, maximizing_player, alpha, beta)
         
         if maximizing_player:
             max_evaluation = -np.inf
@@ -282,63 +600,345 @@ class AI:
                     max_evaluation = max(max_evaluation, evaluation)
                     alpha = max(alpha, max_evaluation)
                     if beta <= alpha:
+                        self._count_cutoff()
                         break
             return max_evaluation
         else:
-            empty_cells = np.argwhere(grid == 0)
-            if empty_cells.size == 0:
-                return self.evaluate(grid)
+            empty_cells = self.empty_cells(grid)
+            if not empty_cells:
+                return self.evaluate_state(grid)
             
             total_evaluation = 0
             tile_probabilities = self.game.get_tile_spawn_probabilities(grid=grid)
-            for r, c in empty_cells:
+            for cell in empty_cells:
                 for tile_value, probability in tile_probabilities:
-                    new_grid = grid.copy()
-                    new_grid[r, c] = tile_value
+                    new_grid = self.place_tile(grid, cell, tile_value)
                     single_eval = self.minimax(new_grid, depth - 1, True)
                     total_evaluation += probability * single_eval
                     beta = min(beta, single_eval)
                     if beta<= alpha:
+                        self._count_cutoff()
                         break
             return total_evaluation / len(empty_cells)
 
-    def find_best_move_mult(self, grid: np.ndarray, depth: int = 3) -> str:
+    def _minimax_last_ply(self, grid: np.ndarray | int, maximizing_player: bool, alpha: float, beta: float) -> float:
         """
-        Finds the best move using Minimax with multiprocessing.
-        
-        Each move is evaluated in parallel using multiple processes to speed up decision-making.
-        
+        Minimax node at depth 1 whose children are all scored with one batched evaluation.
+
+        Walks the children in the same order and with the same cutoffs as _minimax_node,
+        so it returns the same value.
+
+        Args:
+            grid (np.ndarray | int): The current game grid, or a packed board in bitboard mode.
+            maximizing_player (bool): True if evaluating player moves, False if evaluating AI-generated tiles.
+            alpha (float): Alpha value for pruning.
+            beta (float): Beta value for pruning.
+
+        Returns:
+            float: The evaluated score of the grid state.
+        """
+        if maximizing_player:
+            children = [new_grid for _, new_grid in self.possible_moves(grid)]
+            max_evaluation = -np.inf
+            for evaluation in self.evaluate_leaves(children):
+                max_evaluation = max(max_evaluation, evaluation)
+                alpha = max(alpha, max_evaluation)
+                if beta <= alpha:
+                    self._count_cutoff()
+                    break
+            return max_evaluation
+
+        empty_cells = self.empty_cells(grid)
+        if not empty_cells:
+            return self.evaluate_state(grid)
+
+        tile_probabilities = self.game.get_tile_spawn_probabilities(grid=grid)
+        children = [self.place_tile(grid, cell, tile_value) for cell in empty_cells for tile_value, _ in tile_probabilities]
+        evaluations = iter(self.evaluate_leaves(children).reshape(len(empty_cells), len(tile_probabilities)))
+
+        total_evaluation = 0
+        for cell_evaluations in evaluations:
+            for (_, probability), single_eval in zip(tile_probabilities, cell_evaluations):
+                total_evaluation += probability * single_eval
+                beta = min(beta, single_eval)
+                if beta<= alpha:
+                    self._count_cutoff()
+                    break
+        return total_evaluation / len(empty_cells)
+
+    def expectimax(self, grid: np.ndarray | int, depth: int, maximizing_player: bool = False, probability: float = 1.0) -> float:
+        """
+        Expectimax search: player nodes take the best move, chance nodes take the
+        probability-weighted average over every tile spawn.
+
+        Spawn sequences whose cumulative probability drops below prob_threshold are
+        not expanded further and are scored with the heuristic instead. When
+        max_chance_children is set, chance nodes with more empty cells than that
+        average over a random sample of the cells.
+
+        Args:
+            grid (np.ndarray | int): The current game grid, or a packed board in bitboard mode.
+            depth (int): The search depth.
+            maximizing_player (bool): True if evaluating player moves, False if evaluating tile spawns.
+            probability (float): Cumulative probability of the spawns leading to this node.
+
+        Returns:
+            float: The expected score of the grid state.
+        """
+        self.nodes_searched += 1
+        if self.deadline is not None and (self.cancelled or time.perf_counter() > self.deadline):
+            raise SearchTimeout
+        if depth == 0:
+            return self.evaluate_state(grid)
+        if probability < self.prob_threshold:
+            self._count_cutoff()
+            return self.evaluate_state(grid)
+
+        table = self.transposition_table
+        if table is not None:
+            board_key = self.board_key(grid)
+            cached = table.get(board_key, depth, maximizing_player)
+            if cached is not None:
+                return cached
+
+        if self.stats is not None:
+            if maximizing_player:
+                self.stats.max_nodes += 1
+            else:
+                self.stats.chance_nodes += 1
+
+        if maximizing_player:
+            evaluation = 0.0  # No legal move left, the lowest score evaluate can give
+            children = [new_grid for _, new_grid in self.possible_moves(grid)]
+            if depth == 1 and self.batch_leaves:
+                if children:
+                    evaluation = max(evaluation, float(self.evaluate_leaves(children).max()))
+            else:
+                for new_grid in children:
+                    evaluation = max(evaluation, self.expectimax(new_grid, depth - 1, False, probability))
+        else:
+            empty_cells = self.empty_cells(grid)
+            if not empty_cells:
+                return self.evaluate_state(grid)
+            if self.max_chance_children is not None and len(empty_cells) > self.max_chance_children:
+                sample = self.rng.choice(len(empty_cells), self.max_chance_children, replace=False)
+                empty_cells = [empty_cells[i] for i in sorted(sample)]
+
+            cell_probability = probability / len(empty_cells)
+            tile_probabilities = self.game.get_tile_spawn_probabilities(grid=grid)
+            if depth == 1 and self.batch_leaves:
+                children = [self.place_tile(grid, cell, tile_value) for cell in empty_cells for tile_value, _ in tile_probabilities]
+                weights = np.tile([tile_probability for _, tile_probability in tile_probabilities], len(empty_cells))
+                evaluation = float(weights @ self.evaluate_leaves(children))
+            else:
+                evaluation = 0.0
+                for cell in empty_cells:
+                    for tile_value, tile_probability in tile_probabilities:
+                        new_grid = self.place_tile(grid, cell, tile_value)
+                        evaluation += tile_probability * self.expectimax(new_grid, depth - 1, True, cell_probability * tile_probability)
+            evaluation /= len(empty_cells)
+
+        if table is not None:
+            table.store(board_key, depth, maximizing_player, evaluation)
+        return evaluation
+
+    def _count_cutoff(self) -> None:
+        """Records a pruned subtree in the stats of the current decision."""
+        if self.stats is not None:
+            self.stats.cutoffs += 1
+
+    def start_stats(self, method: str, depth: int) -> None:
+        """
+        Starts collecting stats for a move decision, if instrumentation is enabled.
+
+        Args:
+            method (str): Name of the find_best_move variant.
+            depth (int): Requested search depth.
+        """
+        if not self.instrument:
+            return
+        self.stats = SearchStats(method, depth, self.game.moves)
+        table = self.transposition_table
+        self._stats_start = (time.perf_counter(), table.hits if table else 0, table.misses if table else 0)
+
+    def finish_stats(self, best_move: Optional[str], depth_reached: int) -> None:
+        """
+        Completes the stats of the current decision, stores them in last_stats and writes the trace line.
+
+        Args:
+            best_move (Optional[str]): The chosen move.
+            depth_reached (int): Deepest finished search depth.
+        """
+        stats = self.stats
+        if stats is None:
+            return
+        start, hits, misses = self._stats_start
+        stats.elapsed = time.perf_counter() - start
+        stats.best_move = best_move
+        stats.depth_reached = depth_reached
+        if not stats.depth_times:
+            stats.depth_times[depth_reached] = stats.elapsed
+        table = self.transposition_table
+        if table is not None:
+            stats.cache_hits = table.hits - hits
+            stats.cache_misses = table.misses - misses
+        self.stats = None
+        self.last_stats = stats
+        if self.trace_path is not None:
+            stats.write_trace(self.trace_path)
+
+    def book_move(self, grid: np.ndarray | int) -> Optional[str]:
+        """
+        Looks up the move of a position in the move book.
+
+        Args:
+            grid (np.ndarray | int): The current game grid, or a packed board.
+
+        Returns:
+            Optional[str]: The book move if the book has a legal one for this position, otherwise None.
+        """
+        if self.move_book is None or (not isinstance(grid, int) and grid.max() > 1 << bitboard.MAX_EXPONENT):
+            return None
+        board = grid if isinstance(grid, int) else bitboard.encode(grid)
+        move = self.move_book.lookup(board)
+        if move is None or bitboard.execute_move(board, move) == board:
+            return None
+        self.book_hits += 1
+        return move
+
+    def search_value(self, grid: np.ndarray | int, depth: int) -> float:
+        """
+        Scores the position after a player move with the configured search algorithm.
+
+        Args:
+            grid (np.ndarray | int): The grid right after a player move.
+            depth (int): The remaining search depth.
+
+        Returns:
+            float: The value of the position according to Minimax or Expectimax.
+        """
+        if self.search == "expectimax":
+            return self.expectimax(grid, depth, False)
+        if self.make_unmake and not isinstance(grid, int):
+            return MakeUnmakeSearch(self, depth).minimax(grid, depth)
+        return self.minimax(grid, depth, False)
+
+    def worker_config(self) -> dict:
+        """
+        Collects the settings a search worker process needs to rebuild an equivalent AI.
+
+        Returns:
+            dict: Keyword arguments for _init_search_worker.
+        """
+        table = self.transposition_table
+        return {
+            "search": self.search,
+            "prob_threshold": self.prob_threshold,
+            "max_chance_children": self.max_chance_children,
+            "batch_leaves": self.batch_leaves,
+            "seed": self.seed,
+            "table_entries": table.max_entries if table is not None else None,
+            "table_replacement": table.replacement if table is not None else "lru",
+            "instrument": self.instrument,
+            "evaluator": self.evaluator,  # Pickled as its settings, the tables are rebuilt in the worker
+            "make_unmake": self.make_unmake,
+        }
+
+    def start_pool(self, processes: Optional[int] = None) -> None:
+        """
+        Starts the process pool used by find_best_move_mult, if it is not running yet.
+
+        The pool lives until close_pool is called, so it is created once per AI session.
+
+        Args:
+            processes (Optional[int]): Number of worker processes, defaults to the number of CPUs.
+        """
+        if self.pool is None:
+            self.pool_processes = processes or os.cpu_count() or 1
+            self.pool = Pool(self.pool_processes, initializer=_init_search_worker, initargs=(self.worker_config(),))
+
+    def close_pool(self) -> None:
+        """Shuts down the worker pool and waits for the workers to exit."""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def find_best_move_mult(self, grid: np.ndarray, depth: int = 3) -> Optional[str]:
+        """
+        Finds the best move with the search spread over a persistent process pool.
+
+        Work is split below the root: every tile spawn after every legal move is searched
+        as its own task, so all workers stay busy even when only one or two moves are
+        legal. Only packed 64-bit boards and floats cross the process boundary. The
+        results are combined exactly like the chance nodes of minimax or expectimax, so
+        without chance-node sampling the chosen move is the same as find_best_move's.
+
         Args:
             grid (np.ndarray): The current game grid.
-            depth (int): The search depth for Minimax.
-        
+            depth (int): The search depth.
+
         Returns:
-            str: The best move direction ('left', 'up', 'right', 'down').
+            Optional[str]: The best move direction ('left', 'up', 'right', 'down'), or None if no move is possible.
         """
+        # Tasks are packed 4x4 boards, which cannot merge two 32768 tiles
+        if depth <= 1 or self.size != bitboard.BOARD_SIZE or grid.max() >= 1 << bitboard.MAX_EXPONENT:
+            return self.find_best_move(grid, depth)
+        book_move = self.book_move(grid)
+        if book_move is not None:
+            return book_move
+        board = bitboard.encode(grid)
+        self.start_pool()
+        self.start_stats("find_best_move_mult", depth)
 
-        best_score = -np.inf
-        best_move = None
-        pool = Pool(4) # 4 directions
+        tile_probabilities = self.game.get_tile_spawn_probabilities(grid=grid)
+        tasks = []
+        moves = []
+        for dir, new_board in self.possible_moves(board):
+            empty_cells = self.empty_cells(new_board)
+            if self.search == "expectimax" and self.max_chance_children is not None and len(empty_cells) > self.max_chance_children:
+                sample = self.rng.choice(len(empty_cells), self.max_chance_children, replace=False)
+                empty_cells = [empty_cells[i] for i in sorted(sample)]
+            for cell in empty_cells:
+                for tile_value, probability in tile_probabilities:
+                    tasks.append((self.place_tile(new_board, cell, tile_value), depth - 2, probability / len(empty_cells)))
+            moves.append((dir, new_board, len(empty_cells)))
 
-        dirs = []
+        chunksize = max(1, len(tasks) // (4 * self.pool_processes))
+        results = iter(self.pool.starmap(_search_worker_task, tasks, chunksize))
 
-        for dir in self.directions_list:
-            new_grid = self.simulate_move(grid, dir)
-            if new_grid is not None:
-                dirs.append((dir, new_grid))
-            
-        # Use multiprocessing to evaluate moves in parallel
-        results = pool.starmap(self.minimax_worker, [(new_grid, depth - 1) for _, new_grid in dirs])
-        pool.close()
-        pool.join()
-
-        # Find the best move based on Minimax results
-        for i, (dir, _) in enumerate(dirs):
-            score = results[i]
+        best_score = -np.inf
+        best_move = None
+        for dir, new_board, cell_count in moves:
+            # The root chance node is expanded here, only its children are searched by the workers
+            self.nodes_searched += 1
+            if self.stats is not None:
+                self.stats.chance_nodes += 1
+            if cell_count == 0:
+                score = self.evaluate_state(new_board)
+            else:
+                # Same accumulation and cutoffs as the chance node of minimax or expectimax
+                total_evaluation = 0
+                beta = np.inf
+                for _ in range(cell_count):
+                    pruned = False
+                    for _, probability in tile_probabilities:
+                        single_eval, nodes, counts = next(results)
+                        self.nodes_searched += nodes
+                        if self.stats is not None and counts is not None:
+                            self.stats.add_counts(counts)
+                        if pruned:
+                            continue
+                        total_evaluation += probability * single_eval
+                        if self.search == "minimax":
+                            beta = min(beta, single_eval)
+                            pruned = beta <= -np.inf
+                score = total_evaluation / cell_count
             if score > best_score:
                 best_score = score
                 best_move = dir
 
+        self.finish_stats(best_move, depth)
         return best_move
 
     def find_best_move_mult_thread(self, depth: int = 3, threads: int = 4) -> str:
@@ -358,16 +958,24 @@ class AI:
         best_move: Optional[str] = None
         possible_moves: list[Tuple[str, np.ndarray]] = []
 
+        book_move = self.book_move(self.game.grid)
+        if book_move is not None:
+            return book_move
+        grid = self.search_grid(self.game.grid)
+        if self.transposition_table is not None and not self.persist_transpositions:
+            self.transposition_table.clear()
+        self.start_stats("find_best_move_mult_thread", depth)
+
         # Generate valid move simulations
         for direction in self.directions_list:
-            new_grid = self.simulate_move(self.game.grid, direction)
+            new_grid = self.simulate_move(grid, direction)
             if new_grid is not None:
                 possible_moves.append((direction, new_grid))
 
         # Define the function for evaluating a move
         def minimax_sub_func(direction_and_grid: Tuple[str, np.ndarray]) -> Tuple[str, float]:
             direction, grid = direction_and_grid
-            return direction, self.minimax(grid, depth - 1, False)
+            return direction, self.search_value(grid, depth - 1)
 
         # Execute minimax evaluations in parallel using threading
         with ThreadPool(threads) as threads:
@@ -379,12 +987,13 @@ class AI:
                 best_score = score
                 best_move = direction
 
+        self.finish_stats(best_move, depth)
         return best_move if best_move is not None else "left"  # Default to "left" if no valid move is found
     
 
     def find_best_move(self, grid: np.ndarray, depth: int = 3) -> str:
         """
-        Finds the best move by running Minimax for all possible moves.
+        Finds the best move by running the configured search (Minimax or Expectimax) for all possible moves.
         
         Args:
             grid (np.ndarray): The current game grid.
@@ -394,14 +1003,412 @@ class AI:
             str: The best move direction.
         """
 
+        book_move = self.book_move(grid)
+        if book_move is not None:
+            return book_move
+        grid = self.search_grid(grid)
+        if self.transposition_table is not None and not self.persist_transpositions:
+            self.transposition_table.clear()
+        self.start_stats("find_best_move", depth)
+
         best_score = -np.inf
         best_move = None
         for dir in self.directions_list:
             new_grid = self.simulate_move(grid, dir)
             if new_grid is not None:
-                score = self.minimax(new_grid, depth - 1, False)
+                score = self.search_value(new_grid, depth - 1)
                 if score > best_score:
                     best_score = score
                     best_move = dir
 
-        return best_move
\ No newline at end of file
+        self.finish_stats(best_move, depth)
+        return best_move
+
+    def find_best_move_adaptive(self, grid: np.ndarray) -> Optional[str]:
+        """
+        Finds the best move at the depth the depth policy picks for this position.
+
+        The policy sees the evaluation of every position it is asked about, so it can
+        search deeper while the evaluation is falling. The depth is stored in
+        last_search_depth and appended to search_depths.
+
+        Args:
+            grid (np.ndarray): The current game grid.
+
+        Returns:
+            Optional[str]: The best move direction, or None if no move is possible.
+        """
+        if self.depth_policy is None:
+            raise ValueError("find_best_move_adaptive needs a depth_policy")
+        depth = self.depth_policy.choose_depth(grid, self.evaluate_state(self.search_grid(grid)))
+        self.last_search_depth = depth
+        self.search_depths.append(depth)
+        return self.find_best_move(grid, depth)
+
+    def cancel(self) -> None:
+        """Stops a running find_best_move_timed as soon as possible, e.g. from a UI thread."""
+        # Only read by the deadline checks of a running timed pass, so other searches are unaffected
+        self.cancelled = True
+
+    def find_best_move_timed(self, grid: np.ndarray, time_budget_ms: float = 100, max_depth: int = 8) -> Optional[str]:
+        """
+        Finds the best move with iterative deepening inside a per-move time budget.
+
+        Searches at depth 1, 2, 3, ... until the budget runs out or max_depth is reached,
+        and returns the best move of the deepest pass that finished. Each pass searches
+        the moves in the order of the previous pass' scores, so the previous best move is
+        always re-searched first. If the budget runs out after that move was finished, a
+        move that beat it in the interrupted pass is returned instead. The depth reached is
+        stored in last_search_depth and appended to search_depths, 0 for a move book hit.
+
+        Args:
+            grid (np.ndarray): The current game grid.
+            time_budget_ms (float): Time budget for this move in milliseconds.
+            max_depth (int): Maximum search depth.
+
+        Returns:
+            Optional[str]: The best move direction, or None if no move is possible.
+        """
+        start = time.perf_counter()
+        self.cancelled = False
+        book_move = self.book_move(grid)
+        if book_move is not None:
+            self.last_search_depth = 0
+            self.search_depths.append(0)
+            return book_move
+        grid = self.search_grid(grid)
+        if self.transposition_table is not None and not self.persist_transpositions:
+            self.transposition_table.clear()
+
+        self.start_stats("find_best_move_timed", max_depth)
+        moves = self.possible_moves(grid)
+        scores = {dir: 0.0 for dir, _ in moves}
+        best_move = None
+        completed_depth = 0
+        # Nothing to search when at most one move is legal
+        if len(moves) <= 1:
+            max_depth = 0
+            best_move = moves[0][0] if moves else None
+
+        for depth in range(1, max_depth + 1):
+            if self.cancelled:
+                break
+            # Depth 1 always runs to completion so there is a move to return, unless cancelled
+            self.deadline = start + time_budget_ms / 1000 if depth > 1 else None
+            pass_scores: dict[str, float] = {}
+            pass_start = time.perf_counter()
+            try:
+                for dir, new_grid in sorted(moves, key=lambda move: scores[move[0]], reverse=True):
+                    pass_scores[dir] = self.search_value(new_grid, depth - 1)
+            except SearchTimeout:
+                if best_move in pass_scores:
+                    pass_best = max(pass_scores, key=pass_scores.get)
+                    if pass_scores[pass_best] > pass_scores[best_move]:
+                        best_move = pass_best
+                break
+            finally:
+                self.deadline = None
+
+            scores = pass_scores
+            completed_depth = depth
+            if self.stats is not None:
+                self.stats.depth_times[depth] = time.perf_counter() - pass_start
+            best_score = -np.inf
+            best_move = None
+            for dir, _ in moves:
+                if scores[dir] > best_score:
+                    best_score = scores[dir]
+                    best_move = dir
+            if time.perf_counter() - start > time_budget_ms / 1000:
+                break
+
+        self.last_search_depth = completed_depth
+        self.search_depths.append(completed_depth)
+        self.finish_stats(best_move, completed_depth)
+        return best_move
+
+
+def move_lines(size: int) -> dict[str, list[list[int]]]:
+    """
+    Flat cell indices of the rows or columns a move slides, each ordered towards the side the tiles move to.
+
+    Args:
+        size (int): The board size.
+
+    Returns:
+        dict[str, list[list[int]]]: The lines of every direction.
+    """
+    return {
+        "left": [[size * r + c for c in range(size)] for r in range(size)],
+        "right": [[size * r + c for c in reversed(range(size))] for r in range(size)],
+        "up": [[size * r + c for r in range(size)] for c in range(size)],
+        "down": [[size * r + c for r in reversed(range(size))] for c in range(size)],
+    }
+
+
+MOVE_LINES = move_lines(GRID_SIZE)
+
+
+class MakeUnmakeSearch:
+    """
+    Minimax over NumPy exponent grids without copying the grid at every node.
+
+    Every depth level owns one preallocated board of uint8 exponents. A player move slides the board of its
+    level into the board of the next level, and a tile spawn is written into the board of
+    the current level and removed again when the search backtracks. The leaves of a
+    last-ply node are written into one preallocated array and scored with a single batched
+    evaluation. Children, cutoffs, caching and stats follow AI.minimax, so both return the
+    same values.
+    """
+
+    def __init__(self, ai: AI, depth: int) -> None:
+        """
+        Allocates the buffers for searches up to the given depth.
+
+        Args:
+            ai (AI): The AI whose settings, evaluation and counters are used.
+            depth (int): The maximum search depth.
+        """
+        self.ai = ai
+        size = ai.size
+        self.size = size
+        self.cell_count = size * size
+        self.lines = MOVE_LINES if size == GRID_SIZE else move_lines(size)
+        # Spawned tiles as exponents, with their probabilities
+        self.tile_probabilities = [(bitboard.tile_exponent(tile_value), probability)
+                                   for tile_value, probability in ai.game.get_tile_spawn_probabilities(grid=None)]
+        self.grids = np.zeros((depth // 2 + 2, size, size), dtype=np.uint8)  # One board per player move level
+        self.levels = list(self.grids)  # Views of the level boards, created once
+        self.cells = memoryview(self.grids.reshape(-1))  # Flat access to the cells with plain ints
+        max_leaves = max(len(ai.directions_list), self.cell_count * len(self.tile_probabilities))
+        self.leaves = np.zeros((max_leaves, size, size), dtype=np.uint8)
+        self.leaf_cells = memoryview(self.leaves.reshape(-1))
+
+    def make_move(self, source: memoryview, source_offset: int, target: memoryview, target_offset: int,
+                  move: str) -> bool:
+        """
+        Slides and merges a board into another buffer, like Game.slide_and_merge on every line.
+
+        Args:
+            source (memoryview): Flat cells holding the board to move.
+            source_offset (int): Index of the first cell of the board in source.
+            target (memoryview): Flat cells the moved board is written to.
+            target_offset (int): Index of the first cell of the board in target.
+            move (str): The direction of the move ('left', 'up', 'right', 'down').
+
+        Returns:
+            bool: True if the move changed the board, i.e. it is legal.
+        """
+        changed = False
+        for line in self.lines[move]:
+            write = 0
+            pending = 0  # Tile waiting for a possible merge with the next tile
+            for index in line:
+                value = source[source_offset + index]
+                if value == 0:
+                    continue
+                if value == pending:
+                    target[target_offset + line[write]] = value + 1  # Merged tile, one exponent higher
+                    write += 1
+                    pending = 0
+                else:
+                    if pending:
+                        target[target_offset + line[write]] = pending
+                        write += 1
+                    pending = value
+            if pending:
+                target[target_offset + line[write]] = pending
+                write += 1
+            for position in range(write, self.size):
+                target[target_offset + line[position]] = 0
+            if not changed:
+                for index in line:
+                    if target[target_offset + index] != source[source_offset + index]:
+                        changed = True
+                        break
+        return changed
+
+    def minimax(self, grid: np.ndarray, depth: int) -> float:
+        """
+        Scores the position after a player move, like AI.minimax(grid, depth, False).
+
+        Args:
+            grid (np.ndarray): The exponent grid right after a player move.
+            depth (int): The remaining search depth.
+
+        Returns:
+            float: The evaluated score of the grid state.
+        """
+        self.grids[0] = grid
+        return self.search(0, depth, False, -np.inf, np.inf)
+
+    def search(self, level: int, depth: int, maximizing_player: bool, alpha: float, beta: float) -> float:
+        """
+        Evaluates the board of a level, the counterpart of AI.minimax.
+
+        Args:
+            level (int): The level whose board is searched.
+            depth (int): The search depth.
+            maximizing_player (bool): True if evaluating player moves, False if evaluating AI-generated tiles.
+            alpha (float): Alpha value for pruning.
+            beta (float): Beta value for pruning.
+
+        Returns:
+            float: The evaluated score of the grid state.
+        """
+        ai = self.ai
+        ai.nodes_searched += 1
+        if ai.deadline is not None and (ai.cancelled or time.perf_counter() > ai.deadline):
+            raise SearchTimeout
+        table = ai.transposition_table
+        cacheable = table is not None and depth > 0 and alpha == -np.inf and beta == np.inf
+        if cacheable:
+            board_key = ai.board_key(self.levels[level])
+            cached = table.get(board_key, depth, maximizing_player)
+            if cached is not None:
+                return cached
+
+        evaluation = self._node(level, depth, maximizing_player, alpha, beta)
+        if cacheable:
+            table.store(board_key, depth, maximizing_player, evaluation)
+        return evaluation
+
+    def _node(self, level: int, depth: int, maximizing_player: bool, alpha: float, beta: float) -> float:
+        """Evaluates a single node, the counterpart of AI._minimax_node."""
+        ai = self.ai
+        if depth == 0:
+            return ai.evaluate_state(self.levels[level])
+        if ai.stats is not None:
+            if maximizing_player:
+                ai.stats.max_nodes += 1
+            else:
+                ai.stats.chance_nodes += 1
+        if depth == 1 and ai.batch_leaves:
+            return self._last_ply(level, maximizing_player, alpha, beta)
+
+        cells = self.cells
+        cell_count = self.cell_count
+        offset = level * cell_count
+        if maximizing_player:
+            max_evaluation = -np.inf
+            for dir in ai.directions_list:
+                if self.make_move(cells, offset, cells, offset + cell_count, dir):
+                    evaluation = self.search(level + 1, depth - 1, False, alpha, beta)
+                    max_evaluation = max(max_evaluation, evaluation)
+                    alpha = max(alpha, max_evaluation)
+                    if beta <= alpha:
+                        ai._count_cutoff()
+                        break
+            return max_evaluation
+
+        empty_cells = [index for index in range(cell_count) if cells[offset + index] == 0]
+        if not empty_cells:
+            return ai.evaluate_state(self.levels[level])
+
+        total_evaluation = 0
+        for index in empty_cells:
+            for exponent, probability in self.tile_probabilities:
+                cells[offset + index] = exponent  # Make the spawn
+                single_eval = self.search(level, depth - 1, True, -np.inf, np.inf)
+                cells[offset + index] = 0  # Unmake it
+                total_evaluation += probability * single_eval
+                beta = min(beta, single_eval)
+                if beta<= alpha:
+                    ai._count_cutoff()
+                    break
+        return total_evaluation / len(empty_cells)
+
+    def _last_ply(self, level: int, maximizing_player: bool, alpha: float, beta: float) -> float:
+        """Depth-1 node whose leaves are written to the leaf buffer, the counterpart of AI._minimax_last_ply."""
+        ai = self.ai
+        cells = self.cells
+        leaf_cells = self.leaf_cells
+        cell_count = self.cell_count
+        offset = level * cell_count
+        if maximizing_player:
+            leaf_count = 0
+            for dir in ai.directions_list:
+                if self.make_move(cells, offset, leaf_cells, leaf_count * cell_count, dir):
+                    leaf_count += 1
+            max_evaluation = -np.inf
+            for evaluation in ai.evaluate_leaves(self.leaves[:leaf_count]):
+                max_evaluation = max(max_evaluation, evaluation)
+                alpha = max(alpha, max_evaluation)
+                if beta <= alpha:
+                    ai._count_cutoff()
+                    break
+            return max_evaluation
+
+        empty_cells = [index for index in range(cell_count) if cells[offset + index] == 0]
+        if not empty_cells:
+            return ai.evaluate_state(self.levels[level])
+
+        tile_count = len(self.tile_probabilities)
+        leaf_count = len(empty_cells) * tile_count
+        self.leaves[:leaf_count] = self.levels[level]
+        leaf = 0
+        for index in empty_cells:
+            for exponent, _ in self.tile_probabilities:
+                leaf_cells[leaf * cell_count + index] = exponent
+                leaf += 1
+        evaluations = iter(ai.evaluate_leaves(self.leaves[:leaf_count]).reshape(len(empty_cells), tile_count))
+
+        total_evaluation = 0
+        for cell_evaluations in evaluations:
+            for (_, probability), single_eval in zip(self.tile_probabilities, cell_evaluations):
+                total_evaluation += probability * single_eval
+                beta = min(beta, single_eval)
+                if beta<= alpha:
+                    ai._count_cutoff()
+                    break
+        return total_evaluation / len(empty_cells)
+
+
+# State of a search worker process, set up once by _init_search_worker
+_worker_ai: Optional[AI] = None
+
+
+def _init_search_worker(config: dict) -> None:
+    """
+    Builds the AI used by a search worker process of AI.start_pool.
+
+    Args:
+        config (dict): Settings from AI.worker_config.
+    """
+    global _worker_ai
+    table = None
+    if config["table_entries"] is not None:
+        table = TranspositionTable(config["table_entries"], config["table_replacement"])
+    seed = config["seed"]
+    _worker_ai = AI(Game(use_bitboard=True), transposition_table=table, search=config["search"],
+                    prob_threshold=config["prob_threshold"], max_chance_children=config["max_chance_children"],
+                    seed=None if seed is None else [seed, os.getpid()], batch_leaves=config["batch_leaves"],
+                    instrument=config["instrument"], evaluator=config["evaluator"],
+                    make_unmake=config["make_unmake"])
+
+
+def _search_worker_task(board: int, depth: int, probability: float) -> tuple[float, int, Optional[tuple[int, int, int, int]]]:
+    """
+    Searches the player node reached by a tile spawn below the root.
+
+    Args:
+        board (int): The packed board after the spawn.
+        depth (int): The remaining search depth.
+        probability (float): Probability of the spawn, used by the expectimax cutoff.
+
+    Returns:
+        tuple: The value of the node, the number of nodes searched for it and, when
+        instrumenting, the SearchStats counts of the subtree.
+    """
+    nodes_before = _worker_ai.nodes_searched
+    if _worker_ai.instrument:
+        _worker_ai.stats = SearchStats("worker", depth)
+    if _worker_ai.search == "expectimax":
+        value = _worker_ai.expectimax(board, depth, True, probability)
+    else:
+        value = _worker_ai.minimax(board, depth, True)
+    counts = None
+    if _worker_ai.stats is not None:
+        counts = _worker_ai.stats.counts()
+        _worker_ai.stats = None
+    return value, _worker_ai.nodes_searched - nodes_before, counts
@@ -0,0 +1,261 @@
+"""
+Compact binary game records: streaming recorder, memory-mapped reader and replay.
+
+A record file starts with a small header followed by fixed-width 16-byte records.
+Every game starts with a START record holding the starting board and the seed of
+np.random, followed by one MOVE record per move with the board before the move,
+the move, the spawned tile and the score after the move. Files are only ever
+appended to, so many games can be streamed into one file. Packed boards hold tiles
+up to 32768, so the records of a game end before its first board with a larger tile.
+
+Example:
+    python simulate.py --games 100 --record games.rec
+    python gamerecord.py info games.rec
+    python gamerecord.py replay games.rec --game 3
+"""
+import argparse
+import os
+import shutil
+from typing import Iterator, Optional
+
+import numpy as np
+
+import bitboard
+from game import Game
+
+RECORD_MAGIC = b"2048GREC"
+RECORD_VERSION = 1
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("version", "<u4"), ("record_size", "<u4")])
+RECORD_DTYPE = np.dtype([
+    ("board", "<u8"),  # Packed board, before the move for MOVE records
+    ("score", "<u4"),  # Score after the move, the seed for START records
+    ("move", "u1"),  # Index in DIRECTIONS, NO_VALUE for START records
+    ("spawn_cell", "u1"),  # Row-major cell index of the spawned tile, NO_VALUE if none
+    ("spawn_exponent", "u1"),  # log2 of the spawned tile, 0 if none
+    ("flags", "u1"),
+])
+DIRECTIONS = ["left", "up", "right", "down"]
+NO_VALUE = 0xFF
+NO_SEED = 0xFFFFFFFF  # Seed field of games that were not started from a seed
+FLAG_START = 1  # First record of a game
+FLAG_GAME_OVER = 2  # No move is possible after this move
+
+
+class GameRecorder:
+    """
+    Appends games to a record file as they are played.
+
+    Only the write buffer is kept in memory. Attach it with Game(recorder=...) or
+    call start_game and record_move directly.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Opens a record file for appending, writing the header if the file is new.
+
+        Args:
+            path (str): Path of the record file.
+        """
+        self.path = path
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            np.array([(RECORD_MAGIC, RECORD_VERSION, RECORD_DTYPE.itemsize)], dtype=HEADER_DTYPE).tofile(self.file)
+        self._record = np.zeros(1, dtype=RECORD_DTYPE)
+        self.games = 0
+        self.records = 0
+
+    def _write(self, board: int, score: int, move: int, spawn_cell: int, spawn_exponent: int, flags: int) -> None:
+        self._record[0] = (board, score, move, spawn_cell, spawn_exponent, flags)
+        self.file.write(self._record.tobytes())
+        self.records += 1
+
+    def start_game(self, board: int, seed: Optional[int] = None) -> None:
+        """
+        Starts a new game in the file.
+
+        Args:
+            board (int): The packed starting board.
+            seed (Optional[int]): The seed np.random was seeded with before the game, if any.
+        """
+        self._write(board, NO_SEED if seed is None else seed, NO_VALUE, NO_VALUE, 0, FLAG_START)
+        self.games += 1
+
+    def record_move(self, board: int, move: str, spawn: Optional[tuple[int, int]], score: int,
+                    game_over: bool = False) -> None:
+        """
+        Appends one move of the current game.
+
+        Args:
+            board (int): The packed board before the move.
+            move (str): The direction of the move.
+            spawn (Optional[tuple[int, int]]): The (cell index, tile value) spawned after the move.
+            score (int): The score after the move.
+            game_over (bool): True if no move is possible afterwards.
+        """
+        spawn_cell, spawn_exponent = (spawn[0], bitboard.tile_exponent(spawn[1])) if spawn else (NO_VALUE, 0)
+        self._write(board, score, DIRECTIONS.index(move), spawn_cell, spawn_exponent,
+                    FLAG_GAME_OVER if game_over else 0)
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> "GameRecorder":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class GameRecordReader:
+    """
+    Memory-mapped, read-only view of a record file.
+
+    records is a structured array backed by the file, so indexing, slicing and the
+    column views (records["board"], ...) do not copy or load the file. A record that
+    is still being written at the end of the file is ignored.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Maps a record file.
+
+        Args:
+            path (str): Path of the record file.
+        """
+        self.path = path
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        if len(header) == 0 or header["magic"][0] != RECORD_MAGIC:
+            raise ValueError(f"{path} is not a game record file")
+        if header["version"][0] != RECORD_VERSION or header["record_size"][0] != RECORD_DTYPE.itemsize:
+            raise ValueError(f"Unsupported game record format in {path}")
+        count = (os.path.getsize(path) - HEADER_DTYPE.itemsize) // RECORD_DTYPE.itemsize
+        if count:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_DTYPE.itemsize, shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+        self._starts: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    @property
+    def starts(self) -> np.ndarray:
+        """Indices of the START records, one per game."""
+        if self._starts is None:
+            self._starts = np.flatnonzero(self.records["flags"] & FLAG_START)
+        return self._starts
+
+    @property
+    def game_count(self) -> int:
+        return len(self.starts)
+
+    def game_range(self, game: int) -> tuple[int, int]:
+        """Returns the record indices [start, stop) of a game, START record included."""
+        starts = self.starts
+        stop = starts[game + 1] if game + 1 < len(starts) else len(self.records)
+        return int(starts[game]), int(stop)
+
+    def game_seed(self, game: int) -> Optional[int]:
+        """Returns the seed a game was started from, or None if it was not seeded."""
+        seed = int(self.records["score"][self.game_range(game)[0]])
+        return None if seed == NO_SEED else seed
+
+    def moves(self) -> Iterator[np.ndarray]:
+        """Iterates over the MOVE records of every game, without its START record, as views into the file."""
+        for game in range(self.game_count):
+            start, stop = self.game_range(game)
+            yield self.records[start + 1:stop]
+
+    def positions(self) -> Iterator[tuple[int, str]]:
+        """Iterates over (board before the move, move) of every MOVE record."""
+        for start, stop in (self.game_range(game) for game in range(self.game_count)):
+            for board, move in zip(self.records["board"][start + 1:stop].tolist(),
+                                   self.records["move"][start + 1:stop].tolist()):
+                yield board, DIRECTIONS[move]
+
+
+def append_records(path: str, source_path: str) -> None:
+    """
+    Appends all records of one record file to another, streaming them without loading either file.
+
+    Args:
+        path (str): The record file to extend, created if it does not exist.
+        source_path (str): The record file whose records are appended.
+    """
+    GameRecorder(path).close()  # Writes the header of a new file
+    with open(source_path, "rb") as source, open(path, "ab") as target:
+        source.seek(HEADER_DTYPE.itemsize)
+        shutil.copyfileobj(source, target)
+
+
+def replay_game(reader: GameRecordReader, game: int, use_seed: bool = True) -> Game:
+    """
+    Replays a recorded game and checks every position against the records.
+
+    Seeded games are replayed by reseeding np.random, so the spawns come from Game.add_tile
+    exactly as in the original game. Otherwise, or with use_seed=False, the recorded spawns are placed.
+
+    Args:
+        reader (GameRecordReader): The record file.
+        game (int): Index of the game in the file.
+        use_seed (bool): Reproduce the spawns from the seed instead of the records.
+
+    Returns:
+        Game: The game after the last recorded move.
+
+    Raises:
+        ValueError: If the replay diverges from the records.
+    """
+    start, stop = reader.game_range(game)
+    seed = reader.game_seed(game) if use_seed else None
+    replay = Game(use_bitboard=True, auto_reset=False)
+    replay.resetgame(seed)
+    replay.grid = bitboard.decode(int(reader.records["board"][start]))
+
+    for index in range(start + 1, stop):
+        record = reader.records[index]
+        if bitboard.encode(replay.grid) != int(record["board"]):
+            raise ValueError(f"Replay of game {game} diverged before record {index}")
+        spawn = None
+        if seed is None and record["spawn_cell"] != NO_VALUE:
+            spawn = (int(record["spawn_cell"]), 1 << int(record["spawn_exponent"]))
+        replay.move(DIRECTIONS[record["move"]], spawn)
+        recorded_spawn = (int(record["spawn_cell"]), 1 << int(record["spawn_exponent"])) \
+            if record["spawn_cell"] != NO_VALUE else None
+        if replay.last_spawn != recorded_spawn or replay.score != int(record["score"]):
+            raise ValueError(f"Replay of game {game} diverged at record {index}")
+    return replay
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inspect and replay 2048 game records.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    info_parser = commands.add_parser("info", help="print the number of games and moves in a file")
+    info_parser.add_argument("path")
+    replay_parser = commands.add_parser("replay", help="replay games and check them against the records")
+    replay_parser.add_argument("path")
+    replay_parser.add_argument("--game", type=int, default=None, help="replay only this game (default: all)")
+    replay_parser.add_argument("--no-seed", action="store_true", help="place the recorded spawns instead of reseeding")
+    args = parser.parse_args()
+
+    reader = GameRecordReader(args.path)
+    if args.command == "info":
+        move_count = len(reader) - reader.game_count
+        best_score = max((int(game_moves["score"].max()) for game_moves in reader.moves() if len(game_moves)), default=0)
+        print(f"{args.path}: {reader.game_count} games, {move_count} moves, {best_score} best score")
+        return
+
+    games = [args.game] if args.game is not None else range(reader.game_count)
+    for game in games:
+        replay = replay_game(reader, game, use_seed=not args.no_seed)
+        print(f"game {game}: {replay.moves} moves, max tile {int(replay.grid.max())}, score {replay.score}, replay ok")
+
+
+if __name__ == "__main__":
+    main()
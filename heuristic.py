@@ -0,0 +1,244 @@
+import json
+import numpy as np
+from typing import Optional
+
+import bitboard
+
+# Weights of the terms of AI.evaluate. With these values and AI.perfectsnake the
+# "exact" mode of RowTableEvaluator gives the same scores as AI.evaluate.
+DEFAULT_WEIGHTS = {
+    "snake": 1.0,  # Sum of perfectsnake * tile
+    "smoothness": 1.0,  # Sum of |difference| between horizontal neighbours, subtracted
+    "empty": 1.0,  # Square of the number of empty cells ("exact"), or the count itself ("additive")
+    "merge": 1.0,  # Equal neighbours times the largest tile ("exact"), or the merged tile values ("additive")
+    "max_penalty": 1.0,  # Square of the smallest value when it is missing from the bottom row, subtracted
+    "second_max_penalty": 1.0,  # Square of the second smallest value when it is missing from the bottom row, subtracted
+    "sorted_bonus": 0.2,  # Sum of the bottom row when it is sorted in descending order
+}
+
+DEFAULT_SNAKE = np.array((
+    [2, 2**2, 2**3, 2**4],
+    [2**8, 2**7, 2**6, 2**5],
+    [2**9, 2**10, 2**11, 2**12],
+    [2**16, 2**15, 2**14, 2**13]
+))
+
+EVALUATOR_MODES = ("exact", "additive")
+
+
+def snake_weights(ratio: float = 2.0) -> np.ndarray:
+    """
+    Positional weights along the snake of DEFAULT_SNAKE with another ratio between neighbours.
+
+    Args:
+        ratio (float): Weight of a cell divided by the weight of the previous cell of the snake.
+
+    Returns:
+        np.ndarray: The 4x4 weights, DEFAULT_SNAKE for a ratio of 2.
+    """
+    return float(ratio) ** np.log2(DEFAULT_SNAKE)
+
+
+def _row_cells() -> tuple[np.ndarray, np.ndarray]:
+    """Exponents and tile values of the four cells of every possible packed row."""
+    rows = np.arange(bitboard.ROW_MASK + 1)
+    exponents = np.stack([(rows >> (4 * c)) & bitboard.CELL_MASK for c in range(bitboard.BOARD_SIZE)], axis=1)
+    values = np.where(exponents > 0, np.left_shift(1, exponents), 0)
+    return exponents, values
+
+
+class RowTableEvaluator:
+    """
+    Heuristic evaluation on packed boards, built from lookup tables over all 65,536 rows.
+
+    Every term of AI.evaluate that can be split by row or column is precomputed once
+    per packed row at construction, so scoring a board only combines a few table lookups.
+
+    Modes:
+    - "exact": the terms and combination of AI.evaluate. With DEFAULT_WEIGHTS and
+      DEFAULT_SNAKE it gives the same scores, which makes it usable for regression tests.
+    - "additive": a purely additive variant that scores a board with four row lookups,
+      four column lookups and a sum. The empty term counts empty cells, the merge term
+      adds the value of every tile that can merge, and the bottom-row penalties are dropped.
+    """
+
+    def __init__(self, weights: Optional[dict[str, float]] = None, snake: Optional[np.ndarray] = None,
+                 mode: str = "exact") -> None:
+        """
+        Builds the lookup tables.
+
+        Args:
+            weights (Optional[dict[str, float]]): Term weights, missing keys use DEFAULT_WEIGHTS.
+            snake (Optional[np.ndarray]): 4x4 positional weights, defaults to DEFAULT_SNAKE.
+            mode (str): 'exact' or 'additive'.
+        """
+        if mode not in EVALUATOR_MODES:
+            raise ValueError(f"Unknown evaluator mode: {mode!r}")
+        unknown = set(weights or {}) - set(DEFAULT_WEIGHTS)
+        if unknown:
+            raise ValueError(f"Unknown heuristic weights: {sorted(unknown)}")
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.snake = np.array(DEFAULT_SNAKE if snake is None else snake)
+        self.mode = mode
+
+        exponents, values = _row_cells()
+        self.rough = np.abs(np.diff(values, axis=1)).sum(axis=1)
+        self.empty = (values == 0).sum(axis=1)
+        self.pairs = (values[:, :-1] == values[:, 1:]).sum(axis=1)
+        self.row_max = values.max(axis=1)
+        self.present = np.bitwise_or.reduce(np.left_shift(1, exponents), axis=1)  # Bit e set if exponent e occurs, bit 0 for empty
+        self.row_sum = values.sum(axis=1)
+        self.is_sorted = (values[:, :-1] >= values[:, 1:]).all(axis=1)
+        self.snake_rows = [values @ self.snake[r] for r in range(bitboard.BOARD_SIZE)]
+        # Equal cells between two rows, looked up with the XOR of the rows: every zero nibble is a vertical pair
+        self.zero_nibbles = (exponents == 0).sum(axis=1)
+        # Exponent of the lowest set bit of every 16-bit presence mask, 0 for an empty mask
+        masks = np.arange(bitboard.ROW_MASK + 1)
+        self.lowest_bit = np.where(masks > 0, np.log2(np.maximum(masks & -masks, 1)), 0).astype(np.int64)
+        # Squared tile value of every exponent, 0 stands for an empty cell
+        self.square_value = np.array([0] + [(2 ** e) ** 2 for e in range(1, bitboard.MAX_EXPONENT + 1)], dtype=np.int64)
+
+        w = self.weights
+        if mode == "additive":
+            # Value of every tile taking part in a merge-able pair, zeros excluded
+            merge_value = ((values[:, :-1] == values[:, 1:]) * values[:, :-1]).sum(axis=1)
+            self.row_tables = [
+                w["snake"] * self.snake_rows[r] - w["smoothness"] * self.rough + w["empty"] * self.empty
+                + w["merge"] * merge_value
+                + (w["sorted_bonus"] * self.row_sum * self.is_sorted if r == bitboard.BOARD_SIZE - 1 else 0)
+                for r in range(bitboard.BOARD_SIZE)
+            ]
+            self.column_table = w["merge"] * merge_value
+            self._row_lists = [table.tolist() for table in self.row_tables]
+            self._column_list = self.column_table.tolist()
+        else:
+            self._rough = self.rough.tolist()
+            self._empty = self.empty.tolist()
+            self._pairs = self.pairs.tolist()
+            self._zero_nibbles = self.zero_nibbles.tolist()
+            self._row_max = self.row_max.tolist()
+            self._present = self.present.tolist()
+            self._row_sum = self.row_sum.tolist()
+            self._is_sorted = self.is_sorted.tolist()
+            self._snake_rows = [table.tolist() for table in self.snake_rows]
+            self._lowest_bit = self.lowest_bit.tolist()
+            self._square_value = self.square_value.tolist()
+
+    def save(self, path: str, **info) -> None:
+        """
+        Saves the weights and snake of an "exact" evaluator to a JSON file.
+
+        Args:
+            path (str): The weights file.
+            **info: Extra JSON fields stored alongside, e.g. how the weights were found.
+        """
+        with open(path, "w") as f:
+            json.dump({"weights": self.weights, "snake": self.snake.tolist(), **info}, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "RowTableEvaluator":
+        """Builds an "exact" evaluator from a weights file written by save."""
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["weights"], np.array(data["snake"]))
+
+    def __reduce__(self):
+        # Rebuild the tables from the settings instead of pickling them, e.g. for worker processes
+        return (RowTableEvaluator, (self.weights, self.snake, self.mode))
+
+    def evaluate_board(self, board: int) -> float:
+        """
+        Scores one packed board.
+
+        Args:
+            board (int): The packed board.
+
+        Returns:
+            float: The heuristic score.
+        """
+        mask = bitboard.ROW_MASK
+        r0, r1, r2, r3 = board & mask, (board >> 16) & mask, (board >> 32) & mask, (board >> 48) & mask
+
+        if self.mode == "additive":
+            tables = self._row_lists
+            column_table = self._column_list
+            transposed = bitboard.transpose(board)
+            return (tables[0][r0] + tables[1][r1] + tables[2][r2] + tables[3][r3]
+                    + column_table[transposed & mask] + column_table[(transposed >> 16) & mask]
+                    + column_table[(transposed >> 32) & mask] + column_table[(transposed >> 48) & mask])
+
+        w = self.weights
+        snake_rows = self._snake_rows
+        rough, empty, pairs, row_max, present = self._rough, self._empty, self._pairs, self._row_max, self._present
+        perfection = snake_rows[0][r0] + snake_rows[1][r1] + snake_rows[2][r2] + snake_rows[3][r3]
+        smoothness_score = -(rough[r0] + rough[r1] + rough[r2] + rough[r3])
+        empty_cells = empty[r0] + empty[r1] + empty[r2] + empty[r3]
+        zero_nibbles = self._zero_nibbles
+        merge_score = (pairs[r0] + pairs[r1] + pairs[r2] + pairs[r3]
+                       + zero_nibbles[r0 ^ r1] + zero_nibbles[r1 ^ r2] + zero_nibbles[r2 ^ r3])
+        max_value = max(row_max[r0], row_max[r1], row_max[r2], row_max[r3])
+
+        # Same tiles as AI.evaluate picks: the smallest and second smallest distinct values
+        occurring = present[r0] | present[r1] | present[r2] | present[r3]
+        bottom_present = present[r3]
+        lowest = self._lowest_bit[occurring]
+        second = self._lowest_bit[occurring & (occurring - 1)]
+        penalty_max = 0 if bottom_present >> lowest & 1 else -self._square_value[lowest]
+        penalty_second_max = 0 if bottom_present >> second & 1 else -self._square_value[second]
+        sorted_bonus = self._row_sum[r3] if self._is_sorted[r3] else 0
+
+        total = (w["snake"] * perfection + w["smoothness"] * smoothness_score + w["empty"] * empty_cells ** 2
+                 + w["merge"] * merge_score * max_value + w["max_penalty"] * penalty_max
+                 + w["second_max_penalty"] * penalty_second_max + w["sorted_bonus"] * sorted_bonus)
+        return max(total, 0)
+
+    def evaluate_boards(self, boards: np.ndarray) -> np.ndarray:
+        """
+        Scores many packed boards with vectorized table lookups.
+
+        Args:
+            boards (np.ndarray): N packed boards as uint64.
+
+        Returns:
+            np.ndarray: The N heuristic scores.
+        """
+        boards = np.asarray(boards, dtype="<u8")
+        rows = boards.view("<u2").reshape(-1, bitboard.BOARD_SIZE).T.astype(np.int64)  # (4, N), row r in bits 16r
+
+        if self.mode == "additive":
+            transposed = transpose_boards(boards).view("<u2").reshape(-1, bitboard.BOARD_SIZE).T.astype(np.int64)
+            return (sum(self.row_tables[r][row] for r, row in enumerate(rows))
+                    + self.column_table[transposed].sum(axis=0))
+
+        w = self.weights
+        perfection = sum(self.snake_rows[r][row] for r, row in enumerate(rows))
+        smoothness_score = -self.rough[rows].sum(axis=0)
+        empty_cells = self.empty[rows].sum(axis=0)
+        merge_score = self.pairs[rows].sum(axis=0) + self.zero_nibbles[rows[:-1] ^ rows[1:]].sum(axis=0)
+        max_value = self.row_max[rows].max(axis=0)
+
+        present = np.bitwise_or.reduce(self.present[rows], axis=0)
+        bottom = rows[-1]
+        bottom_present = self.present[bottom]
+        lowest = self.lowest_bit[present]
+        second = self.lowest_bit[present & (present - 1)]
+        penalty_max = np.where((bottom_present >> lowest) & 1, 0, -self.square_value[lowest])
+        penalty_second_max = np.where((bottom_present >> second) & 1, 0, -self.square_value[second])
+        sorted_bonus = np.where(self.is_sorted[bottom], self.row_sum[bottom], 0)
+
+        total = (w["snake"] * perfection + w["smoothness"] * smoothness_score + w["empty"] * np.square(empty_cells)
+                 + w["merge"] * merge_score * max_value + w["max_penalty"] * penalty_max
+                 + w["second_max_penalty"] * penalty_second_max + w["sorted_bonus"] * sorted_bonus)
+        return np.maximum(total, 0)
+
+
+def transpose_boards(boards: np.ndarray) -> np.ndarray:
+    """Vectorized bitboard.transpose for an array of uint64 boards."""
+    a1 = boards & np.uint64(0xF0F00F0FF0F00F0F)
+    a2 = boards & np.uint64(0x0000F0F00000F0F0)
+    a3 = boards & np.uint64(0x0F0F00000F0F0000)
+    a = a1 | (a2 << np.uint64(12)) | (a3 >> np.uint64(12))
+    b1 = a & np.uint64(0xFF00FF0000FF00FF)
+    b2 = a & np.uint64(0x00FF00FF00000000)
+    b3 = a & np.uint64(0x00000000FF00FF00)
+    return b1 | (b2 >> np.uint64(24)) | (b3 << np.uint64(24))
@@ -0,0 +1,205 @@
+"""
+Load generator for server.py: plays many concurrent sessions and reports throughput and tail latency.
+
+Every session starts a seeded game and sends "play" requests until the game is over
+or it has made the requested number of moves. Sessions are spread over a few
+connections, each multiplexing its requests by id.
+
+Example:
+    python server.py --port 8048 &
+    python loadgen.py --port 8048 --connections 8 --sessions 1000 --moves 50
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+from typing import Optional
+
+import numpy as np
+
+RETRY_ERRORS = ("overloaded", "deadline exceeded")  # Transient errors of server.py, the request is sent again
+
+
+class GameClient:
+    """Connection to a GameServer that can have many requests in flight at once."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.ids = itertools.count(1)
+        self.pending: dict[int, asyncio.Future] = {}
+        self.receiver = asyncio.create_task(self._receive())
+
+    @classmethod
+    async def connect(cls, host: str = "127.0.0.1", port: int = 8048, unix_path: Optional[str] = None) -> "GameClient":
+        """Opens a connection over TCP, or over a Unix socket when unix_path is set."""
+        if unix_path:
+            reader, writer = await asyncio.open_unix_connection(unix_path, limit=2**20)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=2**20)
+        return cls(reader, writer)
+
+    async def _receive(self) -> None:
+        """Resolves the pending requests as their responses arrive."""
+        try:
+            while line := await self.reader.readline():
+                response = json.loads(line)
+                future = self.pending.pop(response.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("connection closed"))
+
+    async def request(self, op: str, **fields) -> dict:
+        """
+        Sends a request and waits for its response.
+
+        Args:
+            op (str): The operation, see server.py.
+            **fields: The other fields of the request.
+
+        Returns:
+            dict: The response, with "ok" and either the result fields or "error".
+        """
+        request_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        self.writer.write(json.dumps({"id": request_id, "op": op, **fields}).encode() + b"\n")
+        await self.writer.drain()
+        return await future
+
+    async def close(self) -> None:
+        self.writer.close()
+        await self.writer.wait_closed()
+        await self.receiver
+
+
+async def play_session(client: GameClient, seed: int, moves: int, depth: Optional[int],
+                       deadline_ms: Optional[float], latencies: list[float], errors: Counter) -> tuple[int, bool]:
+    """
+    Plays one game through the server.
+
+    Requests failing with one of RETRY_ERRORS are retried, any other error ends the session.
+
+    Args:
+        client (GameClient): The connection to use.
+        seed (int): Seed of the game.
+        moves (int): Maximum number of moves.
+        depth (Optional[int]): Search depth, the server default if None.
+        deadline_ms (Optional[float]): Deadline of every move, the server default if None.
+        latencies (list[float]): The latency of every play request is appended here, in seconds.
+        errors (Counter): Failed requests are counted here by error.
+
+    Returns:
+        tuple[int, bool]: The number of moves made, and False if the session ended with an error.
+    """
+    options = {key: value for key, value in (("depth", depth), ("deadline_ms", deadline_ms)) if value is not None}
+    response = await client.request("new", seed=seed)
+    if not response["ok"]:
+        errors[response["error"]] += 1
+        return 0, False
+    session = response["session"]
+    made = 0
+    failed = False
+    while made < moves:
+        start = time.perf_counter()
+        response = await client.request("play", session=session, **options)
+        latencies.append(time.perf_counter() - start)
+        if not response["ok"]:
+            errors[response["error"]] += 1
+            if response["error"] not in RETRY_ERRORS:
+                failed = True
+                break
+            if response["error"] == "overloaded":
+                await asyncio.sleep(0.01)  # Back off before retrying
+            continue
+        if response["move"] is None:
+            break
+        made += 1
+        if response["game_over"]:
+            break
+    await client.request("close", session=session)
+    return made, not failed
+
+
+async def run_load(sessions: int, moves: int, connections: int = 4, seed: int = 0, depth: Optional[int] = None,
+                   deadline_ms: Optional[float] = None, host: str = "127.0.0.1", port: int = 8048,
+                   unix_path: Optional[str] = None) -> dict:
+    """
+    Plays sessions concurrently and measures the server.
+
+    Args:
+        sessions (int): Number of concurrent sessions, session i uses seed + i.
+        moves (int): Maximum number of moves per session.
+        connections (int): Number of connections the sessions are spread over.
+        seed (int): Seed of the first session.
+        depth (Optional[int]): Search depth, the server default if None.
+        deadline_ms (Optional[float]): Deadline of every move, the server default if None.
+        host (str): Server address.
+        port (int): Server TCP port.
+        unix_path (Optional[str]): Connect to this Unix socket instead of TCP.
+
+    Returns:
+        dict: Moves, errors, failed sessions, throughput, latency percentiles and the server's stats.
+    """
+    clients = [await GameClient.connect(host, port, unix_path) for _ in range(connections)]
+    latencies: list[float] = []
+    errors: Counter = Counter()
+    start = time.perf_counter()
+    results = await asyncio.gather(*(play_session(clients[i % connections], seed + i, moves, depth, deadline_ms,
+                                               latencies, errors) for i in range(sessions)))
+    wall_seconds = time.perf_counter() - start
+    server_stats = {key: value for key, value in (await clients[0].request("stats")).items() if key not in ("id", "ok")}
+    for client in clients:
+        await client.close()
+
+    samples = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    total_moves = sum(made for made, _ in results)
+    return {
+        "sessions": sessions,
+        "failed_sessions": sum(not completed for _, completed in results),
+        "connections": connections,
+        "moves": total_moves,
+        "requests": len(latencies),
+        "errors": dict(errors),
+        "wall_seconds": wall_seconds,
+        "moves_per_second": total_moves / wall_seconds if wall_seconds else 0.0,
+        "latency_ms": {
+            "mean": float(samples.mean()),
+            "p50": float(np.percentile(samples, 50)),
+            "p90": float(np.percentile(samples, 90)),
+            "p99": float(np.percentile(samples, 99)),
+            "max": float(samples.max()),
+        },
+        "server": server_stats,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure the throughput and latency of server.py.")
+    parser.add_argument("--host", default="127.0.0.1", help="server address")
+    parser.add_argument("--port", type=int, default=8048, help="server TCP port")
+    parser.add_argument("--unix", default=None, help="connect to this Unix socket instead of TCP")
+    parser.add_argument("--connections", type=int, default=4, help="connections the sessions are spread over")
+    parser.add_argument("--sessions", type=int, default=100, help="number of concurrent sessions")
+    parser.add_argument("--moves", type=int, default=50, help="maximum moves per session")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first session, session i uses seed + i")
+    parser.add_argument("--depth", type=int, default=None, help="search depth (default: the server's)")
+    parser.add_argument("--deadline-ms", type=float, default=None, help="deadline per move (default: the server's)")
+    parser.add_argument("--output", default=None, help="write the summary to this JSON file")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run_load(args.sessions, args.moves, args.connections, args.seed, args.depth,
+                                   args.deadline_ms, args.host, args.port, args.unix))
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "summary": summary}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,46 @@
+import os
 import pygame
 import numpy as np
-from constants import GRID_SIZE, CELL_SIZE, GAP_SIZE, WIDTH, HEIGHT, BACKGROUND_COLOR, TEXT_COLOR, CELL_COLOR
+from constants import MOVE_BOOK_PATH, NTUPLE_WEIGHTS_PATH, HEURISTIC_WEIGHTS_PATH, FPS, GRID_SIZE, CELL_SIZE, GAP_SIZE, WIDTH, HEIGHT, BACKGROUND_COLOR, TEXT_COLOR, CELL_COLOR
 from game import Game, AI
+from heuristic import RowTableEvaluator
+from movebook import MoveBook
+from ntuple import NTupleNetwork
 from ui import UI
 
 def main():
     pygame.init()
-    game = Game()
-    ai = AI(game)
+    game = Game(use_bitboard=True)
+    evaluator = None
+    if os.path.exists(NTUPLE_WEIGHTS_PATH):
+        evaluator = NTupleNetwork.load(NTUPLE_WEIGHTS_PATH)
+    elif os.path.exists(HEURISTIC_WEIGHTS_PATH):
+        evaluator = RowTableEvaluator.load(HEURISTIC_WEIGHTS_PATH)
+    ai = AI(game, move_book=MoveBook(MOVE_BOOK_PATH) if os.path.exists(MOVE_BOOK_PATH) else None,
+            evaluator=evaluator)
     ui = UI(game, ai)
+    clock = pygame.time.Clock()
     running = True
     while running:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == pygame.WINDOWEXPOSED:
+                ui.invalidate()
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_LEFT:
-                    game.move("left")
+                    ui.move("left")
                 elif event.key == pygame.K_RIGHT:
-                    game.move("right")
+                    ui.move("right")
                 elif event.key == pygame.K_UP:
-                    game.move("up")
+                    ui.move("up")
                 elif event.key == pygame.K_DOWN:
-                    game.move("down")
-                ui.moves += 1
-        if ui.ai_running:
-            best_move = ai.find_best_move(game.grid, 4)
-            game.move(best_move)
+                    ui.move("down")
+        ui.poll_ai()
         ui.update()
+        clock.tick(FPS)  # Sleep for the rest of the frame instead of spinning
+    ui.close()
+    ai.close_pool()
     pygame.quit()
     
 if __name__ == "__main__":
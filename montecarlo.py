@@ -0,0 +1,315 @@
+"""
+Monte Carlo move selection: plays rollouts after every legal move and picks the best average.
+
+For each legal root move K rollouts start from its afterstate, spawn a tile and play
+random or greedy moves up to a horizon or until the game is over. The outcome of a
+rollout is the merge reward of the root move plus the rewards collected on the way,
+the standard 2048 score. All rollouts of a decision are stepped together as one
+(N, 4, 4) array of exponent boards with the vecgame move functions; finished rollouts
+are dropped from the array as they end. With a time budget the rollouts are played in
+rounds until the deadline, and the rollouts running at the deadline are cut short and
+count the rewards collected so far. With workers > 1 the rollouts are split over a
+process pool, each worker playing its share with its own generator until the same deadline.
+
+Example:
+    python montecarlo.py --rollouts 100 --games 4
+    python montecarlo.py --rollouts 2000 --workers 8 --time-budget-ms 200 --policy greedy
+    python simulate.py --games 20 --rollouts 100 --rollout-policy random
+"""
+import argparse
+import json
+import time
+from multiprocessing import Pool
+from typing import Optional
+
+import numpy as np
+
+import bitboard
+import expgrid
+from game import Game
+from vecgame import ACTIONS, slide_left
+
+ROLLOUT_POLICIES = ("random", "greedy")
+
+# Spawned tiles as exponents with the cumulative probabilities of Game.add_tile
+_SPAWN_TILES = Game().get_tile_spawn_probabilities(grid=None)
+SPAWN_EXPONENTS = np.array([bitboard.tile_exponent(value) for value, _ in _SPAWN_TILES], dtype=np.uint8)
+SPAWN_THRESHOLDS = np.cumsum([probability for _, probability in _SPAWN_TILES])
+
+
+def all_moves(boards: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Applies each of the four moves to every board.
+
+    Args:
+        boards (np.ndarray): An (N, 4, 4) array of exponent boards.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: The (4, N, 4, 4) moved boards and the
+        (4, N) merge rewards indexed by action code, and the (N, 4) legal move mask.
+    """
+    moved = np.empty((len(ACTIONS),) + boards.shape, dtype=boards.dtype)
+    rewards = np.empty((len(ACTIONS), len(boards)), dtype=np.int64)
+    for action in ACTIONS:
+        slid, rewards[action] = slide_left(np.rot90(boards, action, axes=(1, 2)))
+        moved[action] = np.rot90(slid, -action, axes=(1, 2))
+    legal = (moved != boards).any(axis=(2, 3)).T
+    return moved, rewards, legal
+
+
+def spawn_tiles(boards: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """
+    Spawns one tile on a random empty cell of every board, with the probabilities of Game.add_tile.
+
+    Args:
+        boards (np.ndarray): An (N, 4, 4) array of exponent boards, each with an empty cell.
+        rng (np.random.Generator): Source of the cells and tiles.
+
+    Returns:
+        np.ndarray: The boards with the new tiles.
+    """
+    flat = boards.reshape(len(boards), -1).copy()
+    empty = flat == 0
+    draws = rng.random((len(boards), 2))
+    choice = (draws[:, 0] * empty.sum(axis=1)).astype(np.int64)
+    cells = (np.cumsum(empty, axis=1) > choice[:, None]).argmax(axis=1)
+    flat[np.arange(len(flat)), cells] = SPAWN_EXPONENTS[np.searchsorted(SPAWN_THRESHOLDS, draws[:, 1], side="right")]
+    return flat.reshape(boards.shape)
+
+
+def play_rollouts(boards: np.ndarray, rng: np.random.Generator, policy: str = "random",
+                  horizon: Optional[int] = None, deadline: Optional[float] = None) -> tuple[np.ndarray, float]:
+    """
+    Plays one rollout from every afterstate, all boards stepped together.
+
+    Args:
+        boards (np.ndarray): An (N, 4, 4) array of afterstates, before their tile spawn.
+        rng (np.random.Generator): Source of the spawns and the random moves.
+        policy (str): 'random' picks a legal move uniformly, 'greedy' the move with the
+            largest merge reward, breaking ties at random.
+        horizon (Optional[int]): Maximum moves per rollout, None plays until game over.
+        deadline (Optional[float]): perf_counter() time at which the rollouts are cut short.
+
+    Returns:
+        tuple[np.ndarray, float]: The N rewards collected by the rollouts, up to the deadline if
+        it passed, and the duration of the longest step in seconds.
+    """
+    totals = np.zeros(len(boards), dtype=np.int64)
+    active = np.arange(len(boards))
+    boards = spawn_tiles(boards, rng)
+    steps = 0
+    step_seconds = 0.0  # Duration of the last step, the next one is stopped if it would end after the deadline
+    longest_step = 0.0
+    while len(active) and (horizon is None or steps < horizon):
+        step_start = time.perf_counter()
+        if deadline is not None and step_start + step_seconds > deadline:
+            break  # All rollouts are cut at the same step, so the moves stay comparable
+        moved, rewards, legal = all_moves(boards)
+        # Rewards are multiples of 4, so the random term in [0, 1) only breaks the ties of greedy
+        preference = rng.random(legal.shape) + (rewards.T if policy == "greedy" else 0)
+        actions = np.where(legal, preference, -np.inf).argmax(axis=1)
+        alive = legal.any(axis=1)
+        index = np.flatnonzero(alive)
+        totals[active[index]] += rewards[actions[index], index]
+        boards = moved[actions[index], index]
+        active = active[index]
+        if len(active):
+            boards = spawn_tiles(boards, rng)
+        steps += 1
+        step_seconds = time.perf_counter() - step_start
+        longest_step = max(longest_step, step_seconds)
+    return totals, longest_step
+
+
+def rollout_values(grid: np.ndarray, rollouts: int, rng: np.random.Generator, policy: str = "random",
+                   horizon: Optional[int] = None, batch_size: int = 64,
+                   deadline: Optional[float] = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Plays rollouts after every legal move of a board, in rounds of batch_size per move.
+
+    Every round is cut short at the deadline and no round is started when its first step
+    would end after it, but the first round is always started so every legal move gets a value.
+
+    Args:
+        grid (np.ndarray): A 4x4 exponent grid.
+        rollouts (int): Rollouts per legal move.
+        rng (np.random.Generator): Source of the spawns and the random moves.
+        policy (str): Move policy of the rollouts, see play_rollouts.
+        horizon (Optional[int]): Maximum moves per rollout, None plays until game over.
+        batch_size (int): Rollouts per move and round.
+        deadline (Optional[float]): perf_counter() time at which the rollouts are cut short.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The summed outcomes and the number of played rollouts
+        of every action code, zero for illegal moves.
+    """
+    moved, rewards, legal = all_moves(grid[None])
+    actions = np.flatnonzero(legal[0])
+    totals = np.zeros(len(ACTIONS))
+    counts = np.zeros(len(ACTIONS), dtype=np.int64)
+    if len(actions) == 0:
+        return totals, counts
+    played = 0
+    step_seconds = 0.0  # Longest step of the rounds so far
+    while played < rollouts:
+        if played and deadline is not None and time.perf_counter() + step_seconds > deadline:
+            break
+        size = min(batch_size, rollouts - played)
+        outcomes, round_step_seconds = play_rollouts(np.repeat(moved[actions, 0], size, axis=0), rng, policy,
+                                                     horizon, deadline)
+        step_seconds = max(step_seconds, round_step_seconds)
+        totals[actions] += outcomes.reshape(len(actions), size).sum(axis=1) + size * rewards[actions, 0]
+        counts[actions] += size
+        played += size
+    return totals, counts
+
+
+def _rollout_task(args: tuple) -> tuple[np.ndarray, np.ndarray]:
+    """Plays a worker's share of the rollouts of a decision, see MonteCarloPlayer.move_values."""
+    grid, rollouts, seed, policy, horizon, batch_size, deadline_time = args
+    # The deadline is a time.time() of the parent, as perf_counter() is not shared between processes
+    deadline = time.perf_counter() + deadline_time - time.time() if deadline_time is not None else None
+    return rollout_values(grid, rollouts, np.random.default_rng(seed), policy, horizon, batch_size, deadline)
+
+
+class MonteCarloPlayer:
+    """
+    Picks moves by the average outcome of rollouts, an alternative to AI.find_best_move.
+
+    With workers > 1 the worker processes are started when the player is created, so the
+    first decision does not spend its time budget on them, and live until close_pool,
+    like the pool of AI.find_best_move_mult. Sending the rollouts to the workers, collecting
+    their results and finishing the last rollout step take time the rollouts cannot see,
+    so their deadline is earlier than the budget by margin_seconds, which starts at the
+    pool round trip and is adjusted after every timed decision until the decisions end
+    within their budget.
+    """
+
+    def __init__(self, rollouts: int = 100, policy: str = "random", horizon: Optional[int] = None,
+                 batch_size: int = 64, workers: int = 1, seed: Optional[int] = None) -> None:
+        """
+        Args:
+            rollouts (int): Rollouts per legal move and decision.
+            policy (str): Move policy of the rollouts, 'random' or 'greedy'.
+            horizon (Optional[int]): Maximum moves per rollout, None plays until game over.
+            batch_size (int): Rollouts per move stepped together in one round.
+            workers (int): Processes the rollouts are split over, 1 plays them in this process.
+            seed (Optional[int]): Seed of the rollouts.
+        """
+        if policy not in ROLLOUT_POLICIES:
+            raise ValueError(f"Unknown rollout policy: {policy!r}")
+        self.rollouts = rollouts
+        self.policy = policy
+        self.horizon = horizon
+        self.batch_size = batch_size
+        self.workers = workers
+        self.rng = np.random.default_rng(seed)
+        self.pool: Optional[Pool] = None
+        self.rollouts_played = 0  # Rollouts played since the player was created
+        self.margin_seconds = 0.0  # Part of the time budget kept for the work outside the rollouts
+        if workers > 1:
+            self.start_pool()
+
+    def start_pool(self) -> None:
+        """Starts the worker pool, if it is not running yet, and measures its round trip."""
+        if self.pool is None:
+            self.pool = Pool(self.workers)
+            start = time.perf_counter()
+            self.pool.map(abs, range(self.workers))  # Also waits until all workers are up
+            self.margin_seconds = time.perf_counter() - start
+
+    def close_pool(self) -> None:
+        """Shuts down the worker pool and waits for the workers to exit."""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def move_values(self, grid: np.ndarray, time_budget_ms: Optional[float] = None) -> dict[str, float]:
+        """
+        Plays the rollouts of a decision.
+
+        Args:
+            grid (np.ndarray): The game grid, as in Game.grid.
+            time_budget_ms (Optional[float]): Cut the rollouts short after this many milliseconds;
+                one round per worker is always started.
+
+        Returns:
+            dict[str, float]: The mean outcome of every legal move.
+        """
+        start, start_time = time.perf_counter(), time.time()
+        exponents = expgrid.to_exponents(grid)
+        # Seconds the rollouts may run, the rest of the budget is left for the work around them
+        run_seconds = max(time_budget_ms / 1000 - self.margin_seconds, 0.0) if time_budget_ms is not None else None
+        if self.workers <= 1:
+            deadline = start + run_seconds if run_seconds is not None else None
+            totals, counts = rollout_values(exponents, self.rollouts, self.rng, self.policy, self.horizon,
+                                            self.batch_size, deadline)
+        else:
+            self.start_pool()  # Restarts the workers after close_pool
+            deadline_time = start_time + run_seconds if run_seconds is not None else None
+            shares = [len(share) for share in np.array_split(np.arange(self.rollouts), self.workers) if len(share)]
+            seeds = self.rng.integers(2**63, size=len(shares))
+            results = self.pool.map(_rollout_task, [(exponents, share, int(seed), self.policy, self.horizon,
+                                                     self.batch_size, deadline_time)
+                                                    for share, seed in zip(shares, seeds)])
+            totals = sum(result[0] for result in results)
+            counts = sum(result[1] for result in results)
+        if time_budget_ms is not None:
+            # Widen the margin by a whole overrun, and narrow it slowly while decisions end early
+            overrun = time.perf_counter() - (start + time_budget_ms / 1000)
+            self.margin_seconds = max(self.margin_seconds + (overrun if overrun > 0 else 0.1 * overrun), 0.0)
+        self.rollouts_played += int(counts.sum())
+        return {ACTIONS[action]: float(totals[action] / counts[action]) for action in np.flatnonzero(counts)}
+
+    def find_best_move(self, grid: np.ndarray, time_budget_ms: Optional[float] = None) -> Optional[str]:
+        """
+        Finds the move with the best average rollout outcome.
+
+        Args:
+            grid (np.ndarray): The game grid, as in Game.grid.
+            time_budget_ms (Optional[float]): Per-move time budget, see move_values.
+
+        Returns:
+            Optional[str]: The best move direction, or None if no move is possible.
+        """
+        values = self.move_values(grid, time_budget_ms)
+        return max(values, key=values.get) if values else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Play 2048 games with the Monte Carlo rollout player.")
+    parser.add_argument("--games", type=int, default=4, help="number of games to play")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game, game i uses seed + i")
+    parser.add_argument("--rollouts", type=int, default=100, help="rollouts per legal move and decision")
+    parser.add_argument("--policy", choices=ROLLOUT_POLICIES, default="random", help="move policy of the rollouts")
+    parser.add_argument("--horizon", type=int, default=None, help="maximum moves per rollout (default: game over)")
+    parser.add_argument("--batch-size", type=int, default=64, help="rollouts per move stepped together")
+    parser.add_argument("--workers", type=int, default=1, help="processes the rollouts of a decision are split over")
+    parser.add_argument("--time-budget-ms", type=float, default=None, help="per-move time budget")
+    parser.add_argument("--max-moves", type=int, default=None, help="stop each game after this many moves")
+    args = parser.parse_args()
+
+    player = MonteCarloPlayer(args.rollouts, args.policy, args.horizon, args.batch_size, args.workers, args.seed)
+    results = []
+    try:
+        for seed in range(args.seed, args.seed + args.games):
+            game = Game(auto_reset=False)
+            game.resetgame(seed)  # Seeds np.random, which drives the tile spawns
+            start = time.perf_counter()
+            while not game.game_over() and (args.max_moves is None or game.moves < args.max_moves):
+                best_move = player.find_best_move(game.grid, args.time_budget_ms)
+                if best_move is None:
+                    break
+                game.move(best_move)
+            seconds = time.perf_counter() - start
+            results.append({"seed": seed, "max_tile": int(game.grid.max()), "moves": game.moves,
+                            "move_ms": 1000 * seconds / max(game.moves, 1)})
+            print(json.dumps(results[-1]), flush=True)
+    finally:
+        player.close_pool()
+    print(f"{player.rollouts_played} rollouts, average max tile {np.mean([r['max_tile'] for r in results]):.0f}")
+
+
+if __name__ == "__main__":
+    main()
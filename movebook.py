@@ -0,0 +1,269 @@
+"""
+Precomputed move book for positions that recur across games.
+
+Positions are stored under their canonical board, the smallest of its 8 symmetric
+transforms, in a sorted binary file that is memory-mapped for O(log n) lookups.
+The heuristic is not symmetric, so every record keeps one move per symmetry that
+leads to the canonical board; moves are stored in the canonical frame and mapped
+back on lookup.
+
+Example:
+    python movebook.py build --output movebook.bin --games 200 --max-moves 60 --depth 5
+    python movebook.py info movebook.bin
+"""
+import argparse
+import os
+import time
+from multiprocessing import Pool
+from typing import Optional
+
+import numpy as np
+
+import bitboard
+from game import Game, AI
+
+BOOK_MAGIC = b"2048BOOK"
+BOOK_VERSION = 1
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("version", "<u4"),
+    ("depth", "<u4"),  # Search depth the moves were found with
+    ("count", "<u8"),  # Number of records
+    ("search", "S16"),  # Search algorithm the moves were found with
+])
+# One record per canonical board, sorted by board. moves holds 3 bits per symmetry:
+# 0 if that orientation was not searched, else 1 + the index of the move in DIRECTIONS.
+RECORD_DTYPE = np.dtype([("board", "<u8"), ("moves", "<u4")])
+DIRECTIONS = ["left", "up", "right", "down"]
+
+
+def slot_move(moves: int, symmetry: int) -> Optional[str]:
+    """Returns the canonical-frame move stored for a symmetry, or None if there is none."""
+    code = (moves >> (3 * symmetry)) & 0b111
+    return DIRECTIONS[code - 1] if code else None
+
+
+def with_slot_move(moves: int, symmetry: int, move: str) -> int:
+    """Returns the moves field with the canonical-frame move of a symmetry replaced."""
+    shift = 3 * symmetry
+    return (moves & ~(0b111 << shift)) | ((DIRECTIONS.index(move) + 1) << shift)
+
+
+class MoveBook:
+    """
+    Read-only, memory-mapped move book.
+
+    Opening a book only maps the file, nothing is loaded up front. Pickling a book
+    pickles its path, so worker processes map the same file.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Maps a book file written by write_book.
+
+        Args:
+            path (str): Path of the book file.
+        """
+        self.path = path
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        if len(header) == 0 or header["magic"][0] != BOOK_MAGIC:
+            raise ValueError(f"{path} is not a move book")
+        if header["version"][0] != BOOK_VERSION:
+            raise ValueError(f"Unsupported move book version {header['version'][0]} in {path}")
+        self.depth = int(header["depth"][0])
+        self.search = header["search"][0].decode()
+        count = int(header["count"][0])
+        if count:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_DTYPE.itemsize, shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+        self.boards = self.records["board"]
+
+    def __reduce__(self):
+        return (MoveBook, (self.path,))
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def lookup(self, board: int) -> Optional[str]:
+        """
+        Finds the book move of a position.
+
+        Args:
+            board (int): The packed board.
+
+        Returns:
+            Optional[str]: The move for this board, or None if the book does not contain it.
+        """
+        key, symmetry = bitboard.canonical(board)
+        index = int(np.searchsorted(self.boards, np.uint64(key)))
+        if index == len(self.boards) or int(self.boards[index]) != key:
+            return None
+        move = slot_move(int(self.records["moves"][index]), symmetry)
+        return bitboard.inverse_symmetry_direction(move, symmetry) if move is not None else None
+
+    def entries(self) -> dict[int, int]:
+        """Returns all records as a dict from canonical board to moves field."""
+        return dict(zip(self.records["board"].tolist(), self.records["moves"].tolist()))
+
+
+def write_book(path: str, entries: dict[int, int], depth: int, search: str) -> None:
+    """
+    Writes a book file, replacing any existing file at path atomically.
+
+    Args:
+        path (str): Path of the book file.
+        entries (dict[int, int]): Canonical board mapped to its moves field.
+        depth (int): Search depth the moves were found with.
+        search (str): Search algorithm the moves were found with.
+    """
+    records = np.zeros(len(entries), dtype=RECORD_DTYPE)
+    records["board"] = np.array(sorted(entries), dtype=np.uint64)
+    records["moves"] = [entries[board] for board in records["board"].tolist()]
+    header = np.array([(BOOK_MAGIC, BOOK_VERSION, depth, len(records), search.encode())], dtype=HEADER_DTYPE)
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        header.tofile(f)
+        records.tofile(f)
+    os.replace(temp_path, path)
+
+
+def add_move(entries: dict[int, int], board: int, move: str) -> None:
+    """
+    Stores the best move of a board in a dict of book entries.
+
+    Args:
+        entries (dict[int, int]): Canonical board mapped to its moves field, updated in place.
+        board (int): The packed board.
+        move (str): The best move for the board.
+    """
+    key, symmetry = bitboard.canonical(board)
+    entries[key] = with_slot_move(entries.get(key, 0), symmetry, bitboard.symmetry_direction(move, symmetry))
+
+
+def collect_positions(games: int, seed: int = 0, play_depth: int = 2, max_moves: int = 60,
+                      all_symmetries: bool = False) -> list[int]:
+    """
+    Plays seeded games and collects the positions before each of their first moves.
+
+    Args:
+        games (int): Number of games, game i uses seed + i.
+        seed (int): Seed of the first game.
+        play_depth (int): Search depth of the AI playing the games.
+        max_moves (int): Number of moves recorded per game.
+        all_symmetries (bool): Also include the 7 symmetric transforms of every position.
+
+    Returns:
+        list[int]: The distinct packed boards, in the order they were first seen.
+    """
+    positions: dict[int, None] = {}
+    for game_seed in range(seed, seed + games):
+        np.random.seed(game_seed)
+        game = Game(use_bitboard=True, auto_reset=False)
+        ai = AI(game)
+        while not game.game_over() and game.moves < max_moves:
+            board = bitboard.encode(game.grid)
+            for symmetry in range(bitboard.SYMMETRY_COUNT if all_symmetries else 1):
+                positions[bitboard.apply_symmetry(board, symmetry)] = None
+            best_move = ai.find_best_move(game.grid, play_depth)
+            if best_move is None:
+                break
+            game.move(best_move)
+    return list(positions)
+
+
+# AI of a builder worker process, set up once by _init_builder
+_builder_ai: Optional[AI] = None
+
+
+def _init_builder(search: str) -> None:
+    """Builds the AI used by a builder worker process."""
+    global _builder_ai
+    _builder_ai = AI(Game(use_bitboard=True), search=search)
+
+
+def _search_position(args: tuple[int, int]) -> tuple[int, Optional[str]]:
+    """Searches one position of the book with the worker's AI."""
+    board, depth = args
+    return board, _builder_ai.find_best_move(bitboard.decode(board), depth)
+
+
+def build(output: str, games: int, seed: int = 0, play_depth: int = 2, depth: int = 5, max_moves: int = 60,
+          search: str = "minimax", workers: Optional[int] = None, all_symmetries: bool = False,
+          merge: bool = True) -> int:
+    """
+    Fills a book from deep searches of the positions of seeded games.
+
+    Args:
+        output (str): Path of the book file.
+        games (int): Number of games to collect positions from.
+        seed (int): Seed of the first game.
+        play_depth (int): Search depth of the AI playing the games.
+        depth (int): Search depth of the book moves.
+        max_moves (int): Number of moves recorded per game.
+        search (str): Search algorithm, 'minimax' or 'expectimax'.
+        workers (Optional[int]): Number of worker processes, defaults to the number of CPUs.
+        all_symmetries (bool): Also search the 7 symmetric transforms of every position.
+        merge (bool): Keep the records of an existing book at output, new searches win.
+
+    Returns:
+        int: The number of records in the written book.
+    """
+    entries: dict[int, int] = {}
+    if merge and os.path.exists(output):
+        book = MoveBook(output)
+        if book.depth != depth or book.search != search:
+            raise ValueError(f"{output} was built with {book.search} depth {book.depth}, not {search} depth {depth}")
+        entries = book.entries()
+        del book
+
+    positions = collect_positions(games, seed, play_depth, max_moves, all_symmetries)
+    print(f"Searching {len(positions)} positions at depth {depth}...", flush=True)
+    start = time.perf_counter()
+    with Pool(workers or os.cpu_count() or 1, initializer=_init_builder, initargs=(search,)) as pool:
+        for board, best_move in pool.imap_unordered(_search_position, [(board, depth) for board in positions], 8):
+            if best_move is not None:
+                add_move(entries, board, best_move)
+    print(f"Searched in {time.perf_counter() - start:.1f} s", flush=True)
+
+    write_book(output, entries, depth, search)
+    return len(entries)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or inspect a 2048 move book.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = commands.add_parser("build", help="fill a book from deep searches of seeded games")
+    build_parser.add_argument("--output", default="movebook.bin", help="book file, extended if it exists")
+    build_parser.add_argument("--games", type=int, default=100, help="number of games to collect positions from")
+    build_parser.add_argument("--seed", type=int, default=0, help="seed of the first game, game i uses seed + i")
+    build_parser.add_argument("--max-moves", type=int, default=60, help="positions recorded per game")
+    build_parser.add_argument("--play-depth", type=int, default=2, help="search depth of the games")
+    build_parser.add_argument("--depth", type=int, default=5, help="search depth of the book moves")
+    build_parser.add_argument("--search", choices=["minimax", "expectimax"], default="minimax")
+    build_parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    build_parser.add_argument("--all-symmetries", action="store_true",
+                              help="also search the symmetric transforms of every position")
+    build_parser.add_argument("--no-merge", action="store_true", help="replace an existing book instead of extending it")
+
+    info_parser = commands.add_parser("info", help="print the header and size of a book")
+    info_parser.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = build(args.output, args.games, args.seed, args.play_depth, args.depth, args.max_moves,
+                      args.search, args.workers, args.all_symmetries, not args.no_merge)
+        print(f"Wrote {count} records to {args.output}")
+    else:
+        book = MoveBook(args.path)
+        moves = book.records["moves"]
+        orientations = sum(int(np.count_nonzero((moves >> np.uint32(3 * s)) & np.uint32(0b111)))
+                           for s in range(bitboard.SYMMETRY_COUNT))
+        print(f"{args.path}: {len(book)} canonical boards, {orientations} positions, "
+              f"{book.search} depth {book.depth}, {os.path.getsize(args.path)} bytes")
+
+
+if __name__ == "__main__":
+    main()
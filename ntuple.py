@@ -0,0 +1,352 @@
+"""
+N-tuple network value function and its TD-learning trainer.
+
+The network scores a board as the sum of weights looked up by a few fixed cell
+tuples. Every tuple reads the log2 exponents of its cells as the digits of an
+index into its own float32 weight table, and is sampled in all 8 symmetric
+orientations of the board, which share the table. The trainer learns the
+afterstate values by TD(0) from self-play on Game, with worker processes
+updating one weight array in shared memory without locks.
+
+Example:
+    python ntuple.py train --episodes 20000 --output ntuple.npz
+    python simulate.py --games 100 --depth 2 --ntuple ntuple.npz
+"""
+import argparse
+import os
+import time
+from multiprocessing import Pool, shared_memory
+from typing import Optional, Sequence
+
+import numpy as np
+
+import bitboard
+from game import Game
+from vecgame import ROW_REWARD_TABLE
+
+# Cell tuples as row-major cell indices. "small" uses 4-tuples (5 tables of 65,536
+# weights), "large" the 6-tuples common in strong 2048 agents (4 tables of 16.7M weights).
+TUPLE_PRESETS = {
+    "small": [
+        [0, 1, 2, 3],
+        [4, 5, 6, 7],
+        [0, 1, 4, 5],
+        [1, 2, 5, 6],
+        [5, 6, 9, 10],
+    ],
+    "large": [
+        [0, 1, 2, 3, 4, 5],
+        [4, 5, 6, 7, 8, 9],
+        [0, 1, 2, 4, 5, 6],
+        [4, 5, 6, 8, 9, 10],
+    ],
+}
+DIRECTIONS = ["left", "up", "right", "down"]
+
+_ROW_REWARD = ROW_REWARD_TABLE.tolist()
+_ROW_REWARD_RIGHT = [_ROW_REWARD[row] for row in bitboard.ROW_REVERSE_TABLE]
+
+
+def move_reward(board: int, direction: str) -> int:
+    """
+    Sum of the tiles created by merges when a move is applied to a packed board.
+
+    Args:
+        board (int): The packed board.
+        direction (str): The direction of the move.
+
+    Returns:
+        int: The merge reward, the usual 2048 score increase.
+    """
+    if direction in ("up", "down"):
+        board = bitboard.transpose(board)
+    table = _ROW_REWARD if direction in ("left", "up") else _ROW_REWARD_RIGHT
+    return (table[board & 0xFFFF] + table[(board >> 16) & 0xFFFF]
+            + table[(board >> 32) & 0xFFFF] + table[(board >> 48) & 0xFFFF])
+
+
+def _symmetric_cells(cells: Sequence[int]) -> list[list[int]]:
+    """
+    Lists the cells a tuple reads in each of the 8 symmetric orientations of a board.
+
+    Reading cells of apply_symmetry(board, s) is the same as reading the returned cells
+    of board itself, so the board does not have to be transformed.
+    """
+    # Board whose cell i holds the exponent i, so every transformed cell names its source cell
+    numbered = sum(i << (4 * i) for i in range(bitboard.BOARD_SIZE * bitboard.BOARD_SIZE))
+    orientations = []
+    for symmetry in range(bitboard.SYMMETRY_COUNT):
+        transformed = bitboard.apply_symmetry(numbered, symmetry)
+        orientations.append([(transformed >> (4 * cell)) & bitboard.CELL_MASK for cell in cells])
+    return orientations
+
+
+class NTupleNetwork:
+    """
+    N-tuple network over packed boards, usable as AI(evaluator=...).
+
+    All tables live in one flat float32 array, weights, so it can be placed in shared
+    memory or saved as a whole. Exponents are read as 4-bit digits, so tiles are limited
+    to 2**15 like in bitboard.py.
+    """
+
+    def __init__(self, tuples: Sequence[Sequence[int]], weights: Optional[np.ndarray] = None) -> None:
+        """
+        Initializes a network with zero weights, or with the given weight array.
+
+        Args:
+            tuples (Sequence[Sequence[int]]): Row-major cell indices of every tuple.
+            weights (Optional[np.ndarray]): Flat float32 weights of all tables, used without copying.
+        """
+        self.tuples = [list(cells) for cells in tuples]
+        sizes = [16 ** len(cells) for cells in self.tuples]
+        self.offsets = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64)
+        self.size = int(sum(sizes))
+        if weights is None:
+            weights = np.zeros(self.size, dtype=np.float32)
+        if weights.shape != (self.size,) or weights.dtype != np.float32:
+            raise ValueError(f"Expected {self.size} float32 weights, got {weights.shape} {weights.dtype}")
+        self.weights = weights
+        self.path: Optional[str] = None  # File holding exactly these weights, set by load and save
+
+        # Every tuple in every orientation: its table offset and the cells it reads
+        self.features: list[tuple[int, list[int]]] = []
+        for offset, cells in zip(self.offsets.tolist(), self.tuples):
+            for oriented in _symmetric_cells(cells):
+                self.features.append((offset, oriented))
+        # Per table, the (8, tuple length) cells of its orientations, for the batched lookups
+        self._table_cells = [np.array(_symmetric_cells(cells)) for cells in self.tuples]
+
+    @classmethod
+    def from_preset(cls, preset: str = "small") -> "NTupleNetwork":
+        """Creates a zero-initialized network with the tuples of TUPLE_PRESETS."""
+        return cls(TUPLE_PRESETS[preset])
+
+    def indices(self, board: int) -> list[int]:
+        """Returns the index into weights of every feature of a packed board."""
+        exponents = [(board >> shift) & 0xF for shift in range(0, 64, 4)]
+        indices = []
+        for offset, cells in self.features:
+            index = 0
+            for cell in reversed(cells):
+                index = (index << 4) | exponents[cell]
+            indices.append(offset + index)
+        return indices
+
+    def evaluate_board(self, board: int) -> float:
+        """
+        Scores one packed board.
+
+        Args:
+            board (int): The packed board.
+
+        Returns:
+            float: The estimated value of the board.
+        """
+        return float(self.weights[self.indices(board)].sum(dtype=np.float64))
+
+    def evaluate_boards(self, boards: np.ndarray) -> np.ndarray:
+        """
+        Scores many packed boards at once.
+
+        Args:
+            boards (np.ndarray): N packed boards as uint64.
+
+        Returns:
+            np.ndarray: The N estimated values.
+        """
+        boards = np.asarray(boards, dtype="<u8")
+        packed = boards.view(np.uint8).reshape(-1, 8)
+        exponents = np.empty((len(boards), 16), dtype=np.int64)
+        exponents[:, 0::2] = packed & 0xF
+        exponents[:, 1::2] = packed >> 4
+        values = np.zeros(len(boards), dtype=np.float64)
+        for offset, cells in zip(self.offsets, self._table_cells):
+            digits = np.left_shift(1, 4 * np.arange(cells.shape[1]))
+            values += self.weights[offset + exponents[:, cells] @ digits].sum(axis=1, dtype=np.float64)
+        return values
+
+    def update(self, board: int, delta: float) -> None:
+        """
+        Moves the value of a board by delta, spread evenly over its features.
+
+        Args:
+            board (int): The packed board.
+            delta (float): The change of the board's value.
+        """
+        # np.add.at applies repeated indices once each, like sequential updates would
+        np.add.at(self.weights, self.indices(board), np.float32(delta / len(self.features)))
+        self.path = None  # The file no longer matches
+
+    def save(self, path: str) -> None:
+        """Saves the tuples and weights to a .npz file."""
+        np.savez(path, cells=np.concatenate(self.tuples), lengths=[len(cells) for cells in self.tuples],
+                 weights=self.weights)
+        self.path = os.path.abspath(path if path.endswith(".npz") else f"{path}.npz")  # np.savez adds the suffix
+
+    @classmethod
+    def load(cls, path: str) -> "NTupleNetwork":
+        """Loads a network saved with save."""
+        with np.load(path) as data:
+            tuples = np.split(data["cells"], np.cumsum(data["lengths"])[:-1])
+            network = cls([cells.tolist() for cells in tuples], data["weights"].astype(np.float32))
+        network.path = os.path.abspath(path)
+        return network
+
+    def __reduce__(self):
+        # Worker processes of AI.start_pool reload a saved network from its file instead of
+        # receiving the weight tables through the pickle; unsaved networks are pickled whole
+        if self.path is not None:
+            return (NTupleNetwork.load, (self.path,))
+        return (NTupleNetwork, (self.tuples, self.weights))
+
+
+def best_afterstate(network: NTupleNetwork, board: int) -> Optional[tuple[str, int, int]]:
+    """
+    Picks the move with the highest reward plus afterstate value.
+
+    Args:
+        network (NTupleNetwork): The value function.
+        board (int): The packed board.
+
+    Returns:
+        Optional[tuple[str, int, int]]: The move, its reward and the afterstate, or None if no move is legal.
+    """
+    best = None
+    best_value = -np.inf
+    for direction in DIRECTIONS:
+        afterstate = bitboard.execute_move(board, direction)
+        if afterstate == board:
+            continue
+        reward = move_reward(board, direction)
+        value = reward + network.evaluate_board(afterstate)
+        if value > best_value:
+            best_value = value
+            best = (direction, reward, afterstate)
+    return best
+
+
+def train_episode(network: NTupleNetwork, learning_rate: float, seed: Optional[int] = None) -> tuple[int, int, int]:
+    """
+    Plays one game on Game with the greedy policy and learns afterstate values by TD(0).
+
+    After every move, the value of the previous afterstate is moved towards the reward
+    of the next move plus the value of the next afterstate, and towards 0 once the game
+    is over.
+
+    Args:
+        network (NTupleNetwork): The network, updated in place.
+        learning_rate (float): Step size of the TD updates.
+        seed (Optional[int]): Seed of the game's tile spawns.
+
+    Returns:
+        tuple[int, int, int]: The summed merge rewards, the max tile and the number of moves.
+    """
+    game = Game(use_bitboard=True, auto_reset=False)
+    game.resetgame(seed)
+    total_reward = 0
+    previous_afterstate = None
+    while True:
+        board = bitboard.encode(game.grid)
+        choice = best_afterstate(network, board)
+        if choice is None:
+            if previous_afterstate is not None:
+                network.update(previous_afterstate, learning_rate * -network.evaluate_board(previous_afterstate))
+            break
+        direction, reward, afterstate = choice
+        if previous_afterstate is not None:
+            error = reward + network.evaluate_board(afterstate) - network.evaluate_board(previous_afterstate)
+            network.update(previous_afterstate, learning_rate * error)
+        game.move(direction)
+        total_reward += reward
+        previous_afterstate = afterstate
+    return total_reward, int(game.grid.max()), game.moves
+
+
+# Network of a trainer worker process, backed by the shared weights, set up once by _init_trainer
+_trainer_network: Optional[NTupleNetwork] = None
+_trainer_memory: Optional[shared_memory.SharedMemory] = None
+
+
+def _init_trainer(memory_name: str, tuples: list[list[int]]) -> None:
+    """Attaches a trainer worker process to the shared weights."""
+    global _trainer_network, _trainer_memory
+    _trainer_memory = shared_memory.SharedMemory(name=memory_name)
+    size = sum(16 ** len(cells) for cells in tuples)
+    _trainer_network = NTupleNetwork(tuples, np.ndarray((size,), dtype=np.float32, buffer=_trainer_memory.buf))
+
+
+def _train_task(args: tuple[int, float]) -> tuple[int, int, int]:
+    """Trains on one seeded episode, updating the shared weights without locking."""
+    seed, learning_rate = args
+    return train_episode(_trainer_network, learning_rate, seed)
+
+
+def train(output: str, episodes: int, preset: str = "small", learning_rate: float = 0.1, seed: int = 0,
+          workers: Optional[int] = None, report_every: int = 1000, resume: bool = False) -> NTupleNetwork:
+    """
+    Trains a network by self-play across worker processes and saves it after every report.
+
+    Workers update the same weights in shared memory without locks. Concurrent updates
+    of one weight can occasionally be lost, which TD learning tolerates.
+
+    Args:
+        output (str): Path of the .npz file the weights are saved to.
+        episodes (int): Number of games to train on.
+        preset (str): Tuple preset of a new network, see TUPLE_PRESETS.
+        learning_rate (float): Step size of the TD updates.
+        seed (int): Seed of the first episode, episode i uses seed + i.
+        workers (Optional[int]): Number of worker processes, defaults to the number of CPUs.
+        report_every (int): Episodes between progress reports and checkpoints.
+        resume (bool): Continue from the weights saved at output instead of starting from zero.
+
+    Returns:
+        NTupleNetwork: The trained network.
+    """
+    initial = NTupleNetwork.load(output) if resume and os.path.exists(output) else NTupleNetwork.from_preset(preset)
+    memory = shared_memory.SharedMemory(create=True, size=initial.weights.nbytes)
+    try:
+        network = NTupleNetwork(initial.tuples, np.ndarray(initial.weights.shape, dtype=np.float32, buffer=memory.buf))
+        network.weights[:] = initial.weights
+        del initial
+
+        workers = workers or os.cpu_count() or 1
+        start = time.perf_counter()
+        with Pool(workers, initializer=_init_trainer, initargs=(memory.name, network.tuples)) as pool:
+            for first in range(0, episodes, report_every):
+                tasks = [(seed + i, learning_rate) for i in range(first, min(first + report_every, episodes))]
+                results = pool.map(_train_task, tasks, chunksize=max(1, len(tasks) // (4 * workers)))
+                scores, max_tiles, moves = zip(*results)
+                print(f"episodes {first + len(tasks):>8}  mean score {np.mean(scores):>9.1f}  "
+                      f"2048 rate {np.mean(np.array(max_tiles) >= 2048):.3f}  "
+                      f"moves/s {sum(moves) / (time.perf_counter() - start):.0f}", flush=True)
+                start = time.perf_counter()
+                network.save(output)
+        trained = NTupleNetwork(network.tuples, network.weights.copy())
+        del network
+    finally:
+        memory.close()
+        memory.unlink()
+    return trained
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Train an n-tuple network for 2048 by TD learning.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train_parser = commands.add_parser("train", help="learn weights by self-play")
+    train_parser.add_argument("--output", default="ntuple.npz", help="weights file, saved after every report")
+    train_parser.add_argument("--episodes", type=int, default=20000, help="number of training games")
+    train_parser.add_argument("--preset", choices=sorted(TUPLE_PRESETS), default="small", help="tuples of a new network")
+    train_parser.add_argument("--learning-rate", type=float, default=0.1, help="TD step size")
+    train_parser.add_argument("--seed", type=int, default=0, help="seed of the first episode")
+    train_parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    train_parser.add_argument("--report-every", type=int, default=1000, help="episodes between reports and checkpoints")
+    train_parser.add_argument("--resume", action="store_true", help="continue from the weights in --output")
+    args = parser.parse_args()
+
+    train(args.output, args.episodes, args.preset, args.learning_rate, args.seed, args.workers,
+          args.report_every, args.resume)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import json
+from typing import Optional
+
+
+class SearchStats:
+    """
+    Counters and timings collected by AI for a single move decision.
+
+    Filled in by the search while AI instrumentation is enabled, see AI(instrument=True).
+    """
+
+    def __init__(self, method: str, depth: int, move_number: int = 0) -> None:
+        """
+        Initializes empty counters for one move.
+
+        Args:
+            method (str): Name of the find_best_move variant that made the decision.
+            depth (int): Requested search depth, or the maximum depth of a timed search.
+            move_number (int): Number of moves played in the game before this decision.
+        """
+        self.method = method
+        self.depth = depth
+        self.move_number = move_number
+        self.depth_reached = 0
+        self.max_nodes = 0
+        self.chance_nodes = 0
+        self.leaf_evaluations = 0
+        self.cutoffs = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.elapsed = 0.0
+        self.depth_times: dict[int, float] = {}  # Seconds spent on each finished search depth
+        self.best_move: Optional[str] = None
+
+    @property
+    def nodes(self) -> int:
+        """All visited nodes: player nodes, chance nodes and evaluated leaves."""
+        return self.max_nodes + self.chance_nodes + self.leaf_evaluations
+
+    @property
+    def nodes_per_second(self) -> float:
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def effective_branching_factor(self) -> float:
+        """The branching factor b of a uniform tree with the same node count, N = b ** depth."""
+        if self.depth_reached <= 0 or self.nodes <= 1:
+            return 0.0
+        return self.nodes ** (1 / self.depth_reached)
+
+    @property
+    def cache_hit_rate(self) -> float:
+        lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits / lookups if lookups else 0.0
+
+    def add_counts(self, counts: tuple[int, int, int, int]) -> None:
+        """Adds (max nodes, chance nodes, leaf evaluations, cutoffs) counted elsewhere, e.g. in a worker process."""
+        self.max_nodes += counts[0]
+        self.chance_nodes += counts[1]
+        self.leaf_evaluations += counts[2]
+        self.cutoffs += counts[3]
+
+    def counts(self) -> tuple[int, int, int, int]:
+        """Returns (max nodes, chance nodes, leaf evaluations, cutoffs)."""
+        return self.max_nodes, self.chance_nodes, self.leaf_evaluations, self.cutoffs
+
+    def to_dict(self) -> dict:
+        """Returns the counters and the derived rates as a JSON-serializable dict."""
+        return {
+            "method": self.method,
+            "move_number": self.move_number,
+            "best_move": self.best_move,
+            "depth": self.depth,
+            "depth_reached": self.depth_reached,
+            "max_nodes": self.max_nodes,
+            "chance_nodes": self.chance_nodes,
+            "leaf_evaluations": self.leaf_evaluations,
+            "nodes": self.nodes,
+            "cutoffs": self.cutoffs,
+            "effective_branching_factor": self.effective_branching_factor,
+            "elapsed": self.elapsed,
+            "nodes_per_second": self.nodes_per_second,
+            "depth_times": {str(depth): seconds for depth, seconds in self.depth_times.items()},
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cache_hit_rate": self.cache_hit_rate,
+        }
+
+    def write_trace(self, path: str) -> None:
+        """Appends the stats as one JSON line to a trace file."""
+        with open(path, "a") as f:
+            f.write(json.dumps(self.to_dict()) + "\n")
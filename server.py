@@ -0,0 +1,479 @@
+"""
+Headless asyncio game server: many 2048 sessions in one process with batched AI moves.
+
+Clients connect over TCP or a Unix socket and send one JSON object per line; every
+request gets one JSON line back with the same "id". Best-move requests of all
+sessions are collected into batches and searched together by a shared process pool
+with batchsearch.BatchExpectimax, so the leaves of many sessions are scored with one
+evaluator call. Positions found in the move book are answered without searching.
+
+Requests ("depth" and "deadline_ms" are optional):
+    {"id": 1, "op": "new", "seed": 7}                          -> session, seed, grid, score
+    {"id": 2, "op": "best_move", "session": 1, "depth": 2}     -> move (null when the game is over)
+    {"id": 3, "op": "move", "session": 1, "direction": "left"} -> grid, score, moves, game_over
+    {"id": 4, "op": "play", "session": 1, "deadline_ms": 500}  -> best_move followed by move
+    {"id": 5, "op": "close", "session": 1}
+    {"id": 6, "op": "stats"}
+Failures are answered with {"id": ..., "ok": false, "error": "..."}. The errors
+"overloaded" and "deadline exceeded" are transient and the request can be retried.
+Depths above the server's max_depth are searched at max_depth.
+
+Backpressure: a connection stops being read while max_inflight of its requests are
+unanswered, and best-move requests are rejected as "overloaded" while max_pending
+requests wait for a batch. Every best-move request has a deadline; requests that
+expire while queued are dropped before they reach the pool.
+
+Example:
+    python server.py --port 8048 --workers 4
+    python server.py --unix /tmp/2048.sock --depth 3 --batch-window-ms 5
+    python loadgen.py --port 8048 --sessions 1000 --moves 50
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+import numpy as np
+
+import batchsearch
+import bitboard
+from constants import MOVE_BOOK_PATH
+from game import Game
+
+DIRECTIONS = ["left", "up", "right", "down"]
+
+
+class RequestError(Exception):
+    """A request that cannot be served, answered with its message as the error."""
+
+
+class Session:
+    """
+    One game hosted by the server.
+
+    np.random drives Game.add_tile and is shared by all sessions, so every session keeps
+    its own random state and swaps it in around its moves. A session started from a seed
+    therefore spawns exactly the tiles of a local Game reset with the same seed.
+    """
+
+    def __init__(self, session_id: int, seed: int) -> None:
+        self.id = session_id
+        self.game = Game(use_bitboard=True, auto_reset=False)
+        self.game.resetgame(seed)
+        self.random_state = np.random.get_state()
+        self.lock = asyncio.Lock()  # Serializes play and move requests of the session
+
+    def move(self, direction: str) -> None:
+        """Applies a move with the session's own random state."""
+        np.random.set_state(self.random_state)
+        self.game.move(direction)
+        self.random_state = np.random.get_state()
+
+    def state(self) -> dict:
+        """The fields describing the game in responses."""
+        return {
+            "session": self.id,
+            "seed": self.game.seed,
+            "grid": self.game.grid.tolist(),
+            "score": int(self.game.score),
+            "moves": self.game.moves,
+            "game_over": self.game.game_over(),
+        }
+
+
+class MoveRequest:
+    """A best-move request waiting in the queue of the batcher."""
+
+    def __init__(self, board: int, depth: int, deadline: float, future: asyncio.Future) -> None:
+        self.board = board
+        self.depth = depth
+        self.deadline = deadline  # Event loop time after which the answer is no longer wanted
+        self.future = future
+
+
+class GameServer:
+    """
+    Hosts sessions and answers their best-move requests in batches on a shared process pool.
+
+    The batcher task takes the first waiting request, waits batch_window_ms for more to
+    arrive, and sends up to max_batch requests of the same depth to the pool as one task.
+    At most one batch per worker is in flight, so further requests queue up and form
+    larger batches while the pool is busy.
+    """
+
+    def __init__(self, workers: Optional[int] = None, depth: int = 2, deadline_ms: float = 1000,
+                 max_batch: int = 256, batch_window_ms: float = 2.0, max_pending: int = 4096,
+                 max_inflight: int = 64, ntuple_path: Optional[str] = None, prob_threshold: float = 1e-4,
+                 max_depth: int = 4, book_path: Optional[str] = None) -> None:
+        """
+        Args:
+            workers (Optional[int]): Search worker processes, defaults to the number of CPUs.
+            depth (int): Search depth of requests that do not set one.
+            deadline_ms (float): Deadline of best-move requests that do not set one.
+            max_batch (int): Maximum number of requests searched as one pool task.
+            batch_window_ms (float): Time the batcher waits for more requests after the first one.
+            max_pending (int): Queued best-move requests before new ones are rejected as overloaded.
+            max_inflight (int): Unanswered requests per connection before it stops being read.
+            ntuple_path (Optional[str]): N-tuple network weights, the exact RowTableEvaluator if None.
+            prob_threshold (float): Probability cutoff of the expectimax search.
+            max_depth (int): Largest search depth, deeper requests are clamped to it so one
+                request cannot hold a worker for minutes.
+            book_path (Optional[str]): Move book the workers consult before searching, none if None.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.depth = depth
+        self.deadline_ms = deadline_ms
+        self.max_batch = max_batch
+        self.batch_window = batch_window_ms / 1000
+        self.max_pending = max_pending
+        self.max_inflight = max_inflight
+        self.ntuple_path = ntuple_path
+        self.prob_threshold = prob_threshold
+        self.max_depth = max_depth
+        self.book_path = book_path
+        self.sessions: dict[int, Session] = {}
+        self.next_session_id = 1
+        self.seed_rng = np.random.default_rng()  # Seeds of sessions started without one
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.batch_slots: Optional[asyncio.Semaphore] = None
+        self.batcher: Optional[asyncio.Task] = None
+        self.batch_tasks: set[asyncio.Task] = set()  # Searches in flight, referenced until they finish
+        self.connections = 0
+        self.counters = {
+            "requests": 0,
+            "best_moves": 0,
+            "batches": 0,
+            "batched_requests": 0,
+            "max_batch_size": 0,
+            "leaf_evaluations": 0,
+            "book_hits": 0,
+            "overloaded": 0,
+            "deadline_exceeded": 0,
+            "errors": 0,
+            "pool_restarts": 0,
+        }
+
+    def _start_pool(self) -> None:
+        """Starts a new search worker pool."""
+        self.pool = ProcessPoolExecutor(self.workers, initializer=batchsearch.init_worker,
+                                        initargs=(self.ntuple_path, self.prob_threshold, self.book_path))
+
+    async def start(self) -> None:
+        """Starts the worker pool and the batcher task."""
+        self._start_pool()
+        self.queue = asyncio.Queue(self.max_pending)
+        self.batch_slots = asyncio.Semaphore(self.workers)
+        self.batcher = asyncio.create_task(self._run_batcher())
+
+    async def stop(self) -> None:
+        """Stops the batcher and shuts down the worker pool."""
+        if self.batcher is not None:
+            self.batcher.cancel()
+            try:
+                await self.batcher
+            except asyncio.CancelledError:
+                pass
+            self.batcher = None
+        for task in list(self.batch_tasks):
+            task.cancel()
+        await asyncio.gather(*self.batch_tasks, return_exceptions=True)
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serves one client connection until it closes, then closes the sessions it created.
+
+        Requests are handled concurrently and answered as soon as they finish, so the
+        responses of pipelined requests can arrive out of order.
+        """
+        self.connections += 1
+        inflight = asyncio.Semaphore(self.max_inflight)
+        write_lock = asyncio.Lock()
+        owned: set[int] = set()
+        tasks: set[asyncio.Task] = set()
+
+        async def respond(line: bytes) -> None:
+            try:
+                response = await self.handle_line(line, owned)
+                async with write_lock:
+                    writer.write(json.dumps(response).encode() + b"\n")
+                    await writer.drain()  # Waits while the client does not read its responses
+            except ConnectionError:
+                pass
+            finally:
+                inflight.release()
+
+        try:
+            while True:
+                await inflight.acquire()  # Stop reading while too many requests are unanswered
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    line = b""
+                if not line:
+                    inflight.release()
+                    break
+                task = asyncio.create_task(respond(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            for session_id in owned:
+                self.sessions.pop(session_id, None)
+            self.connections -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def handle_line(self, line: bytes, owned: set[int]) -> dict:
+        """
+        Parses and serves one request line.
+
+        Args:
+            line (bytes): The JSON request.
+            owned (set[int]): Sessions created on the connection, closed when it closes.
+
+        Returns:
+            dict: The response, with the id of the request.
+        """
+        self.counters["requests"] += 1
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise RequestError("request must be a JSON object")
+            request_id = request.get("id")
+            response = await self.dispatch(request, owned)
+            return {"id": request_id, "ok": True, **response}
+        except json.JSONDecodeError:
+            error = "invalid JSON"
+        except RequestError as exc:
+            error = str(exc)
+        except Exception as exc:  # A bug must not leave the client waiting for its answer
+            error = f"internal error: {exc!r}"
+        self.counters["errors"] += 1
+        return {"id": request_id, "ok": False, "error": error}
+
+    async def dispatch(self, request: dict, owned: set[int]) -> dict:
+        """
+        Serves one parsed request.
+
+        Args:
+            request (dict): The request, see the module docstring.
+            owned (set[int]): Sessions created on the connection.
+
+        Returns:
+            dict: The fields of the response.
+
+        Raises:
+            RequestError: If the request is invalid or cannot be served.
+        """
+        op = request.get("op")
+        if op == "stats":
+            return self.stats()
+        if op == "new":
+            seed = request.get("seed")
+            if seed is None:
+                seed = int(self.seed_rng.integers(2**32 - 1))
+            elif not isinstance(seed, int) or not 0 <= seed < 2**32 - 1:
+                raise RequestError("seed must be an integer between 0 and 2**32 - 2")
+            session = Session(self.next_session_id, seed)
+            self.next_session_id += 1
+            self.sessions[session.id] = session
+            owned.add(session.id)
+            return session.state()
+
+        if op not in ("close", "move", "best_move", "play"):
+            raise RequestError(f"unknown op: {op!r}")
+        session_id = request.get("session")
+        session = self.sessions.get(session_id) if isinstance(session_id, int) else None
+        if session is None:
+            raise RequestError("unknown session")
+        if op == "close":
+            del self.sessions[session.id]
+            owned.discard(session.id)
+            return {"session": session.id}
+        if op == "move":
+            direction = request.get("direction")
+            if direction not in DIRECTIONS:
+                raise RequestError(f"direction must be one of {DIRECTIONS}")
+            async with session.lock:  # Waits for a play request of the session that is in flight
+                session.move(direction)
+                return session.state()
+        if op in ("best_move", "play"):
+            depth = request.get("depth", self.depth)
+            deadline_ms = request.get("deadline_ms", self.deadline_ms)
+            if not isinstance(depth, int) or depth < 1:
+                raise RequestError("depth must be a positive integer")
+            depth = min(depth, self.max_depth)
+            if not isinstance(deadline_ms, (int, float)) or deadline_ms <= 0:
+                raise RequestError("deadline_ms must be a positive number")
+            if op == "best_move":
+                return {"session": session.id, "move": await self.best_move(session, depth, deadline_ms)}
+            async with session.lock:
+                move = await self.best_move(session, depth, deadline_ms)
+                if move is not None:
+                    session.move(move)
+                return {"move": move, **session.state()}
+
+    async def best_move(self, session: Session, depth: int, deadline_ms: float) -> Optional[str]:
+        """
+        Queues a best-move request for the batcher and waits for its answer.
+
+        Args:
+            session (Session): The session whose current position is searched.
+            depth (int): The search depth.
+            deadline_ms (float): Time after which the request fails with "deadline exceeded".
+
+        Returns:
+            Optional[str]: The best move, or None if no move is possible.
+
+        Raises:
+            RequestError: If the queue is full or the deadline passes.
+        """
+        if session.game.game_over():
+            return None
+        self.counters["best_moves"] += 1
+        loop = asyncio.get_running_loop()
+        timeout = deadline_ms / 1000
+        request = MoveRequest(bitboard.from_exponents(session.game.exponents), depth, loop.time() + timeout,
+                              loop.create_future())
+        try:
+            self.queue.put_nowait(request)
+        except asyncio.QueueFull:
+            self.counters["overloaded"] += 1
+            raise RequestError("overloaded")
+        try:
+            return await asyncio.wait_for(request.future, timeout)
+        except asyncio.TimeoutError:
+            self.counters["deadline_exceeded"] += 1
+            raise RequestError("deadline exceeded")
+
+    async def _run_batcher(self) -> None:
+        """Collects queued requests into batches and hands them to the pool."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            if self.queue.qsize() < self.max_batch - 1:
+                await asyncio.sleep(self.batch_window)  # Let requests of other sessions arrive
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            # Requests whose waiter gave up, e.g. after their deadline, are not searched
+            now = loop.time()
+            live = [request for request in batch if not request.future.done() and request.deadline > now]
+            for depth in sorted({request.depth for request in live}):
+                await self.batch_slots.acquire()  # One batch per worker, the rest keeps queueing
+                group = [request for request in live if request.depth == depth]
+                task = asyncio.create_task(self._search_batch(group, depth))
+                self.batch_tasks.add(task)
+                task.add_done_callback(self.batch_tasks.discard)
+
+    async def _search_batch(self, batch: list[MoveRequest], depth: int) -> None:
+        """Searches one batch in the pool and resolves the futures of its requests."""
+        loop = asyncio.get_running_loop()
+        pool = self.pool
+        try:
+            boards = np.array([request.board for request in batch], dtype=np.uint64)
+            moves, leaves, book_hits = await loop.run_in_executor(pool, batchsearch.best_moves_task, boards, depth)
+            self.counters["batches"] += 1
+            self.counters["batched_requests"] += len(batch)
+            self.counters["max_batch_size"] = max(self.counters["max_batch_size"], len(batch))
+            self.counters["leaf_evaluations"] += leaves
+            self.counters["book_hits"] += book_hits
+            for request, move in zip(batch, moves):
+                if not request.future.done():
+                    request.future.set_result(move)
+        except Exception as exc:
+            if isinstance(exc, BrokenProcessPool) and self.pool is pool:
+                # A worker died, e.g. killed for memory, and the pool refuses all further tasks
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._start_pool()
+                self.counters["pool_restarts"] += 1
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(RequestError(f"search failed: {exc}"))
+        finally:
+            self.batch_slots.release()
+
+    def stats(self) -> dict:
+        """Counters of the server since it started."""
+        batches = self.counters["batches"]
+        return {
+            "sessions": len(self.sessions),
+            "connections": self.connections,
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "workers": self.workers,
+            "average_batch_size": self.counters["batched_requests"] / batches if batches else 0.0,
+            **self.counters,
+        }
+
+
+async def serve(server: GameServer, host: str = "127.0.0.1", port: int = 8048, unix_path: Optional[str] = None) -> None:
+    """
+    Runs a GameServer until the task is cancelled or the process gets SIGINT or SIGTERM.
+
+    Args:
+        server (GameServer): The server to run.
+        host (str): Address to listen on, ignored when unix_path is set.
+        port (int): TCP port to listen on, ignored when unix_path is set.
+        unix_path (Optional[str]): Listen on this Unix socket instead of TCP.
+    """
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):  # Not available on Windows
+            loop.add_signal_handler(signum, task.cancel)
+    await server.start()
+    try:
+        if unix_path:
+            listener = await asyncio.start_unix_server(server.handle_connection, unix_path)
+            print(f"Serving on {unix_path}", flush=True)
+        else:
+            listener = await asyncio.start_server(server.handle_connection, host, port)
+            print(f"Serving on {host}:{port}", flush=True)
+        async with listener:
+            await listener.serve_forever()
+    except asyncio.CancelledError:
+        print("Shutting down", flush=True)
+    finally:
+        await server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve many headless 2048 sessions with batched AI moves.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8048, help="TCP port to listen on")
+    parser.add_argument("--unix", default=None, help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=None, help="search worker processes (default: CPU count)")
+    parser.add_argument("--depth", type=int, default=2, help="search depth of requests that do not set one")
+    parser.add_argument("--max-depth", type=int, default=4, help="largest search depth, deeper requests are clamped")
+    parser.add_argument("--deadline-ms", type=float, default=1000, help="deadline of requests that do not set one")
+    parser.add_argument("--max-batch", type=int, default=256, help="maximum requests searched as one pool task")
+    parser.add_argument("--batch-window-ms", type=float, default=2.0, help="time to wait for more requests per batch")
+    parser.add_argument("--max-pending", type=int, default=4096, help="queued requests before rejecting new ones")
+    parser.add_argument("--max-inflight", type=int, default=64, help="unanswered requests per connection")
+    parser.add_argument("--ntuple", default=None, help="n-tuple network weights used instead of the heuristic")
+    parser.add_argument("--book", default=MOVE_BOOK_PATH if os.path.exists(MOVE_BOOK_PATH) else None,
+                        help=f"move book consulted before searching (default: {MOVE_BOOK_PATH} if it exists)")
+    args = parser.parse_args()
+
+    server = GameServer(args.workers, args.depth, args.deadline_ms, args.max_batch, args.batch_window_ms,
+                        args.max_pending, args.max_inflight, args.ntuple, max_depth=args.max_depth,
+                        book_path=args.book)
+    asyncio.run(serve(server, args.host, args.port, args.unix))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Headless batch simulator that plays many complete AI games across all CPU cores.
+
+Example:
+    python simulate.py --games 1000 --depth 3 --output results.json
+    python simulate.py --games 100 --depth 2 --size 5
+    python simulate.py --games 100 --policy depthpolicy.json --node-budget 5000
+    python simulate.py --games 100 --depth 2 --weights heuristic_weights.json
+    python simulate.py --games 20 --rollouts 100 --rollout-policy greedy
+"""
+import argparse
+import glob
+import json
+import os
+import time
+from collections import Counter
+from multiprocessing import Pool
+from typing import Optional
+
+import numpy as np
+
+from constants import GRID_SIZE
+from depthpolicy import DepthPolicy
+from game import Game, AI
+from gamerecord import GameRecorder, append_records
+from heuristic import RowTableEvaluator
+from montecarlo import ROLLOUT_POLICIES, MonteCarloPlayer
+from movebook import MoveBook
+from ntuple import NTupleNetwork
+
+
+def play_game(seed: int, depth: int = 3, search: str = "minimax", time_budget_ms: Optional[float] = None,
+              max_moves: Optional[int] = None, book_path: Optional[str] = None,
+              ntuple_path: Optional[str] = None, record_path: Optional[str] = None, size: int = GRID_SIZE,
+              policy_path: Optional[str] = None, node_budget: Optional[float] = None,
+              weights_path: Optional[str] = None, rollouts: Optional[int] = None,
+              rollout_policy: str = "random") -> dict:
+    """
+    Plays one complete game with the AI, without any UI.
+
+    Args:
+        seed (int): Seed for np.random, which drives the tile spawns of Game.add_tile.
+        depth (int): Fixed search depth, ignored when time_budget_ms is set.
+        search (str): Search algorithm of the AI, 'minimax' or 'expectimax'.
+        time_budget_ms (Optional[float]): Per-move time budget for iterative deepening.
+        max_moves (Optional[int]): Stop the game after this many moves.
+        book_path (Optional[str]): Move book consulted before searching.
+        ntuple_path (Optional[str]): N-tuple network weights used instead of the heuristic.
+        record_path (Optional[str]): Append the game to this record file, see gamerecord.py.
+        size (int): Board size. The packed bitboards, move books, n-tuple networks and
+            record files are only available for 4x4 boards.
+        policy_path (Optional[str]): Calibration file of an adaptive DepthPolicy, which then
+            picks the depth of every move instead of depth.
+        node_budget (Optional[float]): Node budget of the policy, overrides the file's.
+        weights_path (Optional[str]): Tuned heuristic weights from tuning.py, used when there
+            is no ntuple_path.
+        rollouts (Optional[int]): Pick moves with a MonteCarloPlayer playing this many rollouts
+            per legal move instead of searching; time_budget_ms then limits its rollouts.
+        rollout_policy (str): Move policy of the rollouts, 'random' or 'greedy'.
+
+    Returns:
+        dict: Seed, max tile, score, move count, search nodes, elapsed time and mean depth of the game.
+    """
+    if rollouts is not None and size != GRID_SIZE:
+        raise ValueError(f"Monte Carlo rollouts need a {GRID_SIZE}x{GRID_SIZE} board")
+    recorder = GameRecorder(record_path) if record_path else None
+    game = Game(use_bitboard=size == GRID_SIZE, auto_reset=False, recorder=recorder, size=size)
+    game.resetgame(seed)  # Seeds np.random, which drives the tile spawns
+    evaluator = None
+    if ntuple_path:
+        evaluator = NTupleNetwork.load(ntuple_path)
+    elif weights_path:
+        evaluator = RowTableEvaluator.load(weights_path)
+    ai = AI(game, search=search, seed=seed, move_book=MoveBook(book_path) if book_path else None,
+            evaluator=evaluator)
+    if policy_path:
+        options = {"node_budget": node_budget} if node_budget is not None else {}
+        ai.depth_policy = DepthPolicy.load(policy_path, **options)
+    player = MonteCarloPlayer(rollouts, rollout_policy, seed=seed) if rollouts is not None else None
+
+    start = time.perf_counter()
+    while not game.game_over() and (max_moves is None or game.moves < max_moves):
+        if player is not None:
+            best_move = player.find_best_move(game.grid, time_budget_ms)
+        elif time_budget_ms is not None:
+            best_move = ai.find_best_move_timed(game.grid, time_budget_ms)
+        elif ai.depth_policy is not None:
+            best_move = ai.find_best_move_adaptive(game.grid)
+        else:
+            best_move = ai.find_best_move(game.grid, depth)
+        if best_move is None:
+            break
+        game.move(best_move)
+    elapsed = time.perf_counter() - start
+    if recorder is not None:
+        recorder.close()
+
+    return {
+        "seed": seed,
+        "max_tile": int(game.grid.max()),
+        "score": int(game.score),
+        "moves": game.moves,
+        "nodes": ai.nodes_searched,
+        "book_hits": ai.book_hits,
+        "seconds": elapsed,
+        "mean_depth": float(np.mean(ai.search_depths)) if ai.search_depths else 0.0 if player else float(depth),
+    }
+
+
+def _play_game_task(args: tuple) -> dict:
+    """
+    Unpacks the arguments of play_game for Pool.imap_unordered.
+
+    Each worker process records to its own part file next to the record file, run merges them.
+    """
+    seed, options = args
+    record_path = options.pop("record_path")
+    return play_game(seed, **options, record_path=f"{record_path}.{os.getpid()}.part" if record_path else None)
+
+
+def summarize(results: list[dict], wall_seconds: float) -> dict:
+    """
+    Aggregates the results of many games.
+
+    Args:
+        results (list[dict]): Results returned by play_game.
+        wall_seconds (float): Wall-clock time of the whole run.
+
+    Returns:
+        dict: Max-tile distribution, win rates, average moves and throughput.
+    """
+    games = len(results)
+    max_tiles = Counter(result["max_tile"] for result in results)
+    total_moves = sum(result["moves"] for result in results)
+    total_nodes = sum(result["nodes"] for result in results)
+    cpu_seconds = sum(result["seconds"] for result in results)
+    return {
+        "games": games,
+        "max_tile_distribution": {str(tile): max_tiles[tile] for tile in sorted(max_tiles)},
+        "win_rate_2048": sum(result["max_tile"] >= 2048 for result in results) / games,
+        "win_rate_4096": sum(result["max_tile"] >= 4096 for result in results) / games,
+        "average_moves": total_moves / games,
+        "average_score": sum(result["score"] for result in results) / games,
+        "moves_per_second": total_moves / wall_seconds if wall_seconds else 0.0,
+        "nodes_per_second": total_nodes / wall_seconds if wall_seconds else 0.0,
+        "book_hit_rate": sum(result["book_hits"] for result in results) / total_moves if total_moves else 0.0,
+        "moves_per_cpu_second": total_moves / cpu_seconds if cpu_seconds else 0.0,
+        "average_move_ms": 1000 * cpu_seconds / total_moves if total_moves else 0.0,
+        "average_depth": sum(result["mean_depth"] * result["moves"] for result in results) / total_moves
+        if total_moves else 0.0,
+        "wall_seconds": wall_seconds,
+    }
+
+
+def run(games: int, seed: int = 0, workers: Optional[int] = None, depth: int = 3, search: str = "minimax",
+        time_budget_ms: Optional[float] = None, max_moves: Optional[int] = None,
+        book_path: Optional[str] = None, ntuple_path: Optional[str] = None,
+        record_path: Optional[str] = None, size: int = GRID_SIZE, policy_path: Optional[str] = None,
+        node_budget: Optional[float] = None, weights_path: Optional[str] = None, rollouts: Optional[int] = None,
+        rollout_policy: str = "random") -> tuple[dict, list[dict]]:
+    """
+    Plays games with seeds seed, seed + 1, ... spread over a process pool.
+
+    Args:
+        games (int): Number of games to play.
+        seed (int): Seed of the first game.
+        workers (Optional[int]): Number of worker processes, defaults to the number of CPUs.
+        depth (int): Fixed search depth, ignored when time_budget_ms is set.
+        search (str): Search algorithm of the AI, 'minimax' or 'expectimax'.
+        time_budget_ms (Optional[float]): Per-move time budget for iterative deepening.
+        max_moves (Optional[int]): Stop each game after this many moves.
+        book_path (Optional[str]): Move book consulted before searching.
+        ntuple_path (Optional[str]): N-tuple network weights used instead of the heuristic.
+        record_path (Optional[str]): Append all games to this record file.
+        size (int): Board size of the games.
+        policy_path (Optional[str]): Calibration file of an adaptive DepthPolicy.
+        node_budget (Optional[float]): Node budget of the policy, overrides the file's.
+        weights_path (Optional[str]): Tuned heuristic weights used instead of the default ones.
+        rollouts (Optional[int]): Play with a MonteCarloPlayer using this many rollouts per move.
+        rollout_policy (str): Move policy of the rollouts.
+
+    Returns:
+        tuple[dict, list[dict]]: The summary and the per-game results ordered by seed.
+    """
+    workers = workers or os.cpu_count() or 1
+    options = {"depth": depth, "search": search, "time_budget_ms": time_budget_ms, "max_moves": max_moves,
+               "book_path": book_path, "ntuple_path": ntuple_path, "record_path": record_path, "size": size,
+               "policy_path": policy_path, "node_budget": node_budget, "weights_path": weights_path,
+               "rollouts": rollouts, "rollout_policy": rollout_policy}
+    tasks = [(seed + i, dict(options)) for i in range(games)]
+
+    start = time.perf_counter()
+    with Pool(min(workers, games)) as pool:
+        results = list(pool.imap_unordered(_play_game_task, tasks))
+    wall_seconds = time.perf_counter() - start
+
+    if record_path:
+        for part_path in sorted(glob.glob(f"{glob.escape(record_path)}.*.part")):
+            append_records(record_path, part_path)
+            os.remove(part_path)
+
+    results.sort(key=lambda result: result["seed"])
+    return summarize(results, wall_seconds), results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Play many headless 2048 games with the AI.")
+    parser.add_argument("--games", type=int, default=100, help="number of games to play")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game, game i uses seed + i")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--depth", type=int, default=3, help="fixed search depth")
+    parser.add_argument("--search", choices=["minimax", "expectimax"], default="minimax")
+    parser.add_argument("--time-budget-ms", type=float, default=None,
+                        help="use iterative deepening with this per-move budget instead of a fixed depth")
+    parser.add_argument("--max-moves", type=int, default=None, help="stop each game after this many moves")
+    parser.add_argument("--book", default=None, help="move book consulted before searching")
+    parser.add_argument("--ntuple", default=None, help="n-tuple network weights used instead of the heuristic")
+    parser.add_argument("--weights", default=None, help="tuned heuristic weights file written by tuning.py")
+    parser.add_argument("--rollouts", type=int, default=None,
+                        help="pick moves with this many Monte Carlo rollouts per legal move instead of searching")
+    parser.add_argument("--rollout-policy", choices=ROLLOUT_POLICIES, default="random",
+                        help="move policy of --rollouts")
+    parser.add_argument("--record", default=None, help="append every game to this binary record file")
+    parser.add_argument("--size", type=int, default=GRID_SIZE, help="board size, from 3 to 8")
+    parser.add_argument("--policy", default=None,
+                        help="pick the depth of every move with this depthpolicy.py calibration file")
+    parser.add_argument("--node-budget", type=float, default=None, help="node budget of --policy")
+    parser.add_argument("--output", default=None, help="write the summary and per-game results to this JSON file")
+    args = parser.parse_args()
+
+    summary, results = run(args.games, args.seed, args.workers, args.depth, args.search,
+                           args.time_budget_ms, args.max_moves, args.book, args.ntuple, args.record, args.size, args.policy, args.node_budget,
+                           args.weights, args.rollouts, args.rollout_policy)
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "summary": summary, "games": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Game records: replay of recorded games and games that outgrow the packed boards."""
+import numpy as np
+import pytest
+
+from game import AI, Game
+from gamerecord import GameRecorder, GameRecordReader, replay_game
+
+
+def play_recorded(path, seeds, max_moves: int = 80) -> list[Game]:
+    """Plays short seeded games with the depth-1 AI into a record file."""
+    games = []
+    with GameRecorder(str(path)) as recorder:
+        for seed in seeds:
+            game = Game(use_bitboard=True, auto_reset=False, recorder=recorder)
+            game.resetgame(seed)
+            ai = AI(game)
+            while not game.game_over() and game.moves < max_moves:
+                game.move(ai.find_best_move(game.grid, 1))
+            games.append(game)
+    return games
+
+
+@pytest.mark.parametrize("use_seed", [True, False])
+def test_replay_reproduces_recorded_games(tmp_path, use_seed):
+    path = tmp_path / "games.rec"
+    games = play_recorded(path, [3, 4])
+    reader = GameRecordReader(str(path))
+    assert reader.game_count == 2
+    assert [len(moves) for moves in reader.moves()] == [game.moves for game in games]
+    for index, game in enumerate(games):
+        replay = replay_game(reader, index, use_seed=use_seed)
+        np.testing.assert_array_equal(replay.grid, game.grid)
+        assert (replay.score, replay.moves) == (game.score, game.moves)
+
+
+def test_recording_stops_past_32768(tmp_path):
+    path = tmp_path / "big.rec"
+    with GameRecorder(str(path)) as recorder:
+        game = Game(use_bitboard=True, auto_reset=False, recorder=recorder)
+        game.resetgame(1)
+        grid = np.zeros((4, 4), dtype=np.int64)
+        grid[0, :2] = 32768
+        grid[3, 3] = 2
+        game.grid = grid
+        game.move("left")  # Merges the 65536 tile
+        for direction in ["up", "right", "down", "left"] * 5:
+            game.move(direction)
+    assert game.grid.max() == 65536
+    assert game.moves > 1
+
+    reader = GameRecordReader(str(path))
+    assert reader.game_count == 1
+    assert [len(moves) for moves in reader.moves()] == [1]  # Only the merge, its board still fits
+    replay = replay_game(reader, 0)
+    assert replay.grid.max() == 65536
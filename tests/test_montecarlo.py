@@ -0,0 +1,28 @@
+"""Monte Carlo player: decisions stay within their time budget."""
+import time
+
+import numpy as np
+import pytest
+
+from game import Game
+from montecarlo import MonteCarloPlayer
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_decisions_stay_within_the_time_budget(workers):
+    budget_ms = 40
+    game = Game(auto_reset=False)
+    game.resetgame(3)
+    player = MonteCarloPlayer(rollouts=5000, workers=workers, seed=0)  # Far more than fit the budget
+    try:
+        times = []
+        for _ in range(12):
+            start = time.perf_counter()
+            values = player.move_values(game.grid, budget_ms)
+            times.append(1000 * (time.perf_counter() - start))
+            assert values
+    finally:
+        player.close_pool()
+    # The first decisions of a pool adjust its dispatch margin, single decisions may hit scheduling noise
+    assert np.median(times[2:]) <= budget_ms
+    assert np.mean(times[2:]) <= budget_ms * 1.1
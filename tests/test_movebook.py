@@ -0,0 +1,66 @@
+"""Move book: lookups through the symmetries, and the searches that consult it."""
+import numpy as np
+import pytest
+
+import batchsearch
+import bitboard
+from batchsearch import BatchExpectimax
+from game import AI, Game
+from heuristic import RowTableEvaluator
+from movebook import MoveBook, add_move, write_book
+
+DIRECTIONS = ["left", "up", "right", "down"]
+
+
+def legal_moves(board: int) -> list[str]:
+    return [direction for direction in DIRECTIONS if bitboard.execute_move(board, direction) != board]
+
+
+def test_book_round_trip_through_symmetries(tmp_path):
+    rng = np.random.default_rng(0)
+    entries = {}
+    expected = {}
+    while len(expected) < 10 * bitboard.SYMMETRY_COUNT:
+        board = bitboard.encode(np.where(rng.random((4, 4)) < 0.5, 2 ** rng.integers(1, 8, (4, 4)), 0))
+        transforms = [bitboard.apply_symmetry(board, symmetry) for symmetry in range(bitboard.SYMMETRY_COUNT)]
+        moves = legal_moves(board)
+        if not moves or len(set(transforms)) < bitboard.SYMMETRY_COUNT:
+            continue  # Symmetric boards would store two moves in one slot
+        move = moves[int(rng.integers(len(moves)))]
+        for symmetry, transformed in enumerate(transforms):
+            expected[transformed] = bitboard.symmetry_direction(move, symmetry)
+            add_move(entries, transformed, expected[transformed])
+    path = str(tmp_path / "book.bin")
+    write_book(path, entries, depth=3, search="minimax")
+
+    book = MoveBook(path)
+    assert (book.depth, book.search, len(book)) == (3, "minimax", len(entries))
+    assert book.entries() == entries
+    for board, move in expected.items():
+        assert book.lookup(board) == move
+    assert book.lookup(bitboard.encode(np.full((4, 4), 2))) is None
+
+
+def test_searches_answer_from_the_book(tmp_path):
+    grid = np.array([[0, 0, 2, 0], [0, 4, 0, 0], [2, 8, 16, 0], [4, 32, 64, 128]])
+    board = bitboard.encode(grid)
+    evaluator = RowTableEvaluator()
+    searched = AI(Game(), search="expectimax", evaluator=evaluator).find_best_move(grid, 2)
+    book_move = next(move for move in legal_moves(board) if move != searched)  # Tells the book apart from a search
+    entries = {}
+    add_move(entries, board, book_move)
+    path = str(tmp_path / "book.bin")
+    write_book(path, entries, depth=2, search="expectimax")
+
+    ai = AI(Game(), search="expectimax", evaluator=evaluator, move_book=MoveBook(path))
+    assert ai.find_best_move(grid, 2) == book_move
+    batch = BatchExpectimax(evaluator, move_book=MoveBook(path))
+    other = bitboard.encode(np.array([[2, 0, 0, 0], [0, 0, 0, 0], [0, 0, 4, 0], [0, 0, 0, 2]]))
+    moves = batch.best_moves(np.array([board, other], dtype=np.uint64), 2)
+    assert moves[0] == book_move
+    assert moves[1] == BatchExpectimax(evaluator).best_moves(np.array([other], dtype=np.uint64), 2)[0]
+    assert batch.book_hits == 1
+
+    batchsearch.init_worker(book_path=path)  # As set up in the server's worker processes
+    moves, _, book_hits = batchsearch.best_moves_task(np.array([board], dtype=np.uint64), 2)
+    assert (moves, book_hits) == ([book_move], 1)
@@ -0,0 +1,76 @@
+"""Parity of the move implementations: Game.slide_and_merge, expgrid and the packed bitboards."""
+import numpy as np
+import pytest
+
+import bitboard
+import expgrid
+from game import Game
+
+DIRECTIONS = ["left", "up", "right", "down"]
+
+
+def random_exponents(rng: np.random.Generator, count: int, size: int = 4, max_exponent: int = 11) -> np.ndarray:
+    """Random exponent grids with about a third of the cells empty."""
+    exponents = rng.integers(1, max_exponent + 1, (count, size, size), dtype=np.uint8)
+    exponents[rng.random((count, size, size)) < 0.35] = 0
+    return exponents
+
+
+@pytest.mark.parametrize("size", [3, 4, 5, 8])
+def test_expgrid_slide_matches_slide_and_merge(size):
+    game = Game(use_bitboard=False, size=size)
+    rows = random_exponents(np.random.default_rng(size), 200, size).reshape(-1, size)
+    slid = expgrid.to_values(expgrid.slide_left(rows))
+    for row, expected in zip(expgrid.to_values(rows), slid):
+        np.testing.assert_array_equal(game.slide_and_merge(row.tolist()), expected)
+
+
+def test_bitboard_round_trip():
+    for exponents in random_exponents(np.random.default_rng(0), 200, max_exponent=bitboard.MAX_EXPONENT):
+        grid = expgrid.to_values(exponents)
+        np.testing.assert_array_equal(bitboard.decode(bitboard.encode(grid)), grid)
+        np.testing.assert_array_equal(bitboard.to_exponents(bitboard.from_exponents(exponents)), exponents)
+
+
+def test_bitboard_moves_match_expgrid():
+    for exponents in random_exponents(np.random.default_rng(1), 500):
+        board = bitboard.from_exponents(exponents)
+        for direction in DIRECTIONS:
+            moved = bitboard.to_exponents(bitboard.execute_move(board, direction))
+            np.testing.assert_array_equal(moved, expgrid.move(exponents, direction), err_msg=direction)
+        assert bitboard.can_move(board) == expgrid.can_move(exponents)
+
+
+def test_game_paths_play_the_same_game():
+    games = []
+    for use_bitboard in (True, False):
+        np.random.seed(5)
+        game = Game(use_bitboard=use_bitboard, auto_reset=False)
+        game.resetgame(5)
+        directions = np.random.default_rng(5).integers(len(DIRECTIONS), size=300)
+        for direction in directions:
+            game.move(DIRECTIONS[direction])
+        games.append(game)
+    packed, numpy_game = games
+    np.testing.assert_array_equal(packed.grid, numpy_game.grid)
+    assert (packed.score, packed.moves) == (numpy_game.score, numpy_game.moves)
+
+
+@pytest.mark.parametrize("use_bitboard", [True, False])
+def test_merging_32768_tiles(use_bitboard):
+    game = Game(use_bitboard=use_bitboard, auto_reset=False)
+    grid = np.zeros((4, 4), dtype=np.int64)
+    grid[0, :2] = 32768
+    game.grid = grid
+    game.move("left", spawn=(15, 2))
+    assert game.grid[0, 0] == 65536
+    assert not game.game_over()
+
+
+def test_encode_rejects_tiles_above_the_ceiling():
+    grid = np.zeros((4, 4), dtype=np.int64)
+    grid[0, 0] = 65536
+    with pytest.raises(ValueError):
+        bitboard.encode(grid)
+    with pytest.raises(ValueError):
+        bitboard.from_exponents(expgrid.to_exponents(grid))
@@ -0,0 +1,66 @@
+"""Search parity: the packed and NumPy paths, the table evaluator and the batched expectimax."""
+import numpy as np
+import pytest
+
+import bitboard
+from batchsearch import BatchExpectimax
+from game import AI, Game
+from heuristic import RowTableEvaluator
+
+
+def played_grids(count: int, seed: int = 0) -> list[np.ndarray]:
+    """Positions of a seeded game played with the depth-1 AI, which look like real games."""
+    np.random.seed(seed)
+    game = Game(auto_reset=False)
+    game.resetgame(seed)
+    ai = AI(game)
+    grids = []
+    while len(grids) < count and not game.game_over():
+        grids.append(game.grid)
+        game.move(ai.find_best_move(game.grid, 1))
+    return grids[::max(1, len(grids) // 12)]
+
+
+@pytest.fixture(scope="module")
+def grids():
+    return played_grids(200)
+
+
+@pytest.mark.parametrize("search, depth", [("minimax", 3), ("expectimax", 2)])
+def test_packed_and_numpy_search_agree(grids, search, depth):
+    packed = AI(Game(use_bitboard=True), search=search)
+    numpy_ai = AI(Game(use_bitboard=False), search=search)
+    for grid in grids:
+        assert packed.find_best_move(grid, depth) == numpy_ai.find_best_move(grid, depth)
+
+
+def test_make_unmake_search_agrees(grids):
+    plain = AI(Game(use_bitboard=False))
+    make_unmake = AI(Game(use_bitboard=False), make_unmake=True)
+    for grid in grids:
+        assert plain.find_best_move(grid, 3) == make_unmake.find_best_move(grid, 3)
+
+
+def test_exact_table_evaluator_matches_evaluate():
+    ai = AI(Game())
+    evaluator = RowTableEvaluator()
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        exponents = rng.integers(0, 12, (4, 4))
+        grid = np.where(exponents > 0, 2 ** exponents, 0)
+        assert evaluator.evaluate_board(bitboard.encode(grid)) == pytest.approx(ai.evaluate(grid))
+
+
+def test_table_evaluator_search_agrees(grids):
+    baseline = AI(Game())
+    tables = AI(Game(), evaluator=RowTableEvaluator())
+    for grid in grids:
+        assert baseline.find_best_move(grid, 2) == tables.find_best_move(grid, 2)
+
+
+def test_batch_expectimax_agrees(grids):
+    evaluator = RowTableEvaluator()
+    ai = AI(Game(), search="expectimax", evaluator=evaluator)
+    batch = BatchExpectimax(evaluator)
+    boards = np.array([bitboard.encode(grid) for grid in grids], dtype=np.uint64)
+    assert batch.best_moves(boards, 2) == [ai.find_best_move(grid, 2) for grid in grids]
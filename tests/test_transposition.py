@@ -0,0 +1,62 @@
+"""Transposition table: replacement, the running memory estimate and sharing between threads."""
+import sys
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+import pytest
+
+from game import AI, Game
+from transposition import TranspositionTable
+
+
+def walked_bytes(table: TranspositionTable) -> int:
+    """The memory estimate computed by walking every entry."""
+    containers = [table._entries] if table.replacement == "lru" else list(table._buckets.values())
+    total = sum(sys.getsizeof(container) for container in containers)
+    for container in containers:
+        for key, value in container.items():
+            total += sys.getsizeof(key) + sys.getsizeof(key[0]) + sys.getsizeof(value)
+    return total
+
+
+@pytest.mark.parametrize("replacement", TranspositionTable.REPLACEMENT_POLICIES)
+def test_running_memory_matches_a_walk(replacement):
+    table = TranspositionTable(max_entries=50, replacement=replacement)
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        table.store(int(rng.integers(1 << 40)) if rng.random() < 0.8 else 7, int(rng.integers(1, 5)),
+                    bool(rng.integers(2)), float(rng.random()))
+        assert table.memory_bytes() == walked_bytes(table)
+    assert len(table) == 50 and table.evictions > 0
+    table.clear()
+    assert len(table) == 0 and table.memory_bytes() == walked_bytes(table)
+
+
+@pytest.mark.parametrize("replacement", TranspositionTable.REPLACEMENT_POLICIES)
+def test_shared_between_threads(replacement):
+    table = TranspositionTable(max_entries=200, replacement=replacement)
+
+    def work(thread: int) -> None:
+        rng = np.random.default_rng(thread)
+        for _ in range(5000):
+            key, depth = int(rng.integers(1000)), int(rng.integers(1, 4))
+            if table.get(key, depth, True) is None:
+                table.store(key, depth, True, float(key))
+
+    with ThreadPool(4) as pool:
+        pool.map(work, range(4))
+    entries = table._entries if replacement == "lru" else {k: v for b in table._buckets.values() for k, v in b.items()}
+    assert len(table) == len(entries) <= 200
+    assert table.hits + table.misses == 4 * 5000
+    assert table.memory_bytes() == walked_bytes(table)
+
+
+def test_threaded_search_with_a_table():
+    game = Game(auto_reset=False)
+    game.resetgame(3)
+    for _ in range(10):
+        game.move(AI(game).find_best_move(game.grid, 1))
+    expected = AI(game).find_best_move(game.grid, 3)
+    ai = AI(game, transposition_table=TranspositionTable(max_entries=500))
+    assert ai.find_best_move_mult_thread(3, threads=4) == expected
+    assert 0 < len(ai.transposition_table) <= 500
@@ -0,0 +1,160 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+
+class TranspositionTable:
+    """
+    Bounded cache of search results keyed by (board key, depth, node type).
+
+    Two replacement policies are supported once the table is full:
+    - "lru": evict the least recently used entry.
+    - "depth": evict the oldest entry of the shallowest stored depth, and refuse
+      new entries that are shallower than everything already stored.
+
+    All operations hold a lock, so one table can be shared by the search threads of
+    AI.find_best_move_mult_thread.
+    """
+
+    REPLACEMENT_POLICIES = ("lru", "depth")
+
+    def __init__(self, max_entries: int = 1_000_000, replacement: str = "lru") -> None:
+        """
+        Initializes an empty table.
+
+        Args:
+            max_entries (int): Maximum number of entries kept at any time.
+            replacement (str): Replacement policy, either 'lru' or 'depth'.
+        """
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        if replacement not in self.REPLACEMENT_POLICIES:
+            raise ValueError(f"Unknown replacement policy: {replacement!r}")
+        self.max_entries = max_entries
+        self.replacement = replacement
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict = OrderedDict()  # Used by the "lru" policy
+        self._buckets: dict[int, OrderedDict] = {}  # Used by the "depth" policy, one bucket per depth
+        self._size = 0
+        self._entry_bytes = 0  # Running size of the stored keys and values, see memory_bytes
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def get(self, board_key: Hashable, depth: int, maximizing_player: bool) -> Optional[float]:
+        """
+        Looks up a stored search result.
+
+        Args:
+            board_key (Hashable): Hashable encoding of the board.
+            depth (int): Remaining search depth of the node.
+            maximizing_player (bool): True for player (max) nodes, False for chance nodes.
+
+        Returns:
+            float or None: The stored value, or None on a miss.
+        """
+        key = (board_key, depth, maximizing_player)
+        with self._lock:
+            if self.replacement == "lru":
+                value = self._entries.get(key)
+                if value is not None:
+                    self._entries.move_to_end(key)
+            else:
+                bucket = self._buckets.get(depth)
+                value = bucket.get(key) if bucket is not None else None
+
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def store(self, board_key: Hashable, depth: int, maximizing_player: bool, value: float) -> None:
+        """
+        Stores a search result, evicting an older entry if the table is full.
+
+        Args:
+            board_key (Hashable): Hashable encoding of the board.
+            depth (int): Remaining search depth of the node.
+            maximizing_player (bool): True for player (max) nodes, False for chance nodes.
+            value (float): The value returned by the search for this node.
+        """
+        key = (board_key, depth, maximizing_player)
+        with self._lock:
+            if self.replacement == "lru":
+                entries = self._entries
+            else:
+                entries = self._buckets.setdefault(depth, OrderedDict())
+            if key in entries:
+                self._entry_bytes -= self._entry_size(key, entries[key])
+                if self.replacement == "lru":
+                    entries.move_to_end(key)
+            elif self._size >= self.max_entries:
+                if self.replacement == "lru":
+                    evicted = entries
+                else:
+                    shallowest = min(d for d, b in self._buckets.items() if b)
+                    if shallowest > depth:
+                        return  # Everything stored was searched deeper, keep it
+                    evicted = self._buckets[shallowest]
+                self._entry_bytes -= self._entry_size(*evicted.popitem(last=False))
+                self.evictions += 1
+            else:
+                self._size += 1
+            entries[key] = value
+            self._entry_bytes += self._entry_size(key, value)
+
+    @staticmethod
+    def _entry_size(key: tuple, value: float) -> int:
+        """Approximate size in bytes of one stored key and value."""
+        return sys.getsizeof(key) + sys.getsizeof(key[0]) + sys.getsizeof(value)
+
+    def clear(self) -> None:
+        """Removes all entries while keeping the hit and miss counters."""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._size = 0
+            self._entry_bytes = 0
+
+    def reset_stats(self) -> None:
+        """Resets the hit, miss and eviction counters."""
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def memory_bytes(self) -> int:
+        """
+        Estimates the memory held by the table, including keys and values.
+
+        The size of the entries is kept up to date by store, so this does not walk the table.
+
+        Returns:
+            int: Approximate size in bytes.
+        """
+        with self._lock:
+            containers = [self._entries] if self.replacement == "lru" else list(self._buckets.values())
+            return sum(sys.getsizeof(container) for container in containers) + self._entry_bytes
+
+    def stats(self) -> dict[str, float]:
+        """
+        Reports usage of the table.
+
+        Returns:
+            dict[str, float]: Entry count, capacity, hits, misses, hit rate, evictions and memory in bytes.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "memory_bytes": self.memory_bytes(),
+        }
@@ -0,0 +1,336 @@
+"""
+Tunes the weights of the heuristic evaluation with CMA-ES over seeded headless games.
+
+A candidate is the logarithm of the seven DEFAULT_WEIGHTS terms and of the ratio between
+neighbouring perfectsnake cells, scored with the "exact" RowTableEvaluator, which with the
+default values evaluates like AI.evaluate. Every generation samples a population from
+the CMA-ES distribution and plays all candidates on the same seeded games, spread over a
+process pool. Candidates are ranked by successive halving: all play the first rung of
+games, only the better part plays on to the next rung, so weak candidates are stopped
+after a few games. The state is checkpointed after every generation, so an interrupted
+run continues with --resume, and the mean of the distribution, the strategy's estimate
+of the best weights under the noisy game scores, is written as the weights file loaded
+by main.py and simulate.py --weights.
+
+Example:
+    python tuning.py --generations 30 --games 32 --depth 1 --output heuristic_weights.json
+    python tuning.py --generations 60 --resume
+    python simulate.py --games 100 --depth 3 --weights heuristic_weights.json
+"""
+import argparse
+import json
+import math
+import os
+import time
+from functools import lru_cache
+from multiprocessing import Pool
+from typing import Optional
+
+import numpy as np
+
+from constants import HEURISTIC_WEIGHTS_PATH
+from game import Game, AI
+from heuristic import DEFAULT_WEIGHTS, RowTableEvaluator, snake_weights
+
+# Tuned parameters, optimized as logarithms so that every weight stays positive
+PARAMETERS = list(DEFAULT_WEIGHTS) + ["snake_ratio"]
+DEFAULT_PARAMETERS = {**DEFAULT_WEIGHTS, "snake_ratio": 2.0}
+
+
+class CMAES:
+    """
+    Covariance matrix adaptation evolution strategy with the default settings of Hansen's tutorial.
+
+    Maximizes: tell expects the candidates of ask ranked from best to worst.
+    """
+
+    def __init__(self, mean: np.ndarray, sigma: float, popsize: Optional[int] = None) -> None:
+        """
+        Args:
+            mean (np.ndarray): Initial mean of the search distribution.
+            sigma (float): Initial step size.
+            popsize (Optional[int]): Candidates per generation, 4 + 3 ln(n) if None.
+        """
+        n = len(mean)
+        self.mean = np.array(mean, dtype=np.float64)
+        self.sigma = float(sigma)
+        self.popsize = popsize or 4 + int(3 * np.log(n))
+        self.mu = self.popsize // 2
+        weights = np.log(self.mu + 0.5) - np.log(np.arange(1, self.mu + 1))
+        self.weights = weights / weights.sum()
+        self.mueff = 1 / np.sum(self.weights ** 2)
+        self.cc = (4 + self.mueff / n) / (n + 4 + 2 * self.mueff / n)
+        self.cs = (self.mueff + 2) / (n + self.mueff + 5)
+        self.c1 = 2 / ((n + 1.3) ** 2 + self.mueff)
+        self.cmu = min(1 - self.c1, 2 * (self.mueff - 2 + 1 / self.mueff) / ((n + 2) ** 2 + self.mueff))
+        self.damps = 1 + 2 * max(0.0, np.sqrt((self.mueff - 1) / (n + 1)) - 1) + self.cs
+        self.chi_n = np.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n ** 2))
+        self.C = np.eye(n)
+        self.pc = np.zeros(n)
+        self.ps = np.zeros(n)
+        self.generation = 0
+
+    def ask(self, rng: np.random.Generator) -> np.ndarray:
+        """Samples a (popsize, n) array of candidates."""
+        eigenvalues, basis = np.linalg.eigh(self.C)
+        scales = np.sqrt(np.maximum(eigenvalues, 1e-20))
+        z = rng.standard_normal((self.popsize, len(self.mean)))
+        return self.mean + self.sigma * (z * scales) @ basis.T
+
+    def tell(self, ranked: np.ndarray) -> None:
+        """
+        Updates the distribution from the candidates of a generation.
+
+        Args:
+            ranked (np.ndarray): The candidates of ask, best first.
+        """
+        n = len(self.mean)
+        steps = (np.asarray(ranked)[:self.mu] - self.mean) / self.sigma
+        step = self.weights @ steps
+        self.mean = self.mean + self.sigma * step
+
+        eigenvalues, basis = np.linalg.eigh(self.C)
+        inverse_sqrt = basis @ np.diag(1 / np.sqrt(np.maximum(eigenvalues, 1e-20))) @ basis.T
+        self.ps = (1 - self.cs) * self.ps + np.sqrt(self.cs * (2 - self.cs) * self.mueff) * inverse_sqrt @ step
+        self.generation += 1
+        ps_norm = np.linalg.norm(self.ps) / np.sqrt(1 - (1 - self.cs) ** (2 * self.generation))
+        hsig = float(ps_norm / self.chi_n < 1.4 + 2 / (n + 1))
+        self.pc = (1 - self.cc) * self.pc + hsig * np.sqrt(self.cc * (2 - self.cc) * self.mueff) * step
+
+        rank_mu = (steps.T * self.weights) @ steps
+        self.C = ((1 - self.c1 - self.cmu) * self.C
+                  + self.c1 * (np.outer(self.pc, self.pc) + (1 - hsig) * self.cc * (2 - self.cc) * self.C)
+                  + self.cmu * rank_mu)
+        self.C = (self.C + self.C.T) / 2
+        self.sigma *= np.exp((self.cs / self.damps) * (np.linalg.norm(self.ps) / self.chi_n - 1))
+
+    def state(self) -> dict:
+        """The adapted state as JSON-compatible values, see from_state."""
+        return {"mean": self.mean.tolist(), "sigma": self.sigma, "popsize": self.popsize, "C": self.C.tolist(),
+                "pc": self.pc.tolist(), "ps": self.ps.tolist(), "generation": self.generation}
+
+    @classmethod
+    def from_state(cls, state: dict) -> "CMAES":
+        """Restores a strategy saved with state."""
+        strategy = cls(np.array(state["mean"]), state["sigma"], state["popsize"])
+        strategy.C = np.array(state["C"])
+        strategy.pc = np.array(state["pc"])
+        strategy.ps = np.array(state["ps"])
+        strategy.generation = state["generation"]
+        return strategy
+
+
+def encode(parameters: dict[str, float]) -> np.ndarray:
+    """Turns weights and snake ratio into a candidate vector."""
+    return np.log([parameters[name] for name in PARAMETERS])
+
+
+def decode(candidate: np.ndarray) -> tuple[dict[str, float], float]:
+    """
+    Turns a candidate vector into heuristic weights.
+
+    Returns:
+        tuple[dict[str, float], float]: The RowTableEvaluator weights and the snake ratio.
+    """
+    values = dict(zip(PARAMETERS, np.exp(candidate).tolist()))
+    snake_ratio = values.pop("snake_ratio")
+    return values, snake_ratio
+
+
+def final_score(grid: np.ndarray) -> float:
+    """
+    Approximate 2048 score of a board: a tile of value 2^k took merges worth (k - 1) * 2^k,
+    counting every spawned tile as a 2.
+    """
+    tiles = grid[grid > 0].astype(np.float64)
+    return float(np.sum(tiles * (np.log2(tiles) - 1)))
+
+
+@lru_cache(maxsize=16)
+def _candidate_evaluator(candidate: tuple[float, ...]) -> RowTableEvaluator:
+    """Evaluator of a candidate, cached because a worker plays several games per candidate."""
+    weights, snake_ratio = decode(np.array(candidate))
+    return RowTableEvaluator(weights, snake_weights(snake_ratio))
+
+
+def play_candidate(candidate: tuple[float, ...], seed: int, depth: int = 1, search: str = "minimax",
+                   max_moves: Optional[int] = None) -> float:
+    """
+    Plays one seeded game with the weights of a candidate.
+
+    Args:
+        candidate (tuple[float, ...]): The candidate vector.
+        seed (int): Seed of the tile spawns.
+        depth (int): Search depth of the AI.
+        search (str): Search algorithm of the AI, 'minimax' or 'expectimax'.
+        max_moves (Optional[int]): Stop the game after this many moves.
+
+    Returns:
+        float: The final_score of the last board.
+    """
+    game = Game(use_bitboard=True, auto_reset=False)
+    game.resetgame(seed)  # Seeds np.random, which drives the tile spawns
+    ai = AI(game, search=search, seed=seed, evaluator=_candidate_evaluator(candidate))
+    while not game.game_over() and (max_moves is None or game.moves < max_moves):
+        best_move = ai.find_best_move(game.grid, depth)
+        if best_move is None:
+            break
+        game.move(best_move)
+    return final_score(game.grid)
+
+
+def _play_candidate_task(args: tuple) -> tuple[int, int, float]:
+    """Unpacks the arguments of play_candidate for Pool.imap_unordered, tagging the result."""
+    index, game_index, candidate, seed, depth, search, max_moves = args
+    return index, game_index, play_candidate(candidate, seed, depth, search, max_moves)
+
+
+def rung_sizes(games: int, rungs: int, eta: float) -> list[int]:
+    """Number of games a candidate has played after each rung, ending with games."""
+    return [max(1, math.ceil(games / eta ** (rungs - 1 - rung))) for rung in range(rungs)]
+
+
+def successive_halving(pool: Pool, candidates: np.ndarray, seeds: list[int], rungs: int, eta: float,
+                       depth: int, search: str, max_moves: Optional[int]) -> tuple[list[int], np.ndarray, np.ndarray, int]:
+    """
+    Ranks candidates on shared seeded games, stopping the weaker ones early.
+
+    After every rung only the best 1 / eta of the remaining candidates go on to play more games.
+
+    Args:
+        pool (Pool): Worker processes playing the games.
+        candidates (np.ndarray): The (N, len(PARAMETERS)) candidates.
+        seeds (list[int]): Seeds of the games, played in this order.
+        rungs (int): Number of rungs.
+        eta (float): Factor by which the candidates are reduced and the games increased per rung.
+        depth (int): Search depth of the games.
+        search (str): Search algorithm of the games.
+        max_moves (Optional[int]): Move limit of the games.
+
+    Returns:
+        tuple: The candidate indices from best to worst, the mean score of every candidate over
+        the games it played, the rung every candidate reached and the number of games played.
+    """
+    scores = [dict() for _ in candidates]
+    reached = np.zeros(len(candidates), dtype=np.int64)
+    alive = list(range(len(candidates)))
+    played = 0
+    for rung, size in enumerate(rung_sizes(len(seeds), rungs, eta)):
+        tasks = [(index, game_index, tuple(candidates[index].tolist()), seeds[game_index], depth, search, max_moves)
+                 for index in alive for game_index in range(len(scores[index]), size)]
+        for index, game_index, score in pool.imap_unordered(_play_candidate_task, tasks):
+            scores[index][game_index] = score
+        played += len(tasks)
+        reached[alive] = rung
+        means = [np.mean(list(scores[index].values())) for index in alive]
+        alive = [alive[i] for i in np.argsort(means, kind="stable")[::-1][:math.ceil(len(alive) / eta)]]
+
+    fitness = np.array([np.mean(list(candidate_scores.values())) for candidate_scores in scores])
+    ranking = sorted(range(len(candidates)), key=lambda index: (reached[index], fitness[index]), reverse=True)
+    return ranking, fitness, reached, played
+
+
+def save_checkpoint(path: str, checkpoint: dict) -> None:
+    """Writes the checkpoint to a temporary file first, so an interruption never leaves it half written."""
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(temporary_path, path)
+
+
+def tune(generations: int, output: str = HEURISTIC_WEIGHTS_PATH, checkpoint_path: str = "tuning_checkpoint.json",
+         resume: bool = False, games: int = 32, rungs: int = 3, eta: float = 2.0, popsize: Optional[int] = None,
+         sigma: float = 0.5, depth: int = 1, search: str = "minimax", max_moves: Optional[int] = None,
+         seed: int = 0, workers: Optional[int] = None) -> dict:
+    """
+    Runs CMA-ES generations until the checkpoint has reached the requested number.
+
+    Args:
+        generations (int): Total number of generations, including those of a resumed run.
+        output (str): Weights file of the distribution mean, written after every generation.
+        checkpoint_path (str): Checkpoint written after every generation.
+        resume (bool): Continue from checkpoint_path; the settings of the checkpoint are used.
+        games (int): Games played by the candidates of the last rung.
+        rungs (int): Rungs of the successive halving.
+        eta (float): Reduction factor of the successive halving.
+        popsize (Optional[int]): Candidates per generation, the CMA-ES default if None.
+        sigma (float): Initial step size on the log weights.
+        depth (int): Search depth of the games.
+        search (str): Search algorithm of the games.
+        max_moves (Optional[int]): Move limit of the games, None plays until game over.
+        seed (int): Seed of the sampling and of the games; generation g plays seeds
+            seed + g * games and upwards, the same for all its candidates.
+        workers (Optional[int]): Worker processes, defaults to the number of CPUs.
+
+    Returns:
+        dict: The final checkpoint.
+    """
+    if resume:
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+        strategy = CMAES.from_state(checkpoint["strategy"])
+        rng = np.random.default_rng()
+        rng.bit_generator.state = checkpoint["rng"]
+    else:
+        config = {"games": games, "rungs": rungs, "eta": eta, "depth": depth, "search": search,
+                  "max_moves": max_moves, "seed": seed}
+        strategy = CMAES(encode(DEFAULT_PARAMETERS), sigma, popsize)
+        rng = np.random.default_rng(seed)
+        checkpoint = {"config": config, "history": []}
+    config = checkpoint["config"]
+
+    with Pool(workers or os.cpu_count() or 1) as pool:
+        while strategy.generation < generations:
+            start = time.perf_counter()
+            candidates = strategy.ask(rng)
+            first_seed = config["seed"] + strategy.generation * config["games"]
+            seeds = list(range(first_seed, first_seed + config["games"]))
+            ranking, fitness, reached, played = successive_halving(
+                pool, candidates, seeds, config["rungs"], config["eta"], config["depth"], config["search"],
+                config["max_moves"])
+            strategy.tell(candidates[ranking])
+
+            weights, snake_ratio = decode(strategy.mean)
+            entry = {"generation": strategy.generation, "best_score": float(fitness[ranking[0]]),
+                     "finalists": int((reached == reached.max()).sum()), "games_played": played,
+                     "sigma": strategy.sigma, "seconds": time.perf_counter() - start,
+                     "weights": weights, "snake_ratio": snake_ratio}
+            checkpoint["history"].append(entry)
+            checkpoint["strategy"] = strategy.state()
+            checkpoint["rng"] = rng.bit_generator.state
+            RowTableEvaluator(weights, snake_weights(snake_ratio)).save(
+                output, snake_ratio=snake_ratio, generation=strategy.generation, config=config)
+            save_checkpoint(checkpoint_path, checkpoint)
+            print(f"generation {entry['generation']}: best {entry['best_score']:.0f} over {config['games']} games, "
+                  f"{played} games played, sigma {entry['sigma']:.3f}, {entry['seconds']:.1f} s", flush=True)
+    return checkpoint
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tune the heuristic weights of the AI with CMA-ES.")
+    parser.add_argument("--generations", type=int, default=30, help="total generations, including resumed ones")
+    parser.add_argument("--output", default=HEURISTIC_WEIGHTS_PATH, help="weights file to write")
+    parser.add_argument("--checkpoint", default="tuning_checkpoint.json", help="checkpoint file")
+    parser.add_argument("--resume", action="store_true", help="continue from the checkpoint and use its settings")
+    parser.add_argument("--games", type=int, default=32, help="games per candidate in the last rung")
+    parser.add_argument("--rungs", type=int, default=3, help="rungs of the successive halving")
+    parser.add_argument("--eta", type=float, default=2.0, help="candidates kept per rung is 1 / eta")
+    parser.add_argument("--popsize", type=int, default=None, help="candidates per generation (default: 4 + 3 ln n)")
+    parser.add_argument("--sigma", type=float, default=0.5, help="initial step size on the log weights")
+    parser.add_argument("--depth", type=int, default=1, help="search depth of the games")
+    parser.add_argument("--search", choices=["minimax", "expectimax"], default="minimax")
+    parser.add_argument("--max-moves", type=int, default=None, help="stop each game after this many moves")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the sampling and the games")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    checkpoint = tune(args.generations, args.output, args.checkpoint, args.resume, args.games, args.rungs,
+                      args.eta, args.popsize, args.sigma, args.depth, args.search, args.max_moves, args.seed,
+                      args.workers)
+    if checkpoint["history"]:
+        print(json.dumps(checkpoint["history"][-1], indent=2))
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
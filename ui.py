@@ -2,7 +2,8 @@ import pygame
 import numpy as np
 import time
 from typing import Optional, Callable
-from constants import GRID_SIZE, CELL_SIZE, GAP_SIZE, WIDTH, HEIGHT, BACKGROUND_COLOR, TEXT_COLOR, CELL_COLOR
+from ai_worker import AIWorker
+from constants import AI_TIME_BUDGET_MS, CELL_SIZE, GAP_SIZE, WIDTH, BACKGROUND_COLOR, TEXT_COLOR, CELL_COLOR
 
 class UI:
     def __init__(self, game: "Game_class", ai: "AI_class") -> None:
@@ -14,37 +15,108 @@ class UI:
             ai (AI): The AI instance.
         """
     # def __init__(self, game, ai):
-        self.screen = pygame.display.set_mode((WIDTH, HEIGHT + 100))
+        height = game.size * (CELL_SIZE + GAP_SIZE) + GAP_SIZE  # Board area of the size of the game
+        width = max(height, WIDTH)  # Wide enough for the buttons on small boards
+        self.screen = pygame.display.set_mode((width, height + 100))
         pygame.display.set_caption("2048 Game")
         self.font = pygame.font.Font(None, 50)
         self.button_font = pygame.font.Font(None, 30)
         self.game = game
         self.start_time = None
-        self.moves = game.moves
+        self.moves = 0  # Moves made since the benchmark started, counted across game resets
         self.miniai = ai
         self.ai_running = False
+        self.ai_worker = AIWorker(ai, AI_TIME_BUDGET_MS)  # Searches off the render thread
+        self.tile_surfaces: dict[int, pygame.Surface] = {}  # Rendered tile numbers per value
+        self.label_surfaces: dict[str, pygame.Surface] = {}  # Rendered button labels
+        self.drawn_grid: Optional[np.ndarray] = None  # Grid shown on screen, None forces a full redraw
+        self.buttons = [
+            ("Use AI", 50, height + 20, 100, 50, (150, 150, 255), self.ai_toggle),
+            ("Reset", width // 2 - 50, height + 20, 100, 50, (255, 100, 100), self.reset),
+            ("Benchmark", width - 150, height + 20, 120, 50, (100, 255, 100), self.benchmark),
+        ]
 
-    def draw_grid(self) -> None:
-        """
-        Draws the game grid on the screen.
-        """
-        self.screen.fill(BACKGROUND_COLOR)
-        for row in range(GRID_SIZE):
-            for col in range(GRID_SIZE):
-                value = self.game.grid[row, col]
-                color = CELL_COLOR.get(value, (237, 204, 97))
-                x, y = col * (CELL_SIZE + GAP_SIZE) + GAP_SIZE, row * (CELL_SIZE + GAP_SIZE) + GAP_SIZE
-                pygame.draw.rect(self.screen, color, (x, y, CELL_SIZE, CELL_SIZE), border_radius=5)
-                if value > 0:
-                    text = self.font.render(str(value), True, TEXT_COLOR)
-                    text_rect = text.get_rect(center=(x + CELL_SIZE // 2, y + CELL_SIZE // 2))
-                    self.screen.blit(text, text_rect)
+    def tile_surface(self, value: int) -> pygame.Surface:
+        """
+        Returns the rendered number of a tile, rendering it only the first time it is needed.
+
+        Args:
+            value (int): The tile value.
+        """
+        surface = self.tile_surfaces.get(value)
+        if surface is None:
+            surface = self.tile_surfaces[value] = self.font.render(str(value), True, TEXT_COLOR)
+        return surface
+
+    def label_surface(self, text: str) -> pygame.Surface:
+        """
+        Returns the rendered label of a button, rendering it only the first time it is needed.
+
+        Args:
+            text (str): The button label.
+        """
+        surface = self.label_surfaces.get(text)
+        if surface is None:
+            surface = self.label_surfaces[text] = self.font.render(text, True, (0, 0, 0))
+        return surface
+
+    def draw_cell(self, row: int, col: int, value: int) -> pygame.Rect:
+        """
+        Draws a single cell of the grid.
+
+        Args:
+            row (int): The row of the cell.
+            col (int): The column of the cell.
+            value (int): The tile value, 0 for an empty cell.
+
+        Returns:
+            pygame.Rect: The area of the screen that was drawn.
+        """
+        color = CELL_COLOR.get(value, (237, 204, 97))
+        x, y = col * (CELL_SIZE + GAP_SIZE) + GAP_SIZE, row * (CELL_SIZE + GAP_SIZE) + GAP_SIZE
+        rect = pygame.Rect(x, y, CELL_SIZE, CELL_SIZE)
+        self.screen.fill(BACKGROUND_COLOR, rect)  # Clear the rounded corners
+        pygame.draw.rect(self.screen, color, rect, border_radius=5)
+        if value > 0:
+            text = self.tile_surface(value)
+            self.screen.blit(text, text.get_rect(center=rect.center))
+        return rect
+
+    def draw_grid(self) -> list[pygame.Rect]:
+        """
+        Draws the cells that changed since the last frame, or the whole screen after invalidate().
+
+        Returns:
+            list[pygame.Rect]: The areas of the screen that were drawn.
+        """
+        grid = self.game.grid
+        if self.drawn_grid is None:
+            self.screen.fill(BACKGROUND_COLOR)
+            for row in range(self.game.size):
+                for col in range(self.game.size):
+                    self.draw_cell(row, col, grid[row, col])
+            for text, x, y, width, height, color, _ in self.buttons:
+                self.draw_button(text, x, y, width, height, color)
+            self.drawn_grid = grid.copy()
+            return [self.screen.get_rect()]
+
+        dirty = []
+        for row, col in np.argwhere(grid != self.drawn_grid):
+            dirty.append(self.draw_cell(row, col, grid[row, col]))
+        self.drawn_grid = grid.copy()
+        return dirty
+
+    def invalidate(self) -> None:
+        """
+        Forces a full redraw on the next frame, e.g. after the window was covered.
+        """
+        self.drawn_grid = None
     
     # def draw_button(self, text, x, y, width, height, color, action=None):
     def draw_button(self, text: str, x: int, y: int, width: int, height: int, 
-                    color: tuple[int, int, int], action: Optional[Callable[[], None]] = None) -> None:
+                    color: tuple[int, int, int]) -> pygame.Rect:
         """
-        Draws a button on the screen and handles clicks.
+        Draws a button on the screen.
 
         Args:
             text (str): The text to display on the button.
@@ -53,17 +125,27 @@ class UI:
             width (int): The width of the button.
             height (int): The height of the button.
             color (tuple[int, int, int]): The RGB color of the button.
-            action (Optional[Callable[[], None]]): The function to call when the button is clicked.
+
+        Returns:
+            pygame.Rect: The area of the button.
         """
         rect = pygame.Rect(x, y, width, height)
         pygame.draw.rect(self.screen, color, rect, border_radius=5)
 
-        text_surf = self.font.render(text, True, (0, 0, 0))  
+        text_surf = self.label_surface(text)
         text_rect = text_surf.get_rect(center=rect.center)
         self.screen.blit(text_surf, text_rect)
+        return rect
 
-        if rect.collidepoint(pygame.mouse.get_pos()) and pygame.mouse.get_pressed()[0]:
-            if action:
+    def handle_buttons(self) -> None:
+        """
+        Calls the action of a button when it is clicked.
+        """
+        if not pygame.mouse.get_pressed()[0]:
+            return
+        position = pygame.mouse.get_pos()
+        for _, x, y, width, height, _, action in self.buttons:
+            if pygame.Rect(x, y, width, height).collidepoint(position):
                 action()
                 pygame.time.wait(150)  # Small delay to prevent multiple calls
             
@@ -71,27 +153,32 @@ class UI:
         """
         Resets the game to its initial state.
         """
-        self.game.__init__()
+        self.ai_worker.cancel()
+        self.game.resetgame()
         self.start_time = None
-        self.moves = self.game.moves
+        self.moves = 0
         if self.ai_running:
             self.ai_toggle()
     
     def benchmark(self) -> None:
         """
-        Measures and prints the elapsed time and number of moves since the AI started.
+        Measures and prints the elapsed time and number of moves since the first click.
+        For repeatable measurements use benchmark.py instead.
         """
         if self.start_time is None:
             self.start_time = time.time()
+            self.moves = 0
         
         elapsed = time.time() - self.start_time
-        print(f"Time: {elapsed:.2f} sec, Moves: {self.moves}")
+        rate = self.moves / elapsed if elapsed > 0 else 0.0
+        print(f"Time: {elapsed:.2f} sec, Moves: {self.moves}, Moves/sec: {rate:.1f}")
     
     def ai_toggle(self) -> None:
         """
         Toggles the AI on and off.
         """
         self.ai_running = not self.ai_running
+        self.ai_worker.cancel()
         if self.ai_running:
             print("Enabled")
             pygame.display.set_caption("2048 Game (AI Enabled)")
@@ -100,14 +187,40 @@ class UI:
             pygame.display.set_caption("2048 Game")
 
 
+    def poll_ai(self) -> None:
+        """
+        Plays the AI's move once the background search for the current grid has finished.
+        """
+        if self.ai_running:
+            best_move = self.ai_worker.poll(self.game.grid)
+            if best_move is not None:
+                self.move(best_move)
+
+    def move(self, direction: str) -> None:
+        """
+        Plays a move and counts it for the benchmark if it changed the board.
+
+        game.moves cannot be compared across turns because it restarts at 0 when the game resets.
+        """
+        moves_before = self.game.moves
+        self.game.move(direction)
+        if self.game.moves != moves_before:
+            self.moves += 1
+
+    def close(self) -> None:
+        """
+        Stops the background AI worker.
+        """
+        self.ai_worker.stop()
+
     def update(self) -> None:
         """
-        Updates the UI by drawing the grid and buttons, and refreshing the display.
+        Updates the UI by redrawing the cells that changed, handling button clicks,
+        and refreshing only the changed parts of the display.
         """
-        self.draw_grid()
-        self.draw_button("Use AI", 50, HEIGHT + 20, 100, 50, (150, 150, 255), self.ai_toggle)
-        self.draw_button("Reset", WIDTH // 2 - 50, HEIGHT + 20, 100, 50, (255, 100, 100), self.reset)
-        self.draw_button("Benchmark", WIDTH - 150, HEIGHT + 20, 120, 50, (100, 255, 100), self.benchmark)
+        dirty = self.draw_grid()
+        self.handle_buttons()
 
-        pygame.display.flip()
+        if dirty:
+            pygame.display.update(dirty)
 
@@ -0,0 +1,267 @@
+import numpy as np
+from typing import Optional, Sequence
+
+import bitboard
+from game import Game
+
+# Action codes, matching AI.directions. The code is also the number of np.rot90
+# turns that bring the move to "left", as in Game.move.
+ACTIONS = {0: "left", 1: "up", 2: "right", 3: "down"}
+
+# bitboard.ROW_LEFT_TABLE as an array so whole batches of rows are looked up at once
+ROW_LEFT_TABLE = np.array(bitboard.ROW_LEFT_TABLE, dtype=np.uint16)
+_NIBBLE_SHIFTS = np.array([0, 4, 8, 12], dtype=np.uint16)
+
+
+def _row_merge_reward(row: int) -> int:
+    """Sum of the tiles created by merges when a packed row slides left."""
+    cells = [(row >> (4 * i)) & bitboard.CELL_MASK for i in range(bitboard.BOARD_SIZE)]
+    non_zero = [cell for cell in cells if cell]
+    reward = 0
+    i = 0
+    while i < len(non_zero):
+        if i < len(non_zero) - 1 and non_zero[i] == non_zero[i + 1]:
+            reward += 1 << (non_zero[i] + 1)
+            i += 2
+        else:
+            i += 1
+    return reward
+
+
+ROW_REWARD_TABLE = np.array([_row_merge_reward(row) for row in range(bitboard.ROW_MASK + 1)], dtype=np.int64)
+
+
+def slide_left(boards: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Slides and merges every row of a stack of exponent boards towards column 0.
+
+    Args:
+        boards (np.ndarray): An (N, 4, 4) array of log2 exponents (0 = empty).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The moved boards and the merge reward of each board.
+    """
+    packed = (boards.astype(np.uint16) << _NIBBLE_SHIFTS).sum(axis=2, dtype=np.uint16)
+    moved = (ROW_LEFT_TABLE[packed][..., None] >> _NIBBLE_SHIFTS) & bitboard.CELL_MASK
+    return moved.astype(boards.dtype), ROW_REWARD_TABLE[packed].sum(axis=1)
+
+
+def move_boards(boards: np.ndarray, actions: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Applies one move per board without spawning tiles.
+
+    Args:
+        boards (np.ndarray): An (N, 4, 4) array of log2 exponents.
+        actions (np.ndarray): N action codes (0 = left, 1 = up, 2 = right, 3 = down).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The moved boards and the merge reward of each board.
+    """
+    moved = boards.copy()
+    rewards = np.zeros(len(boards), dtype=np.int64)
+    for action in ACTIONS:
+        selected = np.flatnonzero(actions == action)
+        if selected.size:
+            rotated = np.rot90(boards[selected], action, axes=(1, 2))
+            slid, rewards[selected] = slide_left(rotated)
+            moved[selected] = np.rot90(slid, -action, axes=(1, 2))
+    return moved, rewards
+
+
+def legal_actions(boards: np.ndarray) -> np.ndarray:
+    """
+    Finds the moves that change each board.
+
+    Args:
+        boards (np.ndarray): An (N, 4, 4) array of log2 exponents.
+
+    Returns:
+        np.ndarray: An (N, 4) boolean mask indexed by action code.
+    """
+    legal = np.zeros((len(boards), len(ACTIONS)), dtype=bool)
+    for action in ACTIONS:
+        moved, _ = move_boards(boards, np.full(len(boards), action))
+        legal[:, action] = (moved != boards).any(axis=(1, 2))
+    return legal
+
+
+def game_over(boards: np.ndarray) -> np.ndarray:
+    """
+    Vectorized Game.game_over: no empty cell and no equal neighbours.
+
+    Args:
+        boards (np.ndarray): An (N, 4, 4) array of log2 exponents.
+
+    Returns:
+        np.ndarray: N booleans, True where no move is possible.
+    """
+    has_empty = (boards == 0).any(axis=(1, 2))
+    horizontal = (boards[:, :, :-1] == boards[:, :, 1:]).any(axis=(1, 2))
+    vertical = (boards[:, :-1, :] == boards[:, 1:, :]).any(axis=(1, 2))
+    return ~(has_empty | horizontal | vertical)
+
+
+def pack_boards(boards: np.ndarray) -> np.ndarray:
+    """
+    Vectorized bitboard.from_exponents: packs a stack of exponent boards into 64-bit boards.
+
+    Args:
+        boards (np.ndarray): An (N, 4, 4) array of log2 exponents.
+
+    Returns:
+        np.ndarray: N packed boards as uint64.
+    """
+    cells = boards.reshape(len(boards), -1).astype(np.uint8)
+    pairs = cells[:, 0::2] | (cells[:, 1::2] << 4)  # Two cells per byte, the first one in the low nibble
+    return np.ascontiguousarray(pairs).view("<u8").reshape(-1)
+
+
+def unpack_boards(packed: np.ndarray) -> np.ndarray:
+    """
+    Vectorized bitboard.to_exponents: unpacks 64-bit boards into a stack of exponent boards.
+
+    Args:
+        packed (np.ndarray): N packed boards as uint64.
+
+    Returns:
+        np.ndarray: An (N, 4, 4) uint8 array of log2 exponents.
+    """
+    pairs = np.ascontiguousarray(packed, dtype="<u8").view(np.uint8).reshape(-1, 8)
+    cells = np.empty((len(pairs), 16), dtype=np.uint8)
+    cells[:, 0::2] = pairs & 0xF
+    cells[:, 1::2] = pairs >> 4
+    return cells.reshape(-1, bitboard.BOARD_SIZE, bitboard.BOARD_SIZE)
+
+
+class VecGame:
+    """
+    M independent 2048 games stepped together with bulk NumPy operations.
+
+    Boards are stored as one (M, 4, 4) uint8 array of log2 exponents. Moves, tile
+    spawns, game-over detection and resets follow the same rules as Game, and each
+    board draws its spawns from its own seeded generator, so a board's game only
+    depends on its seed and its moves. Finished boards are reset automatically.
+    Like bitboard.py, moves are resolved with the packed-row tables, so tiles are
+    limited to 2**15.
+    """
+
+    def __init__(self, num_games: int, seeds: Optional[Sequence[int]] = None, buffer_steps: int = 256) -> None:
+        """
+        Initializes M games in the Game.resetgame position.
+
+        Args:
+            num_games (int): Number of boards M.
+            seeds (Optional[Sequence[int]]): One seed per board, defaults to 0 .. M - 1.
+            buffer_steps (int): Number of steps of random numbers drawn ahead per board.
+        """
+        if seeds is None:
+            seeds = range(num_games)
+        if len(seeds) != num_games:
+            raise ValueError("Expected one seed per game")
+        self.num_games = num_games
+        self.rngs = [np.random.default_rng(seed) for seed in seeds]
+        self.buffer_steps = buffer_steps
+        self._random = np.empty((num_games, 2 * buffer_steps))
+        self._cursor = self._random.shape[1]
+
+        tile_probabilities = Game().get_tile_spawn_probabilities(grid=None)
+        self.tile_exponents = np.array([bitboard.tile_exponent(value) for value, _ in tile_probabilities], dtype=np.uint8)
+        self.tile_thresholds = np.cumsum([probability for _, probability in tile_probabilities])
+
+        self.boards = np.zeros((num_games, bitboard.BOARD_SIZE, bitboard.BOARD_SIZE), dtype=np.uint8)
+        self.moves = np.zeros(num_games, dtype=np.int64)
+        self.scores = np.zeros(num_games, dtype=np.int64)
+        self.reset()
+
+    @property
+    def grids(self) -> np.ndarray:
+        """The boards as tile values (0, 2, 4, ...), like Game.grid."""
+        return np.where(self.boards > 0, np.left_shift(1, self.boards.astype(np.int64)), 0)
+
+    def reset(self, indices: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Resets some or all boards to the Game.resetgame position.
+
+        Args:
+            indices (Optional[np.ndarray]): Boards to reset, all boards if None.
+
+        Returns:
+            np.ndarray: The (M, 4, 4) exponent boards.
+        """
+        if indices is None:
+            indices = np.arange(self.num_games)
+        self.boards[indices] = 0
+        self.boards[indices, -1, -1] = 1  # A lone 2 in the bottom-right corner
+        self.moves[indices] = 0
+        self.scores[indices] = 0
+        return self.boards
+
+    def _draw(self) -> np.ndarray:
+        """Returns two uniform numbers per board, refilling the per-board buffers when empty."""
+        if self._cursor >= self._random.shape[1]:
+            for i, rng in enumerate(self.rngs):
+                self._random[i] = rng.random(self._random.shape[1])
+            self._cursor = 0
+        draws = self._random[:, self._cursor:self._cursor + 2]
+        self._cursor += 2
+        return draws
+
+    def add_tiles(self, mask: np.ndarray, draws: np.ndarray) -> None:
+        """
+        Spawns one tile on a random empty cell of every selected board, like Game.add_tile.
+
+        Args:
+            mask (np.ndarray): M booleans selecting the boards that get a tile.
+            draws (np.ndarray): (M, 2) uniform numbers for the cell and the tile value.
+        """
+        flat = self.boards.reshape(self.num_games, -1).copy()
+        empty = flat == 0
+        counts = empty.sum(axis=1)
+        mask = mask & (counts > 0)
+        if not mask.any():
+            return
+        rows = np.flatnonzero(mask)
+        choice = (draws[rows, 0] * counts[rows]).astype(np.int64)
+        cells = (np.cumsum(empty[rows], axis=1) > choice[:, None]).argmax(axis=1)
+        tiles = self.tile_exponents[np.searchsorted(self.tile_thresholds, draws[rows, 1], side="right")]
+        flat[rows, cells] = tiles
+        self.boards = flat.reshape(self.boards.shape)
+
+    def step(self, actions: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, dict]:
+        """
+        Applies one move to every board, spawns tiles and resets finished boards.
+
+        Boards whose move changes nothing are left as they are, like in Game.move.
+
+        Args:
+            actions (np.ndarray): M action codes (0 = left, 1 = up, 2 = right, 3 = down).
+
+        Returns:
+            tuple: The (M, 4, 4) exponent boards, the merge reward of each board, a boolean
+            mask of boards that finished this step (already reset), and an info dict with
+            the 'valid' move mask and the 'final_max_tile' and 'final_moves' of finished boards.
+        """
+        actions = np.asarray(actions)
+        draws = self._draw()
+        moved, rewards = move_boards(self.boards, actions)
+        valid = (moved != self.boards).any(axis=(1, 2))
+        self.boards = moved
+        self.moves[valid] += 1
+        self.scores[valid] = self._score(valid)
+        self.add_tiles(valid, draws)
+
+        dones = game_over(self.boards)
+        final_max_tile = np.where(dones, np.left_shift(1, self.boards.max(axis=(1, 2)).astype(np.int64)), 0)
+        final_moves = np.where(dones, self.moves, 0)
+        if dones.any():
+            self.reset(np.flatnonzero(dones))
+        return self.boards, rewards, dones, {"valid": valid, "final_max_tile": final_max_tile, "final_moves": final_moves}
+
+    def _score(self, mask: np.ndarray) -> np.ndarray:
+        """Game.score_function of the selected boards: max tile plus 10 per empty cell."""
+        grids = self.grids[mask]
+        return grids.max(axis=(1, 2)) + (grids == 0).sum(axis=(1, 2)) * 10
+
+    def legal_actions(self) -> np.ndarray:
+        """Returns an (M, 4) mask of the moves that change each board."""
+        return legal_actions(self.boards)